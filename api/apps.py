@@ -1,6 +1,23 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+
+logger = logging.getLogger(__name__)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .rollups import check_bucket_origin
+
+        checks.register(check_bucket_origin)
+
+        if settings.MODEL_PRELOAD:
+            from .registry import model_registry
+
+            loaded = model_registry.preload()
+            logger.info("Preloaded models: %s", ", ".join(loaded) or "none")
@@ -0,0 +1,293 @@
+# archive.py
+import json
+import os
+import uuid
+from datetime import timedelta
+from urllib.parse import quote, unquote
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .energy import fetch_power_series
+from .models import Sensor
+from .queries import day_bounds, sensor_day_queryset
+from .rollups import to_datetime
+from .telemetry import TELEMETRY_COLUMNS, check_columns, read_telemetry
+
+MANIFEST = "manifest.json"
+# Bumped when the day layout changes; days in another format are not read.
+ARCHIVE_FORMAT = 1
+
+
+def sensor_directory(sensor_name):
+    # Quoted, so any sensor name is one safe, reversible directory name. quote()
+    # leaves dots alone, so names made only of dots ("." and "..", which would
+    # be the archive or its parent) have them quoted as well.
+    if not sensor_name:
+        raise ValueError("Cannot archive a sensor without a name.")
+    name = quote(sensor_name, safe="")
+    if not name.strip("."):
+        name = name.replace(".", "%2E")
+    return os.path.join(settings.ARCHIVE_PATH, name)
+
+
+def day_directory(sensor_name, selected_date):
+    return os.path.join(sensor_directory(sensor_name), str(selected_date))
+
+
+def write_json(path, data):
+    # Written aside and renamed, so readers never see a half-written file.
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, path)
+
+
+def read_manifest(sensor_name, selected_date):
+    """The manifest of an archived sensor-day, or None when it is not archived.
+
+    A day only counts as archived once its manifest exists, and only while
+    its bounds match the current time zone's local day.
+    """
+    try:
+        with open(
+            os.path.join(day_directory(sensor_name, selected_date), MANIFEST)
+        ) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    start, end = day_bounds(selected_date)
+    if (
+        manifest.get("format") != ARCHIVE_FORMAT
+        or manifest["start"] != start.timestamp()
+        or manifest["end"] != end.timestamp()
+    ):
+        return None
+    return manifest
+
+
+def load_archived_day(sensor_name, selected_date, columns=("power",)):
+    """``(timestamps, {column: values})`` of an archived day, or None.
+
+    The arrays are read-only memory maps of the .npy files: nothing is read
+    until it is used, and pages are shared between workers through the OS
+    page cache.
+    """
+    check_columns(columns)
+    manifest = read_manifest(sensor_name, selected_date)
+    if manifest is None:
+        return None
+    directory = day_directory(sensor_name, selected_date)
+    arrays = {
+        column: np.load(
+            os.path.join(directory, manifest["files"][column]), mmap_mode="r"
+        )
+        for column in ("created_at", *columns)
+    }
+    timestamps = arrays.pop("created_at")
+    return timestamps, arrays
+
+
+def fetch_day_power(sensor_name, selected_date):
+    # Archived days come from disk; the rest from sensor_electrics.
+    if settings.ARCHIVE_READS:
+        archived = load_archived_day(sensor_name, selected_date)
+        if archived is not None:
+            timestamps, values = archived
+            return timestamps, values["power"]
+    return fetch_power_series(sensor_day_queryset(sensor_name, selected_date))
+
+
+def day_fingerprint(sensor_name, selected_date):
+    # Row count and last timestamp of a day, wherever it is stored.
+    if settings.ARCHIVE_READS:
+        manifest = read_manifest(sensor_name, selected_date)
+        if manifest is not None:
+            return {
+                "row_count": manifest["rows"],
+                "last_at": to_datetime(manifest["last_at"]),
+            }
+    return sensor_day_queryset(sensor_name, selected_date).aggregate(
+        row_count=Count("id"), last_at=Max("created_at")
+    )
+
+
+def archived_dates(sensor_name, dates):
+    if not settings.ARCHIVE_READS:
+        return set()
+    return {d for d in dates if read_manifest(sensor_name, d) is not None}
+
+
+def archived_sensors():
+    # Names of the sensors with an archive directory.
+    if not os.path.isdir(settings.ARCHIVE_PATH):
+        return []
+    return sorted(
+        unquote(name)
+        for name in os.listdir(settings.ARCHIVE_PATH)
+        if os.path.isdir(os.path.join(settings.ARCHIVE_PATH, name))
+    )
+
+
+def archived_range(sensor_names, start_date, end_date):
+    """Manifests of the archived days from ``start_date`` to ``end_date``.
+
+    Keyed by ``(sensor_name, date)``; ``sensor_names`` may be empty for every
+    archived sensor. Only the manifests of days in the range are read.
+    """
+    manifests = {}
+    for sensor_name in sensor_names or archived_sensors():
+        directory = sensor_directory(sensor_name)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            selected_date = parse_date(name)
+            if not selected_date or not start_date <= selected_date <= end_date:
+                continue
+            manifest = read_manifest(sensor_name, selected_date)
+            if manifest is not None:
+                manifests[sensor_name, selected_date] = manifest
+    return manifests
+
+
+def pruned_dates(sensor_name, start_date, end_date):
+    # Archived days in the range that sensor_electrics no longer fully holds.
+    return sorted(
+        selected_date
+        for (_, selected_date), manifest in archived_range(
+            [sensor_name], start_date, end_date
+        ).items()
+        if sensor_day_queryset(sensor_name, selected_date).count() < manifest["rows"]
+    )
+
+
+def export_day(sensor_name, selected_date, overwrite: bool = False):
+    """Write one sensor-day to ``.npy`` files, one per column, plus its manifest.
+
+    Returns the manifest, or None when the day has no rows or is already
+    archived (unless ``overwrite``). Files get new names on every export and
+    the manifest is switched last, so a reader that already mapped the old
+    files keeps reading them.
+    """
+    if not overwrite and read_manifest(sensor_name, selected_date) is not None:
+        return None
+    timestamps, values = read_telemetry(
+        sensor_day_queryset(sensor_name, selected_date), TELEMETRY_COLUMNS
+    )
+    if not len(timestamps):
+        return None
+
+    directory = day_directory(sensor_name, selected_date)
+    os.makedirs(directory, exist_ok=True)
+    export_id = uuid.uuid4().hex[:12]
+    files = {}
+    for column, array in (("created_at", timestamps), *values.items()):
+        files[column] = f"{column}.{export_id}.npy"
+        np.save(os.path.join(directory, files[column]), array)
+
+    start, end = day_bounds(selected_date)
+    manifest = {
+        "format": ARCHIVE_FORMAT,
+        "sensor": sensor_name,
+        "date": str(selected_date),
+        "start": start.timestamp(),
+        "end": end.timestamp(),
+        "rows": len(timestamps),
+        "first_at": float(timestamps[0]),
+        "last_at": float(timestamps[-1]),
+        "files": files,
+        "exported_at": timezone.now().isoformat(),
+    }
+    write_json(os.path.join(directory, MANIFEST), manifest)
+
+    # Files of earlier exports; unlinking keeps open memory maps valid.
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and name not in files.values():
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+def prune_day(sensor_name, selected_date, manifest):
+    """Delete an archived day from sensor_electrics.
+
+    Only when the table still holds exactly the archived rows; a day that
+    got late rows after its export is left alone (export it again with
+    ``overwrite``). Returns the number of rows deleted, or None when the
+    rows were kept.
+    """
+    queryset = sensor_day_queryset(sensor_name, selected_date)
+    current = queryset.aggregate(row_count=Count("id"), last_at=Max("created_at"))
+    if not current["row_count"]:
+        return 0  # Pruned before.
+    if (
+        current["row_count"] != manifest["rows"]
+        or current["last_at"].timestamp() != manifest["last_at"]
+    ):
+        return None
+    with transaction.atomic():
+        deleted, _ = queryset.order_by().delete()
+        if deleted != manifest["rows"]:
+            # A row arrived between the check and the delete.
+            transaction.set_rollback(True)
+            return None
+    return deleted
+
+
+def archivable_days(sensor_names=None, before=None):
+    """``(sensor_name, date)`` of every day with rows before ``before``.
+
+    ``before`` defaults to ARCHIVE_AFTER_DAYS ago, so only days well past
+    late-arriving data are archived. Oldest first.
+    """
+    before = before or timezone.localdate() - timedelta(
+        days=settings.ARCHIVE_AFTER_DAYS
+    )
+    queryset = Sensor.objects.filter(created_at__lt=day_bounds(before)[0])
+    if sensor_names:
+        queryset = queryset.filter(name__in=sensor_names)
+    days = []
+    for row in (
+        queryset.values("name").annotate(first_at=Min("created_at")).order_by("name")
+    ):
+        current = timezone.localtime(row["first_at"]).date()
+        while current < before:
+            days.append((row["name"], current))
+            current += timedelta(days=1)
+    return sorted(days, key=lambda day: (day[1], day[0]))
+
+
+def archived_manifests(sensor_name):
+    # Manifests of a sensor's archived days, oldest first.
+    directory = sensor_directory(sensor_name)
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(directory)):
+        selected_date = parse_date(name)
+        manifest = selected_date and read_manifest(sensor_name, selected_date)
+        if manifest:
+            manifests.append(manifest)
+    return manifests
+
+
+def write_index():
+    """Rebuild the archive-wide manifest from the day manifests.
+
+    Maps each sensor to its archived days and row counts; for people and
+    tools browsing the archive. Reads never need it.
+    """
+    index = {"format": ARCHIVE_FORMAT, "sensors": {}}
+    for sensor_name in archived_sensors():
+        days = {
+            manifest["date"]: manifest["rows"]
+            for manifest in archived_manifests(sensor_name)
+        }
+        if days:
+            index["sensors"][sensor_name] = days
+    os.makedirs(settings.ARCHIVE_PATH, exist_ok=True)
+    write_json(os.path.join(settings.ARCHIVE_PATH, MANIFEST), index)
+    return index
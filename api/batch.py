@@ -0,0 +1,217 @@
+# batch.py
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .archive import archived_dates, fetch_day_power
+from .energy import fetch_power_series
+from .locks import hold_free_locks, lock_key
+from .metrics import stage
+from .prediction_cache import full_fingerprint, model_version_key
+from .queries import day_bounds, sensor_day_queryset
+from .resampling import resample_interval, resample_series
+from .results import complete_results, result_key, write_prediction_results
+from .utils import (
+    NoSensorDataError,
+    check_enough_data,
+    day_scaler,
+    load_model,
+    predict_batches,
+    predicted_energy,
+)
+from .windowing import iter_concatenated_batches, sliding_windows
+
+logger = logging.getLogger(__name__)
+
+
+def date_range(start_date, end_date):
+    return [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+
+
+def fetch_daily_power_series(sensor_name, start_date, end_date):
+    # Archived days are memory-mapped from disk. The others come from one
+    # streamed query over their span; rows come back ordered, so each day is
+    # the contiguous slice between its local midnights (archived days that
+    # are still in the table fall between slices).
+    dates = date_range(start_date, end_date)
+    archived = archived_dates(sensor_name, dates)
+    days = {
+        selected_date: fetch_day_power(sensor_name, selected_date)
+        for selected_date in sorted(archived)
+    }
+    remaining = [d for d in dates if d not in archived]
+    if not remaining:
+        return days
+
+    timestamps, power = fetch_power_series(
+        sensor_day_queryset(sensor_name, remaining[0], remaining[-1])
+    )
+    bounds = np.array(
+        [[bound.timestamp() for bound in day_bounds(d)] for d in remaining]
+    )
+    starts = np.searchsorted(timestamps, bounds[:, 0])
+    ends = np.searchsorted(timestamps, bounds[:, 1])
+    days.update(
+        (selected_date, (timestamps[start:end], power[start:end]))
+        for selected_date, start, end in zip(remaining, starts, ends)
+        if end > start
+    )
+    return days
+
+
+def predict_sensor_range(sensor_name, dates, method=None, resample=None):
+    method = method or settings.ENERGY_INTEGRATION_METHOD
+    with stage("fetch", sensor_name):
+        days = fetch_daily_power_series(sensor_name, dates[0], dates[-1])
+    interval = resample_interval(sensor_name, resample)
+
+    results = {}
+    failures = {}
+    prepared = []
+    for selected_date in dates:
+        if selected_date not in days:
+            failures[selected_date] = f"No sensor data available for {selected_date}."
+            continue
+        raw = timestamps, power = days[selected_date]
+        if interval:
+            timestamps, power, _ = resample_series(
+                timestamps,
+                power,
+                interval,
+                origin=day_bounds(selected_date)[0].timestamp(),
+            )
+        try:
+            check_enough_data(selected_date, len(power))
+        except NoSensorDataError as e:
+            failures[selected_date] = str(e)
+            continue
+        scaler = day_scaler(sensor_name, power)
+        scaled = scaler.transform(power.reshape(-1, 1))
+        prepared.append(
+            (selected_date, raw, timestamps, scaler, sliding_windows(scaled))
+        )
+
+    if not prepared:
+        return results, failures
+
+    # Taken before loading, like store_energy_prediction: a model replaced
+    # meanwhile leaves fingerprints that no longer match.
+    version = model_version_key(sensor_name)
+    with stage("load_model", sensor_name):
+        model = load_model(sensor_name)
+    with stage("predict", sensor_name):
+        predicted = predict_batches(
+            model,
+            iter_concatenated_batches(
+                (windows for *_, windows in prepared),
+                batch_size=settings.PREDICTION_BATCH_SIZE,
+            ),
+        )
+
+    offsets = np.cumsum([len(windows) for *_, windows in prepared])[:-1]
+    for (selected_date, raw, timestamps, scaler, _), day_predicted in zip(
+        prepared, np.split(predicted, offsets)
+    ):
+        rescaled = scaler.inverse_transform(day_predicted.reshape(-1, 1)).ravel()
+        results[selected_date] = (
+            predicted_energy(timestamps, rescaled, method=method),
+            timestamps,
+            rescaled,
+            full_fingerprint(
+                *raw, version, method, interval, scaler, timestamps, rescaled
+            ),
+        )
+    return results, failures
+
+
+def predict_and_store(sensor_name, pending, method=None, resample=None):
+    report = []
+    logger.debug("Predicting %s for %s days...", sensor_name, len(pending))
+    try:
+        results, failures = predict_sensor_range(
+            sensor_name, pending, method=method, resample=resample
+        )
+    except Exception as e:
+        report.extend(
+            {
+                "sensor": sensor_name,
+                "date": str(d),
+                "status": "failed",
+                "error": str(e),
+            }
+            for d in pending
+        )
+        return report
+
+    report.extend(
+        {"sensor": sensor_name, "date": str(d), "status": "failed", "error": error}
+        for d, error in failures.items()
+    )
+
+    for selected_date, (total_energy_predicted, _, rescaled, _) in results.items():
+        report.append(
+            {
+                "sensor": sensor_name,
+                "date": str(selected_date),
+                "status": "created",
+                "predicted_energy": total_energy_predicted,
+                "points": len(rescaled),
+            }
+        )
+
+    with stage("store", sensor_name):
+        write_prediction_results(
+            (sensor_name, selected_date, *result)
+            for selected_date, result in results.items()
+        )
+
+    return report
+
+
+def store_batch_prediction(
+    sensor_names, start_date, end_date, method=None, resample=None, overwrite=False
+):
+    dates = date_range(start_date, end_date)
+    report = []
+
+    for sensor_name in sensor_names:
+        # Days already predicted in full are skipped unless ``overwrite`` is
+        # set; a prediction made while the day was still open is redone.
+        existing = complete_results([sensor_name], dates, "predicted_energy")
+        pending = [
+            d for d in dates if overwrite or result_key(sensor_name, d) not in existing
+        ]
+        report.extend(
+            {"sensor": sensor_name, "date": str(d), "status": "exists"}
+            for d in dates
+            if d not in pending
+        )
+        if not pending:
+            continue
+
+        keys = {lock_key("prediction", sensor_name, d): d for d in pending}
+        with hold_free_locks(list(keys)) as taken:
+            # Days another worker is predicting right now are left to it.
+            report.extend(
+                {"sensor": sensor_name, "date": str(d), "status": "locked"}
+                for key, d in keys.items()
+                if key not in taken
+            )
+            if taken:
+                report.extend(
+                    predict_and_store(
+                        sensor_name,
+                        [keys[key] for key in taken],
+                        method=method,
+                        resample=resample,
+                    )
+                )
+
+    return {
+        "results": [row for row in report if row["status"] != "failed"],
+        "failures": [row for row in report if row["status"] == "failed"],
+    }
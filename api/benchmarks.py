@@ -0,0 +1,881 @@
+# benchmarks.py
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .archive import export_day, fetch_day_power
+from .batch import store_batch_prediction
+from .energy import (
+    average_interval_hours,
+    fetch_power_series,
+    mean_interval_energy,
+    trapezoid_energy,
+)
+from .inference import (
+    INFERENCE_BACKENDS,
+    KERAS,
+    TFLITE,
+    CompiledKerasModel,
+    load_keras_model,
+)
+from .ingest import NUMERIC_FIELDS, copy_supported, ingest_rows, validate_rows
+from .jobs import ACTIVE_STATES
+from .metrics import collect_timings, stage_totals
+from .models import Energy, Sensor
+from .prediction_cache import store_energy_prediction
+from .queries import day_bounds, sensor_day_queryset
+from .registry import available_sensors, model_path, model_registry, scaler_path
+from .scaling import AffineScaler, power_range, save_scaler
+from .series import PREDICTION_STORAGES, read_prediction_series, write_prediction_series
+from .sql_energy import SQL, range_energy
+from .telemetry import TELEMETRY_COLUMNS, iter_telemetry_chunks, read_telemetry
+from .utils import calculate_energy, create_sequences, predict_energy
+from .windowing import TIME_STEPS, iter_window_batches, sliding_windows
+
+SUITES = {}
+
+
+def suite(name: str):
+    def register(func):
+        SUITES[name] = func
+        return func
+
+    return register
+
+
+def timed(func, repeat: int = 3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def synthetic_power_series(samples: int, interval_seconds: float = 1.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    jitter = rng.uniform(-0.1, 0.1, samples) * interval_seconds
+    timestamps = 1_700_000_000 + np.arange(samples) * interval_seconds + jitter
+    timestamps.sort()
+    hours = (timestamps % 86400) / 3600
+    power = 400 + 250 * np.sin(hours / 24 * 2 * np.pi) + rng.normal(0, 20, samples)
+    return timestamps, np.clip(power, 0, None)
+
+
+def legacy_calculate_energy(timestamps, power):
+    # Mirrors the pre-vectorization calculate_energy: DataFrame interval + per-row loop.
+    sensors = [Sensor(power=value) for value in power.tolist()]
+    frame = pd.DataFrame(
+        {"created_at": pd.to_datetime(timestamps, unit="s", utc=True), "power": power}
+    )
+    frame.set_index("created_at", inplace=True)
+    interval = frame.index.to_series().diff().dt.total_seconds().mean() / 3600
+    total = 0
+    for sensor in sensors:
+        total += (sensor.power * interval) / 1000
+    return total
+
+
+@suite("energy")
+def energy_suite(sizes, repeat, **options):
+    for samples in sizes:
+        timestamps, power = synthetic_power_series(samples)
+        cases = {
+            "legacy_loop": lambda: legacy_calculate_energy(timestamps, power),
+            "mean_interval": lambda: mean_interval_energy(
+                power, average_interval_hours(timestamps)
+            ),
+            "trapezoid": lambda: trapezoid_energy(timestamps, power),
+        }
+        for case, func in cases.items():
+            seconds, result = timed(func, repeat)
+            yield {
+                "suite": "energy",
+                "case": case,
+                "samples": samples,
+                "seconds": seconds,
+                "result": round(float(result), 6),
+            }
+
+
+def legacy_create_sequences(data, time_steps=24):
+    X = []
+    for i in range(len(data) - time_steps):
+        X.append(data[i : i + time_steps])
+    return np.array(X)
+
+
+def consume_batches(data, batch_size=4096):
+    total = 0.0
+    for batch in iter_window_batches(data, batch_size=batch_size):
+        total += float(np.ascontiguousarray(batch).sum())
+    return total
+
+
+@suite("windowing")
+def windowing_suite(sizes, repeat, **options):
+    for samples in sizes:
+        _, power = synthetic_power_series(samples)
+        data = (power / power.max()).reshape(-1, 1)
+        cases = {
+            "legacy_list": lambda: legacy_create_sequences(data),
+            "stride_view": lambda: sliding_windows(data),
+            "stride_copy": lambda: np.ascontiguousarray(sliding_windows(data)),
+            "stride_batches": lambda: consume_batches(data),
+        }
+        for case, func in cases.items():
+            seconds, result = timed(func, repeat)
+            yield {
+                "suite": "windowing",
+                "case": case,
+                "samples": samples,
+                "seconds": seconds,
+                "peak_mb": round(peak_memory(func) / 2**20, 2),
+            }
+
+
+def synthetic_readings(samples: int, sensors: int = 3, seed: int = 0):
+    _, power = synthetic_power_series(samples, seed=seed)
+    return [
+        {
+            "name": f"Sensor {i % sensors + 1}",
+            "voltage": 220.0,
+            "current": value / 220.0,
+            "power": value,
+            "power_factor": 0.95,
+            "frequency": 50.0,
+            "energy": 0.0,
+            "apparent_power": value / 0.95,
+            "reactive_power": value * 0.33,
+        }
+        for i, value in enumerate(power.tolist())
+    ]
+
+
+def rolled_back(func):
+    def run():
+        with transaction.atomic():
+            result = func()
+            transaction.set_rollback(True)
+        return result
+
+    return run
+
+
+def save_rows(rows):
+    for row in rows:
+        Sensor(**row).save()
+
+
+@suite("ingest")
+def ingest_suite(sizes, repeat, **options):
+    with benchmark_database():
+        for samples in sizes:
+            rows = synthetic_readings(samples)
+            cases = {
+                "validate_only": lambda: validate_rows(rows),
+                "bulk_create": rolled_back(
+                    lambda: ingest_rows(rows, backend="bulk_create")
+                ),
+            }
+            if copy_supported():
+                cases["copy"] = rolled_back(lambda: ingest_rows(rows, backend="copy"))
+            if samples <= 10000:
+                cases["row_save"] = rolled_back(lambda: save_rows(rows))
+            for case, func in cases.items():
+                seconds, _ = timed(func, repeat)
+                yield {
+                    "suite": "ingest",
+                    "case": case,
+                    "samples": samples,
+                    "seconds": seconds,
+                    "rows_per_second": round(samples / seconds),
+                }
+
+
+def write_and_read_prediction(timestamps, values, storage):
+    energy = Energy.objects.create(name="benchmark", date="1970-01-01")
+    write_prediction_series(energy, timestamps, values, storage=storage)
+    return len(read_prediction_series(energy)[1])
+
+
+@suite("storage")
+def storage_suite(sizes, repeat, **options):
+    with benchmark_database():
+        for samples in sizes:
+            timestamps, power = synthetic_power_series(samples)
+            for storage in PREDICTION_STORAGES:
+                seconds, _ = timed(
+                    rolled_back(
+                        lambda: write_and_read_prediction(timestamps, power, storage)
+                    ),
+                    repeat,
+                )
+                yield {
+                    "suite": "storage",
+                    "case": storage,
+                    "samples": samples,
+                    "seconds": seconds,
+                    "points_per_second": round(samples / seconds),
+                }
+
+
+RUNTIME_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import numpy as np
+from api.inference import load_backend_model
+model = load_backend_model(sys.argv[1], sys.argv[2])
+model.predict_on_batch(np.zeros((int(sys.argv[3]), 24, 1), dtype=np.float32))
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "tensorflow_imported": "tensorflow" in sys.modules,
+}))
+"""
+
+
+@suite("runtime")
+def runtime_suite(sizes, repeat, **options):
+    # Cold start in a fresh interpreter: imports, model load and one batch.
+    sensor_name = available_sensors()[0]
+    for backend in INFERENCE_BACKENDS:
+        path = model_path(sensor_name, backend)
+        if not os.path.exists(path):
+            continue
+        for samples in sizes:
+            samples = min(samples, 4096)
+            runs = []
+            for _ in range(repeat):
+                output = subprocess.run(
+                    [sys.executable, "-c", RUNTIME_PROBE, path, backend, str(samples)],
+                    cwd=settings.BASE_DIR,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            best = min(runs, key=lambda run: run["seconds"])
+            yield {
+                "suite": "runtime",
+                "case": backend,
+                "samples": samples,
+                "seconds": best["seconds"],
+                "rss_mb": round(best["rss_mb"], 1),
+                "tensorflow_imported": best["tensorflow_imported"],
+            }
+
+
+def keras_predict(path: str, batch_size: int):
+    model = load_keras_model(path)
+    return lambda windows: model.predict(windows, batch_size=batch_size, verbose=0)
+
+
+def keras_runners(path: str):
+    # Each runner gets its own freshly loaded model, so none profits from
+    # another's tracing.
+    batch_size = settings.KERAS_BATCH_SIZE
+    return {
+        "predict": lambda: keras_predict(path, batch_size),
+        "predict_on_batch": lambda: load_keras_model(path).predict_on_batch,
+        "compiled": lambda: CompiledKerasModel(
+            load_keras_model(path), batch_size
+        ).predict_on_batch,
+    }
+
+
+@suite("inference")
+def inference_suite(sizes, repeat, **options):
+    """Keras predict() against the fixed-signature tf.function runner.
+
+    ``samples`` is the number of windows per call: small sizes show the
+    per-call latency, large ones the throughput. ``first_seconds`` is the
+    first call after loading (tracing included, except for the compiled
+    runner, which warms up while loading, in ``load_seconds``).
+    """
+    sensors = available_sensors()
+    with tempfile.TemporaryDirectory() as directory:
+        if sensors:
+            path = model_path(sensors[0], KERAS)
+        else:
+            path = os.path.join(directory, "standin_model.h5")
+            build_standin_model(path)
+        for samples in sizes:
+            windows = (
+                np.random.default_rng(0)
+                .random((samples, TIME_STEPS, 1))
+                .astype(np.float32)
+            )
+            for case, load in keras_runners(path).items():
+                load_seconds, run = timed(load, 1)
+                first_seconds, _ = timed(lambda: run(windows), 1)
+                seconds, _ = timed(lambda: run(windows), repeat)
+                yield {
+                    "suite": "inference",
+                    "case": case,
+                    "samples": samples,
+                    "seconds": seconds,
+                    "windows_per_second": round(samples / seconds),
+                    "first_seconds": round(first_seconds, 4),
+                    "load_seconds": round(load_seconds, 4),
+                }
+
+
+# Synthetic telemetry is written to days well in the past, so every day is closed.
+SYNTHETIC_START_DATE = datetime(2024, 1, 1).date()
+
+
+def synthetic_telemetry(
+    sensor_names, start_date, days=1, interval_seconds=60.0, outages=0, seed=0
+):
+    """Per-sensor readings every ``interval_seconds`` over ``days`` local days.
+
+    Each sensor gets its own base load, daily swing and evening peak, with
+    sampling jitter and measurement noise. ``outages`` stretches of up to an
+    hour per sensor-day are dropped, as when a gateway goes offline. Yields
+    ``(sensor_name, timestamps, columns)`` with one array per Sensor field.
+    """
+    rng = np.random.default_rng(seed)
+    start = day_bounds(start_date)[0].timestamp()
+    samples = int(days * 86400 / interval_seconds)
+    offsets = np.arange(samples) * interval_seconds
+
+    for sensor_name in sensor_names:
+        hours = (offsets % 86400) / 3600
+        base = rng.uniform(150, 400)
+        power = (
+            base
+            + 0.3 * base * np.sin((hours - 9) / 24 * 2 * np.pi)
+            + rng.uniform(300, 900) * np.exp(-((hours - 19) ** 2) / 4)
+            + rng.normal(0, 0.05 * base, samples)
+        )
+        power = np.clip(power, 0, None)
+        timestamps = start + offsets + rng.uniform(0, 0.2, samples) * interval_seconds
+
+        keep = np.ones(samples, dtype=bool)
+        outage_length = int(3600 / interval_seconds)
+        for first in rng.integers(0, samples, int(outages * days)):
+            keep[first : first + rng.integers(1, outage_length + 1)] = False
+
+        voltage = rng.normal(220, 2, samples)
+        power_factor = rng.uniform(0.88, 0.99, samples)
+        apparent_power = power / power_factor
+        columns = {
+            "voltage": voltage,
+            "current": apparent_power / voltage,
+            "power": power,
+            "power_factor": power_factor,
+            "frequency": rng.normal(50, 0.02, samples),
+            "energy": np.cumsum(power) * interval_seconds / 3.6e6,
+            "apparent_power": apparent_power,
+            "reactive_power": np.sqrt(apparent_power**2 - power**2),
+        }
+        yield (
+            sensor_name,
+            timestamps[keep],
+            {field: values[keep] for field, values in columns.items()},
+        )
+
+
+def write_telemetry(telemetry, batch_size: int = None):
+    # Plain INSERTs: bulk_create would replace created_at with now() (auto_now_add).
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    fields = [
+        Sensor._meta.get_field(name)
+        for name in ("id", "created_at", "updated_at", "name", *NUMERIC_FIELDS)
+    ]
+    sql = (
+        f"INSERT INTO {Sensor._meta.db_table} "
+        f"({', '.join(connection.ops.quote_name(field.column) for field in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    now = connection.ops.adapt_datetimefield_value(datetime.now(dt_timezone.utc))
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sensor_name, timestamps, columns in telemetry:
+            values = np.column_stack([columns[field] for field in NUMERIC_FIELDS])
+            for start in range(0, len(timestamps), batch_size):
+                rows = [
+                    (
+                        fields[0].get_db_prep_value(uuid.uuid4(), connection),
+                        connection.ops.adapt_datetimefield_value(
+                            datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+                        ),
+                        now,
+                        sensor_name,
+                        *row,
+                    )
+                    for timestamp, row in zip(
+                        timestamps[start : start + batch_size].tolist(),
+                        values[start : start + batch_size].tolist(),
+                    )
+                ]
+                cursor.executemany(sql, rows)
+                written += len(rows)
+    return written
+
+
+def build_standin_model(path: str, seed: int = 0):
+    # Same (24, 1) input and single output as saved_model/*_model.h5, a fraction
+    # of the size; the weights are random, which is all timing needs.
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    model = tf.keras.Sequential(
+        [
+            tf.keras.Input(shape=(TIME_STEPS, 1)),
+            tf.keras.layers.LSTM(32, return_sequences=True),
+            tf.keras.layers.LSTM(16),
+            tf.keras.layers.Dense(1),
+        ]
+    )
+    model.compile(optimizer="adam", loss="mean_squared_error")
+    model.save(path)
+    return model
+
+
+@contextmanager
+def benchmark_database():
+    """A throwaway database with the current schema, dropped afterwards.
+
+    With SQLite it is a file in a temporary directory, so the suites that seed
+    telemetry run offline and never touch real data.
+    """
+    old_name = connection.settings_dict["NAME"]
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                directory, "benchmark.sqlite3"
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def synthetic_environment(sensors: int):
+    """Benchmark database plus stand-in models for ``sensors`` synthetic sensors."""
+    sensor_names = [f"Synthetic {i + 1}" for i in range(sensors)]
+    with (
+        benchmark_database(),
+        tempfile.TemporaryDirectory() as directory,
+        override_settings(
+            MODEL_STORAGE_PATH=directory,
+            ENERGY_ROLLUPS=False,
+        ),
+    ):
+        with quiet():
+            build_standin_model(model_path(sensor_names[0], KERAS))
+            if settings.INFERENCE_BACKEND == TFLITE:
+                from .management.commands.convert_models import convert_to_tflite
+
+                with open(model_path(sensor_names[0], TFLITE), "wb") as f:
+                    model = load_keras_model(model_path(sensor_names[0], KERAS))
+                    f.write(convert_to_tflite(model, settings.TFLITE_BATCH_SIZE))
+        for sensor_name in sensor_names[1:]:
+            for backend in INFERENCE_BACKENDS:
+                if os.path.exists(model_path(sensor_names[0], backend)):
+                    shutil.copy(
+                        model_path(sensor_names[0], backend),
+                        model_path(sensor_name, backend),
+                    )
+        model_registry.clear()
+        try:
+            yield sensor_names
+        finally:
+            model_registry.clear()
+
+
+@contextmanager
+def quiet():
+    # The pipeline prints progress for every call; keep it out of the report.
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(func, repeat: int, setup=None):
+    """Best of ``repeat`` runs with that run's stage breakdown, and the
+    tracemalloc peak of one more run (kept apart as tracing slows it down)."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with quiet(), collect_timings() as timings:
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        if best is None or elapsed < best[0]:
+            best = (elapsed, timings, result)
+
+    if setup is not None:
+        setup()
+    with quiet():
+        peak = peak_memory(func)
+
+    seconds, timings, result = best
+    return {
+        "seconds": seconds,
+        "peak_mb": round(peak / 2**20, 2),
+        "stages": {
+            name: round(elapsed * 1000, 2)
+            for name, elapsed in stage_totals(timings).items()
+        },
+    }, result
+
+
+def calculate_energy_sql(sensor_name, selected_date):
+    with override_settings(ENERGY_CALCULATION_BACKEND=SQL):
+        return calculate_energy(sensor_name, selected_date)
+
+
+def seed_day(sensor_names, samples: int, offset: int, seed: int = 0):
+    # Each size gets its own day so the sizes never share cached results.
+    selected_date = SYNTHETIC_START_DATE + timedelta(days=offset)
+    write_telemetry(
+        synthetic_telemetry(
+            sensor_names,
+            selected_date,
+            interval_seconds=86400 / samples,
+            seed=seed + offset,
+        )
+    )
+    return selected_date
+
+
+def forget_energy(sensor_names, selected_date):
+    return lambda: Energy.objects.filter(
+        name__in=sensor_names, date=str(selected_date)
+    ).delete()
+
+
+@suite("pipeline")
+def pipeline_suite(sizes, repeat, sensors: int = 3, **options):
+    with synthetic_environment(sensors) as sensor_names:
+        sensor_name = sensor_names[0]
+        with quiet():
+            model_registry.get(sensor_name)
+
+        for offset, samples in enumerate(sizes):
+            selected_date = seed_day(sensor_names, samples, offset)
+            _, power = synthetic_power_series(samples)
+            scaled = (power / power.max()).reshape(-1, 1)
+            cases = {
+                "create_sequences": (
+                    lambda: np.ascontiguousarray(create_sequences(scaled)),
+                    None,
+                ),
+                "calculate_energy": (
+                    lambda: calculate_energy(sensor_name, selected_date),
+                    None,
+                ),
+                "calculate_energy_sql": (
+                    lambda: calculate_energy_sql(sensor_name, selected_date),
+                    None,
+                ),
+                "range_energy_sql": (
+                    lambda: range_energy(sensor_names, selected_date, selected_date),
+                    None,
+                ),
+                "predict_energy": (
+                    lambda: predict_energy(sensor_name, selected_date)[0],
+                    None,
+                ),
+                "store_prediction_miss": (
+                    lambda: store_energy_prediction(sensor_name, selected_date),
+                    forget_energy([sensor_name], selected_date),
+                ),
+                "store_prediction_hit": (
+                    lambda: store_energy_prediction(sensor_name, selected_date),
+                    None,
+                ),
+                "batch_prediction": (
+                    lambda: store_batch_prediction(
+                        sensor_names, selected_date, selected_date
+                    ),
+                    forget_energy(sensor_names, selected_date),
+                ),
+            }
+            for case, (func, setup) in cases.items():
+                measured, _ = measure(func, repeat, setup)
+                yield {
+                    "suite": "pipeline",
+                    "case": case,
+                    "samples": samples,
+                    **measured,
+                }
+
+
+def predicted_before_tail(sensor_name, selected_date, tail: int):
+    # Stores the day's prediction as it was ``tail`` rows ago, then lets the
+    # tail "arrive": its rows are moved out of the day and back.
+    def setup():
+        day = sensor_day_queryset(sensor_name, selected_date)
+        tail_rows = Sensor.objects.filter(
+            pk__in=list(day.reverse().values_list("pk", flat=True)[:tail])
+        )
+        forget_energy([sensor_name], selected_date)()
+        tail_rows.update(created_at=F("created_at") + timedelta(days=1000))
+        with quiet():
+            store_energy_prediction(sensor_name, selected_date)
+        tail_rows.update(created_at=F("created_at") - timedelta(days=1000))
+
+    return setup
+
+
+@suite("rolling")
+def rolling_suite(sizes, repeat, new_rows: int = 60, **options):
+    """Bringing a stored prediction up to date after ``new_rows`` rows arrived.
+
+    "rolling" reads and predicts only the new rows (persisted scaler),
+    "incremental" reads and hashes the whole day to predict them, and
+    "full" predicts the whole day again.
+    """
+    with synthetic_environment(1) as sensor_names:
+        sensor_name = sensor_names[0]
+        for offset, samples in enumerate(sizes):
+            selected_date = seed_day(sensor_names, samples, offset)
+            data_min, data_max = power_range(sensor_name)
+            save_scaler(
+                scaler_path(sensor_name),
+                AffineScaler(data_min, data_max),
+                model_path(sensor_name),
+            )
+            arrived = predicted_before_tail(sensor_name, selected_date, new_rows)
+            cases = {
+                "rolling": (True, arrived),
+                "incremental": (False, arrived),
+                "full": (False, forget_energy([sensor_name], selected_date)),
+            }
+            for case, (rolling, setup) in cases.items():
+                with override_settings(ROLLING_PREDICTIONS=rolling):
+                    measured, result = measure(
+                        lambda: store_energy_prediction(sensor_name, selected_date),
+                        repeat,
+                        setup,
+                    )
+                yield {
+                    "suite": "rolling",
+                    "case": case,
+                    "samples": samples,
+                    **measured,
+                    "new_rows": new_rows,
+                    "cache": result["cache"],
+                }
+
+
+def parse_server_timing(header: str):
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        if name != "total":
+            stages[name] = float(duration)
+    return stages
+
+
+def wait_for_job(client, response, timeout: float = 300):
+    job = response.json()
+    deadline = time.monotonic() + timeout
+    while job.get("status") in ACTIVE_STATES and time.monotonic() < deadline:
+        time.sleep(0.005)
+        job = client.get(
+            reverse("1.0:job-status", kwargs={"job_id": job["job_id"]})
+        ).json()
+    return job
+
+
+@suite("endpoints")
+def endpoints_suite(sizes, repeat, sensors: int = 3, **options):
+    client = Client()
+    with synthetic_environment(sensors) as sensor_names:
+        sensor_name = sensor_names[0]
+        with quiet():
+            model_registry.get(sensor_name)
+
+        for offset, samples in enumerate(sizes):
+            selected_date = seed_day(sensor_names, samples, offset)
+            day = {"sensor": sensor_name, "date": str(selected_date)}
+
+            def post(name):
+                return lambda: client.post(
+                    reverse(f"1.0:{name}"), day, content_type="application/json"
+                )
+
+            def post_and_wait(name):
+                return lambda: wait_for_job(client, post(name)())
+
+            def get(name, **params):
+                return lambda: client.get(reverse(f"1.0:{name}"), params)
+
+            cases = {
+                "sensor_list": (get("sensor-list", limit=100), None),
+                "calculation_job": (
+                    post_and_wait("sensor-energy-calculation"),
+                    forget_energy([sensor_name], selected_date),
+                ),
+                "prediction_job": (
+                    post_and_wait("sensor-energy-prediction"),
+                    forget_energy([sensor_name], selected_date),
+                ),
+                "prediction_hit": (post("sensor-energy-prediction"), None),
+                "energy_list": (
+                    get("energy-list", sensor=sensor_name, start_date=selected_date),
+                    None,
+                ),
+                "series_json": (get("prediction-series", **day), None),
+                "series_binary": (
+                    get("prediction-series", encoding="binary", **day),
+                    None,
+                ),
+            }
+            for case, (func, setup) in cases.items():
+                measured, result = measure(func, repeat, setup)
+                if isinstance(result, dict):
+                    # Job stages ran on a worker thread; the job reports them.
+                    measured["stages"] = {
+                        name: round(elapsed * 1000, 2)
+                        for name, elapsed in (result.get("timings") or {}).items()
+                    }
+                    status = result.get("status")
+                else:
+                    measured["stages"] = parse_server_timing(
+                        result.get("Server-Timing", "")
+                    )
+                    status = result.status_code
+                yield {
+                    "suite": "endpoints",
+                    "case": case,
+                    "samples": samples,
+                    "status": status,
+                    **measured,
+                }
+
+
+def legacy_fetch_power(queryset):
+    # The original fetch: a dict per row, a list of them, then a DataFrame.
+    frame = pd.DataFrame(list(queryset.values("created_at", "power")))
+    return frame["power"].to_numpy()
+
+
+def consume_chunks(queryset, columns):
+    return sum(
+        len(timestamps) for timestamps, _ in iter_telemetry_chunks(queryset, columns)
+    )
+
+
+@suite("telemetry")
+def telemetry_suite(sizes, repeat, **options):
+    sensor_names = ["Synthetic 1"]
+    with benchmark_database():
+        for offset, samples in enumerate(sizes):
+            selected_date = seed_day(sensor_names, samples, offset)
+            queryset = sensor_day_queryset(sensor_names[0], selected_date)
+            cases = {
+                "legacy_dataframe": lambda: legacy_fetch_power(queryset),
+                "power": lambda: fetch_power_series(queryset),
+                "all_columns": lambda: read_telemetry(queryset, TELEMETRY_COLUMNS),
+                "all_columns_chunks": lambda: consume_chunks(
+                    queryset, TELEMETRY_COLUMNS
+                ),
+            }
+            for case, func in cases.items():
+                measured, _ = measure(func, repeat)
+                del measured["stages"]
+                yield {
+                    "suite": "telemetry",
+                    "case": case,
+                    "samples": samples,
+                    **measured,
+                }
+
+
+@suite("archive")
+def archive_suite(sizes, repeat, **options):
+    # A sensor-day read from sensor_electrics against the same day memory-mapped
+    # from the archive; the sum forces every archived page to be read.
+    sensor_names = ["Synthetic 1"]
+    with benchmark_database(), tempfile.TemporaryDirectory() as directory:
+        with override_settings(ARCHIVE_PATH=directory, ARCHIVE_READS=True):
+            for offset, samples in enumerate(sizes):
+                selected_date = seed_day(sensor_names, samples, offset)
+                queryset = sensor_day_queryset(sensor_names[0], selected_date)
+                day = (sensor_names[0], selected_date)
+                export_seconds, _ = timed(lambda: export_day(*day, overwrite=True), 1)
+                cases = {
+                    "database": lambda: fetch_power_series(queryset)[1].sum(),
+                    "archive": lambda: fetch_day_power(*day)[1].sum(),
+                }
+                for case, func in cases.items():
+                    measured, _ = measure(func, repeat)
+                    del measured["stages"]
+                    yield {
+                        "suite": "archive",
+                        "case": case,
+                        "samples": samples,
+                        **measured,
+                        "export_seconds": round(export_seconds, 4),
+                    }
+
+
+def baseline_key(row):
+    return f"{row['suite']}:{row['case']}:{row['samples']}"
+
+
+def compare_to_baseline(rows, baseline, tolerance: float, min_seconds: float = 0.002):
+    """Rows slower, or with a higher memory peak, than the baseline by more than
+    ``tolerance`` (a fraction). Differences under ``min_seconds`` or 1 MB are
+    treated as noise."""
+    regressions = []
+    for row in rows:
+        before = baseline.get(baseline_key(row))
+        if before is None:
+            continue
+        for metric, noise in (("seconds", min_seconds), ("peak_mb", 1.0)):
+            if metric not in row or metric not in before:
+                continue
+            if (
+                row[metric] > before[metric] * (1 + tolerance)
+                and row[metric] - before[metric] > noise
+            ):
+                regressions.append(
+                    {
+                        "key": baseline_key(row),
+                        "metric": metric,
+                        "baseline": before[metric],
+                        "current": row[metric],
+                    }
+                )
+    return regressions
@@ -0,0 +1,46 @@
+# energy.py
+import numpy as np
+from django.conf import settings
+
+from .telemetry import read_telemetry
+
+TRAPEZOID = "trapezoid"
+MEAN_INTERVAL = "mean_interval"
+INTEGRATION_METHODS = (TRAPEZOID, MEAN_INTERVAL)
+
+
+def fetch_power_series(queryset, expected_rows: int = 0):
+    # Streamed in chunks straight into arrays; no model instances or row lists.
+    timestamps, values = read_telemetry(
+        queryset, ("power",), expected_rows=expected_rows
+    )
+    return timestamps, values["power"]
+
+
+def average_interval_hours(timestamps: np.ndarray):
+    if len(timestamps) < 2:
+        return 0.0
+    # Mean of consecutive deltas telescopes to the span over the number of gaps.
+    return float(timestamps[-1] - timestamps[0]) / (len(timestamps) - 1) / 3600
+
+
+def mean_interval_energy(power: np.ndarray, interval_hours: float):
+    return float(np.sum(power, dtype=np.float64)) * interval_hours / 1000  # kWh
+
+
+def trapezoid_energy(timestamps: np.ndarray, power: np.ndarray):
+    if len(timestamps) < 2:
+        return 0.0
+    return float(np.trapezoid(power, timestamps)) / 3600 / 1000  # kWh
+
+
+def integrate_energy(timestamps: np.ndarray, power: np.ndarray, method=None):
+    method = method or settings.ENERGY_INTEGRATION_METHOD
+    if method == TRAPEZOID:
+        return trapezoid_energy(timestamps, power)
+    if method == MEAN_INTERVAL:
+        return mean_interval_energy(power, average_interval_hours(timestamps))
+    raise ValueError(
+        f"Unknown integration method '{method}'. "
+        f"Use one of: {', '.join(INTEGRATION_METHODS)}."
+    )
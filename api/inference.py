@@ -0,0 +1,145 @@
+# inference.py
+import logging
+import threading
+
+import numpy as np
+
+from .windowing import TIME_STEPS
+
+KERAS = "keras"
+TFLITE = "tflite"
+INFERENCE_BACKENDS = (KERAS, TFLITE)
+MODEL_SUFFIXES = {KERAS: "_model.h5", TFLITE: "_model.tflite"}
+
+logger = logging.getLogger(__name__)
+
+
+def lite_interpreter_class():
+    # Prefer the standalone runtimes; tf.lite is the last resort because
+    # importing it pulls in the whole of TensorFlow.
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """Keras-like wrapper around a fixed-batch TFLite flatbuffer."""
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        self.interpreter = lite_interpreter_class()(
+            model_path=model_path, num_threads=num_threads
+        )
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input["shape"][0])
+        # An interpreter holds its tensors in place, so calls must not overlap.
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=self.input["dtype"])
+        outputs = np.empty(
+            (len(batch), *self.output["shape"][1:]), dtype=self.output["dtype"]
+        )
+        padded = np.zeros(self.input["shape"], dtype=self.input["dtype"])
+        with self._lock:
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start : start + self.batch_size]
+                padded[: len(chunk)] = chunk
+                self.interpreter.set_tensor(self.input["index"], padded)
+                self.interpreter.invoke()
+                result = self.interpreter.get_tensor(self.output["index"])
+                outputs[start : start + len(chunk)] = result[: len(chunk)]
+        return outputs
+
+
+class CompiledKerasModel:
+    """Keras model behind ``tf.function`` graphs with fixed (batch, 24, 1) signatures.
+
+    Inputs are cut into ``batch_size`` slices; a shorter last slice is
+    zero-padded to the smallest of a few smaller fixed sizes (each a quarter
+    of the next, down to ``min_batch_size``), so a handful of windows is not
+    padded to a full batch. All graphs are traced at load time: no Keras
+    predict() loop and no retracing for new input lengths.
+    """
+
+    def __init__(self, model, batch_size: int, min_batch_size: int = 16):
+        import tensorflow as tf
+
+        self.model = model
+        self.batch_size = batch_size
+        self.batch_sizes = [batch_size]
+        while self.batch_sizes[0] // 4 >= min_batch_size:
+            self.batch_sizes.insert(0, self.batch_sizes[0] // 4)
+        self._graphs = {
+            size: tf.function(
+                lambda inputs: model(inputs, training=False),
+                input_signature=[tf.TensorSpec([size, TIME_STEPS, 1], tf.float32)],
+            )
+            for size in self.batch_sizes
+        }
+        self.warm_up()
+
+    def warm_up(self):
+        # Traces every graph and lets TensorFlow allocate its buffers up front,
+        # instead of on the first requests.
+        for size, graph in self._graphs.items():
+            graph(np.zeros((size, TIME_STEPS, 1), dtype=np.float32))
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        outputs = []
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start : start + self.batch_size]
+            count = len(chunk)
+            size = next(size for size in self.batch_sizes if size >= count)
+            if count < size:
+                chunk = np.concatenate(
+                    [chunk, np.zeros((size - count, TIME_STEPS, 1), dtype=np.float32)]
+                )
+            outputs.append(self._graphs[size](chunk).numpy()[:count])
+        if not outputs:
+            return np.empty((0, 1), dtype=np.float32)
+        return np.concatenate(outputs)
+
+
+def configure_threads(intra_op_threads: int = None, inter_op_threads: int = None):
+    # TensorFlow reads these once, when its runtime starts (the first model
+    # load in the process); later changes are refused.
+    import tensorflow as tf
+
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        logger.warning("TensorFlow thread settings not applied: %s", e)
+
+
+def load_keras_model(model_path: str):
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(model_path)
+
+
+def load_backend_model(
+    model_path: str,
+    backend: str,
+    num_threads: int = None,
+    inter_op_threads: int = None,
+    batch_size: int = 512,
+):
+    if backend == TFLITE:
+        return TFLiteModel(model_path, num_threads=num_threads)
+    if backend == KERAS:
+        configure_threads(num_threads, inter_op_threads)
+        return CompiledKerasModel(load_keras_model(model_path), batch_size)
+    raise ValueError(f"Unknown inference backend '{backend}'.")
@@ -0,0 +1,199 @@
+# ingest.py
+import csv
+import io
+import json
+import math
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Sensor
+from .rollups import refresh_rollups, start_rollups
+from .telemetry import TELEMETRY_COLUMNS
+
+NUMERIC_FIELDS = TELEMETRY_COLUMNS
+COPY_COLUMNS = ("id", "created_at", "updated_at", "name") + NUMERIC_FIELDS
+MAX_REPORTED_ERRORS = 100
+
+
+class IngestError(ValueError):
+    pass
+
+
+def parse_body(body: bytes, content_type: str):
+    content_type = (content_type or "application/json").split(";")[0].strip()
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise IngestError("Body must be UTF-8.")
+
+    if content_type == "application/json":
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise IngestError(f"Invalid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = [rows]
+        if not isinstance(rows, list):
+            raise IngestError("Expected a JSON array of readings.")
+        return rows
+
+    if content_type in ("application/x-ndjson", "application/ndjson"):
+        rows = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # Kept so the row is reported as rejected at its position.
+                rows.append(None)
+        return rows
+
+    if content_type == "text/csv":
+        return list(csv.DictReader(io.StringIO(text)))
+
+    raise IngestError(f"Unsupported content type '{content_type}'.")
+
+
+def validate_rows(rows):
+    # Plain-Python validation, much cheaper per row than a DRF serializer.
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"index": index, "error": "Row is not an object."})
+            continue
+
+        name = row.get("name")
+        if not isinstance(name, str) or not name.strip():
+            errors.append({"index": index, "error": "'name' is required."})
+            continue
+
+        values = [name.strip()]
+        for field in NUMERIC_FIELDS:
+            try:
+                value = float(row[field])
+            except KeyError:
+                values = None
+                errors.append({"index": index, "error": f"'{field}' is required."})
+                break
+            except (TypeError, ValueError):
+                values = None
+                errors.append({"index": index, "error": f"'{field}' must be a number."})
+                break
+            if not math.isfinite(value):
+                values = None
+                errors.append({"index": index, "error": f"'{field}' must be finite."})
+                break
+            values.append(value)
+        if values is None:
+            continue
+
+        # The reading's own time, when it has one; otherwise it is stamped on write.
+        created_at = row.get("created_at")
+        if created_at in (None, ""):
+            values.append(None)
+        else:
+            try:
+                created_at = parse_datetime(created_at)
+            except (TypeError, ValueError):
+                created_at = None
+            if created_at is None:
+                errors.append(
+                    {
+                        "index": index,
+                        "error": "'created_at' must be an ISO 8601 timestamp.",
+                    }
+                )
+                continue
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+            values.append(created_at)
+
+        valid.append(values)
+    return valid, errors
+
+
+def copy_supported():
+    return connection.vendor == "postgresql" and settings.INGEST_USE_COPY
+
+
+def write_copy(valid_rows, now):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for *values, created_at in valid_rows:
+        writer.writerow(
+            [uuid.uuid4(), (created_at or now).isoformat(), now.isoformat(), *values]
+        )
+    buffer.seek(0)
+
+    columns = ", ".join(COPY_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {Sensor._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def write_bulk_create(valid_rows, now):
+    sensors = [
+        Sensor(name=values[0], **dict(zip(NUMERIC_FIELDS, values[1:-1])))
+        for values in valid_rows
+    ]
+    Sensor.objects.bulk_create(sensors, batch_size=settings.BULK_BATCH_SIZE)
+
+    # bulk_create stamps every row with now (created_at is auto_now_add), so
+    # readings that carry their own time get it back in a second statement.
+    stamped = []
+    for sensor, values in zip(sensors, valid_rows):
+        if values[-1] is not None:
+            sensor.created_at = values[-1]
+            stamped.append(sensor)
+    Sensor.objects.bulk_update(
+        stamped, ["created_at"], batch_size=settings.BULK_BATCH_SIZE
+    )
+
+
+def ingest_rows(rows, backend=None):
+    valid_rows, errors = validate_rows(rows)
+    backend = backend or ("copy" if copy_supported() else "bulk_create")
+
+    now = timezone.now()
+    if valid_rows:
+        with transaction.atomic():
+            if backend == "copy":
+                write_copy(valid_rows, now)
+            else:
+                write_bulk_create(valid_rows, now)
+
+    # Earliest reading per sensor, so rollups can fold late ones again.
+    first_at = {}
+    for values in valid_rows:
+        created_at = values[-1] or now
+        if values[0] not in first_at or created_at < first_at[values[0]]:
+            first_at[values[0]] = created_at
+
+    return {
+        "accepted": len(valid_rows),
+        "rejected": len(errors),
+        "backend": backend,
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "sensors": sorted(first_at),
+        "first_at": first_at,
+    }
+
+
+def refresh_ingested_rollups(sensor_names, first_at=None):
+    # Sensors are tracked from their first ingest on, starting at today's rows,
+    # so ingest never triggers a backfill of older days (see update_rollups).
+    first_at = first_at or {}
+    for sensor_name in sensor_names:
+        start_rollups(sensor_name)
+    return {
+        sensor_name: refresh_rollups(sensor_name, since=first_at.get(sensor_name))
+        for sensor_name in sensor_names
+    }
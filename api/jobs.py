@@ -0,0 +1,252 @@
+# jobs.py
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .locks import hold_lock, lock_key
+from .metrics import collect_timings, metrics, stage_totals
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, WAITING, RUNNING)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def job_key(job: Job):
+    return job.kind, job.name, job.date
+
+
+def job_dict(job: Job):
+    queued_seconds = running_seconds = None
+    if job.started_at:
+        queued_seconds = round((job.started_at - job.created_at).total_seconds(), 3)
+        running_seconds = round(
+            ((job.finished_at or timezone.now()) - job.started_at).total_seconds(), 3
+        )
+    return {
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "sensor": job.name,
+        "date": job.date,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error or None,
+        "queued_seconds": queued_seconds,
+        "running_seconds": running_seconds,
+        "timings": job.timings,
+    }
+
+
+def stale_jobs_queryset():
+    # Active jobs whose process stopped renewing them: it exited or was killed.
+    return Job.objects.filter(
+        status__in=ACTIVE_STATES,
+        updated_at__lt=timezone.now() - timedelta(seconds=settings.JOB_LOCK_TTL),
+    )
+
+
+STALE_JOB_FIELDS = {"status": FAILED, "error": "The worker running this job stopped."}
+
+
+def expire_stale_jobs():
+    return stale_jobs_queryset().update(**STALE_JOB_FIELDS, finished_at=timezone.now())
+
+
+async def aexpire_stale_jobs():
+    return await stale_jobs_queryset().aupdate(
+        **STALE_JOB_FIELDS, finished_at=timezone.now()
+    )
+
+
+def active_jobs_queryset(kind: str = None):
+    queryset = Job.objects.filter(status__in=ACTIVE_STATES).order_by("created_at")
+    if kind is not None:
+        queryset = queryset.filter(kind=kind)
+    return queryset
+
+
+class JobQueue:
+    """Worker pool for prediction and calculation jobs, with job state in the database.
+
+    A job runs in the process that accepted it, but its status, result and
+    timings live in the jobs table, so any worker can report on it. Only one
+    queued or running job exists per (kind, sensor, date) across processes;
+    submitting the same work again returns the job already in flight. Jobs
+    also take a database lock on their key, which keeps them apart from
+    other users of it such as precompute runs.
+
+    Each process renews the rows of its pending jobs every third of
+    JOB_LOCK_TTL; a row left active by a process that died is marked failed
+    once it is older than that.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, history_size: int = 500, max_pending: int = 32
+    ):
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self.max_pending = max_pending
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="energy-job"
+            )
+            threading.Thread(
+                target=self._keep_alive, name="energy-job-heartbeat", daemon=True
+            ).start()
+        return self._executor
+
+    def submit(self, kind: str, sensor_name: str, selected_date, func, /, **kwargs):
+        key = {"kind": kind, "name": sensor_name, "date": str(selected_date)}
+        with self._lock:
+            expire_stale_jobs()
+            existing = active_jobs_queryset().filter(**key).first()
+            if existing is not None:
+                return existing, False
+            if len(self._pending) >= self.max_pending:
+                # Backpressure: refuse new work rather than queue it without bound.
+                raise JobQueueFull(
+                    f"{len(self._pending)} jobs are already queued or running."
+                )
+
+            try:
+                with transaction.atomic():
+                    job = Job.objects.create(**key, holder=self.holder)
+            except IntegrityError:
+                # Another process submitted the same work first.
+                return Job.objects.filter(**key).order_by("-created_at").first(), False
+            self._pending.add(job.id)
+            self._get_executor().submit(self._run, job, func, kwargs)
+            return job, True
+
+    def _run(self, job: Job, func, kwargs):
+        close_old_connections()
+        timings = []
+        try:
+            with (
+                hold_lock(lock_key(*job_key(job)), on_wait=lambda: self._wait(job)),
+                collect_timings() as timings,
+            ):
+                self._update(job, status=RUNNING, started_at=timezone.now())
+                job.result = func(**kwargs)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            logger.warning(
+                "Job %s (%s %s %s) failed: %s", job.id, job.kind, job.name, job.date, e
+            )
+        finally:
+            job.finished_at = timezone.now()
+            job.timings = {
+                name: round(elapsed, 6)
+                for name, elapsed in stage_totals(timings).items()
+            }
+            if job.started_at:
+                metrics.observe(
+                    "energy_job_seconds",
+                    (job.finished_at - job.started_at).total_seconds(),
+                    "Run time of background jobs by kind and outcome.",
+                    kind=job.kind,
+                    status=job.status,
+                )
+            try:
+                job.save(
+                    update_fields=[
+                        "status",
+                        "result",
+                        "error",
+                        "timings",
+                        "finished_at",
+                        "updated_at",
+                    ]
+                )
+            except Exception as e:
+                logger.exception("Could not record the outcome of job %s", job.id)
+            finally:
+                with self._lock:
+                    self._pending.discard(job.id)
+                close_old_connections()
+
+    def _update(self, job: Job, **fields):
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.save(update_fields=[*fields, "updated_at"])
+
+    def _wait(self, job: Job):
+        self._update(job, status=WAITING)
+        logger.info(
+            "Job %s waiting for %s held by another worker",
+            job.id,
+            lock_key(*job_key(job)),
+        )
+
+    def _keep_alive(self):
+        while True:
+            time.sleep(settings.JOB_LOCK_TTL / 3)
+            with self._lock:
+                pending = list(self._pending)
+            try:
+                if pending:
+                    Job.objects.filter(id__in=pending, status__in=ACTIVE_STATES).update(
+                        updated_at=timezone.now()
+                    )
+                self._trim()
+            except Exception as e:
+                logger.warning("Could not renew jobs: %s", e)
+            finally:
+                close_old_connections()
+
+    def _trim(self):
+        # Finished jobs beyond the newest history_size are deleted.
+        finished = Job.objects.exclude(status__in=ACTIVE_STATES).order_by("-created_at")
+        cutoff = finished.values_list("created_at", flat=True)[
+            self.history_size : self.history_size + 1
+        ].first()
+        if cutoff is not None:
+            finished.filter(created_at__lte=cutoff).delete()
+
+    def get(self, job_id):
+        expire_stale_jobs()
+        return Job.objects.filter(pk=job_id).first()
+
+    async def aget(self, job_id):
+        await aexpire_stale_jobs()
+        return await Job.objects.filter(pk=job_id).afirst()
+
+    def active(self, kind: str = None):
+        expire_stale_jobs()
+        return list(active_jobs_queryset(kind))
+
+    async def aactive(self, kind: str = None):
+        await aexpire_stale_jobs()
+        return [job async for job in active_jobs_queryset(kind)]
+
+
+job_queue = JobQueue(
+    max_workers=settings.JOB_WORKERS,
+    history_size=settings.JOB_HISTORY_SIZE,
+    max_pending=settings.JOB_MAX_PENDING,
+)
@@ -0,0 +1,197 @@
+# locks.py
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import JobLock
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class LockLost(Exception):
+    pass
+
+
+# Renewers of the locks each thread holds, for check_locks().
+_held = threading.local()
+
+
+def lock_key(kind: str, sensor_name: str, selected_date):
+    return f"{kind}:{sensor_name}:{selected_date}"
+
+
+def lock_holder():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def acquire_lock(key: str, ttl: int = None, token: str = None):
+    """Take the lock if nobody holds it, returning the owner token or None.
+
+    Works across processes and hosts that share the database. An expired lock
+    (its owner died or stopped renewing) is cleared first; if two workers race
+    for it the unique key lets only one INSERT through.
+    """
+    ttl = ttl or settings.JOB_LOCK_TTL
+    now = timezone.now()
+    JobLock.objects.filter(key=key, expires_at__lte=now).delete()
+
+    token = token or uuid.uuid4().hex
+    try:
+        with transaction.atomic():
+            JobLock.objects.create(
+                key=key,
+                owner=token,
+                holder=lock_holder(),
+                expires_at=now + timedelta(seconds=ttl),
+            )
+    except IntegrityError:
+        return None
+    return token
+
+
+def renew_locks(keys, token: str, ttl: int = None):
+    ttl = ttl or settings.JOB_LOCK_TTL
+    now = timezone.now()
+    return JobLock.objects.filter(key__in=keys, owner=token).update(
+        expires_at=now + timedelta(seconds=ttl), updated_at=now
+    )
+
+
+def release_locks(keys, token: str):
+    # Only the owner may release; a lock taken over after expiry is left alone.
+    deleted, _ = JobLock.objects.filter(key__in=keys, owner=token).delete()
+    return deleted
+
+
+def held_locks_queryset(prefix: str = ""):
+    return (
+        JobLock.objects.filter(key__startswith=prefix, expires_at__gt=timezone.now())
+        .order_by("created_at")
+        .values("key", "holder", "created_at", "expires_at")
+    )
+
+
+def held_locks(prefix: str = ""):
+    return list(held_locks_queryset(prefix))
+
+
+async def aheld_locks(prefix: str = ""):
+    return [lock async for lock in held_locks_queryset(prefix)]
+
+
+class LockRenewer(threading.Thread):
+    """Extends locks sharing one owner token every third of their TTL until stopped."""
+
+    def __init__(self, keys, token: str, ttl: int):
+        super().__init__(name=f"lock-renewer:{keys[0]}", daemon=True)
+        self.keys = keys
+        self.token = token
+        self.ttl = ttl
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.ttl / 3):
+                if renew_locks(self.keys, self.token, self.ttl) < len(self.keys):
+                    self.lost = True
+                    logger.warning("Lost lock on %s", ", ".join(self.keys))
+                    return
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+@contextmanager
+def renewing(keys, token: str, ttl: int):
+    renewer = LockRenewer(keys, token, ttl)
+    renewer.start()
+    if not hasattr(_held, "renewers"):
+        _held.renewers = []
+    _held.renewers.append(renewer)
+    try:
+        yield renewer
+    finally:
+        _held.renewers.remove(renewer)
+        renewer.stop()
+
+
+def locks_held(keys, token: str):
+    return JobLock.objects.filter(
+        key__in=keys, owner=token, expires_at__gt=timezone.now()
+    ).count() == len(keys)
+
+
+def check_locks():
+    """Raise LockLost if a lock this thread holds was lost or has expired.
+
+    Called before results are written: a lost lock may already be held by
+    another worker doing the same work.
+    """
+    for renewer in getattr(_held, "renewers", ()):
+        if renewer.lost or not locks_held(renewer.keys, renewer.token):
+            raise LockLost(f"Lost lock on {', '.join(renewer.keys)}.")
+
+
+@contextmanager
+def hold_lock(key: str, ttl: int = None, wait: float = None, on_wait=None):
+    """Hold ``key`` for the duration of the block, renewing it in the background.
+
+    Blocks up to ``wait`` seconds while another worker holds it, calling
+    ``on_wait`` once, and raises LockTimeout if it never frees up.
+    """
+    ttl = ttl or settings.JOB_LOCK_TTL
+    wait = settings.JOB_LOCK_WAIT if wait is None else wait
+    deadline = time.monotonic() + wait
+
+    token = acquire_lock(key, ttl)
+    if token is None and on_wait is not None:
+        on_wait()
+    while token is None:
+        if time.monotonic() >= deadline:
+            raise LockTimeout(f"{key} is held by another worker.")
+        time.sleep(settings.JOB_LOCK_POLL_SECONDS)
+        token = acquire_lock(key, ttl)
+
+    try:
+        with renewing([key], token, ttl):
+            yield token
+    finally:
+        release_locks([key], token)
+
+
+@contextmanager
+def hold_free_locks(keys, ttl: int = None):
+    """Take whichever of ``keys`` are free right now and yield those keys.
+
+    For batch work that should skip, rather than wait for, items another
+    worker is busy with.
+    """
+    ttl = ttl or settings.JOB_LOCK_TTL
+    token = uuid.uuid4().hex
+    taken = [key for key in keys if acquire_lock(key, ttl, token=token)]
+    if not taken:
+        yield taken
+        return
+
+    try:
+        with renewing(taken, token, ttl):
+            yield taken
+    finally:
+        release_locks(taken, token)
@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from api.archive import (
+    archivable_days,
+    export_day,
+    prune_day,
+    read_manifest,
+    write_index,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export closed sensor-days from sensor_electrics to memory-mapped .npy "
+        "files under ARCHIVE_PATH, with a manifest per day and an archive-wide "
+        "index, and optionally delete the exported rows from the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor", action="append", help="Sensor name (repeatable)."
+        )
+        parser.add_argument(
+            "--before",
+            type=parse_date,
+            help=(
+                "Archive days before this date (YYYY-MM-DD). "
+                f"Defaults to {settings.ARCHIVE_AFTER_DAYS} days ago."
+            ),
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Export days that are already archived again.",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete archived days from sensor_electrics.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = archivable_days(options["sensor"], options["before"])
+        exported = pruned = rows = 0
+        for sensor_name, selected_date in days:
+            manifest = export_day(sensor_name, selected_date, options["overwrite"])
+            if manifest is not None:
+                exported += 1
+                rows += manifest["rows"]
+                self.stdout.write(
+                    f"Archived {manifest['rows']} rows of {sensor_name} on {selected_date}"
+                )
+            if options["prune"]:
+                # Days archived by an earlier run are pruned too.
+                manifest = manifest or read_manifest(sensor_name, selected_date)
+                if manifest is not None:
+                    deleted = prune_day(sensor_name, selected_date, manifest)
+                    if deleted is not None:
+                        pruned += deleted
+                    else:
+                        self.stdout.write(
+                            f"Kept {sensor_name} on {selected_date}: the table "
+                            "changed since it was archived (use --overwrite)"
+                        )
+
+        index = write_index()
+        self.stdout.write(
+            f"Archived {exported} day(s), {rows} rows in "
+            f"{time.monotonic() - started:.1f}s; pruned {pruned} rows. "
+            f"{sum(len(d) for d in index['sensors'].values())} day(s) in "
+            f"{settings.ARCHIVE_PATH}"
+        )
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import SUITES, baseline_key, compare_to_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Run offline performance benchmarks for the prediction pipeline. The "
+        "pipeline and endpoints suites seed synthetic telemetry into a throwaway "
+        "database; with SQLite settings they need no server at all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "suites", nargs="*", help=f"Suites to run: {', '.join(SUITES)}"
+        )
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[3600, 86400],
+            help="Number of samples per sensor-day to benchmark.",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--sensors",
+            type=int,
+            default=3,
+            help="Synthetic sensors to generate for the pipeline and endpoints suites.",
+        )
+        parser.add_argument(
+            "--save-baseline", metavar="PATH", help="Write the results as a baseline."
+        )
+        parser.add_argument(
+            "--baseline",
+            metavar="PATH",
+            help="Fail if any result regressed against this baseline.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed slowdown or memory growth against the baseline (0.25 = 25%%).",
+        )
+
+    def handle(self, *args, **options):
+        names = options["suites"] or list(SUITES)
+        rows = []
+        for name in names:
+            if name not in SUITES:
+                self.stderr.write(f"Unknown suite '{name}'.")
+                continue
+
+            for row in SUITES[name](
+                options["sizes"], options["repeat"], sensors=options["sensors"]
+            ):
+                rows.append(row)
+                extra = {
+                    key: value
+                    for key, value in row.items()
+                    if key not in ("suite", "case", "samples", "seconds")
+                }
+                self.stdout.write(
+                    f"{row['suite']:<12} {row['case']:<22} {row['samples']:>9} "
+                    f"{row['seconds'] * 1000:>10.2f} ms  {extra}"
+                )
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump({baseline_key(row): row for row in rows}, f, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            regressions = compare_to_baseline(rows, baseline, options["tolerance"])
+            for regression in regressions:
+                self.stderr.write(
+                    f"{regression['key']} {regression['metric']}: "
+                    f"{regression['baseline']:g} -> {regression['current']:g}"
+                )
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} result(s) regressed by more than "
+                    f"{options['tolerance']:.0%} against {options['baseline']}."
+                )
+            self.stdout.write(f"No regressions against {options['baseline']}")
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inference import KERAS, TFLITE, TFLiteModel, load_keras_model
+from api.registry import available_sensors, model_path
+from api.windowing import TIME_STEPS
+
+
+def convert_to_tflite(model, batch_size: int):
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import (
+        convert_variables_to_constants_v2,
+    )
+
+    # The bidirectional LSTM only lowers to builtin ops with a static batch
+    # dimension, and the recurrent-dropout seed variables must be frozen.
+    @tf.function(
+        input_signature=[tf.TensorSpec([batch_size, TIME_STEPS, 1], tf.float32)]
+    )
+    def serve(inputs):
+        return model(inputs, training=False)
+
+    frozen = convert_variables_to_constants_v2(serve.get_concrete_function())
+    return tf.lite.TFLiteConverter.from_concrete_functions([frozen]).convert()
+
+
+class Command(BaseCommand):
+    help = "Export each saved_model/<sensor>_model.h5 to a TFLite flatbuffer."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor", action="append", help="Sensor name (repeatable)."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.TFLITE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="Skip sensors whose .tflite file is newer than the .h5 file.",
+        )
+
+    def handle(self, *args, **options):
+        sensor_names = options["sensor"] or available_sensors()
+        if not sensor_names:
+            raise CommandError(f"No models found in {settings.MODEL_STORAGE_PATH}.")
+
+        for sensor_name in sensor_names:
+            source = model_path(sensor_name, KERAS)
+            target = model_path(sensor_name, TFLITE)
+            if (
+                options["skip_existing"]
+                and os.path.exists(target)
+                and os.path.getmtime(target) >= os.path.getmtime(source)
+            ):
+                self.stdout.write(f"{sensor_name}: up to date")
+                continue
+
+            model = load_keras_model(source)
+            flatbuffer = convert_to_tflite(model, options["batch_size"])
+
+            # Write then rename so the registry never loads a half-written file.
+            partial = f"{target}.partial"
+            with open(partial, "wb") as f:
+                f.write(flatbuffer)
+
+            sample = np.random.default_rng(0).random(
+                (options["batch_size"], TIME_STEPS, 1), dtype=np.float32
+            )
+            error = np.abs(
+                TFLiteModel(partial).predict_on_batch(sample)
+                - np.asarray(model.predict_on_batch(sample))
+            ).max()
+            os.replace(partial, target)
+
+            self.stdout.write(
+                f"{sensor_name}: {os.path.basename(target)} "
+                f"({len(flatbuffer) / 2**20:.1f} MB, max abs error {error:.2e})"
+            )
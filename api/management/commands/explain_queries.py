@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.models import Sensor
+from api.queries import sensor_day_queryset
+
+INDEX_NAMES = ("sensor_name_created_idx", "sensor_created_idx")
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot sensor_electrics queries and check that they use an index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sensor", default="Sensor 1")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Exit with an error if any query plan does not use an index.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        queries = {
+            "sensor_day": sensor_day_queryset(options["sensor"], today),
+            "sensor_range": sensor_day_queryset(
+                options["sensor"], today - timedelta(days=30), today
+            ),
+            "sensor_list": Sensor.objects.filter(
+                created_at__gte=timezone.now() - timedelta(minutes=5)
+            ).order_by("-created_at", "-id"),
+        }
+
+        if connection.vendor == "postgresql":
+            # Small or empty tables make a sequential scan cheaper; disable it so
+            # the plan shows whether an index can serve the query at all.
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        missing = []
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            uses_index = any(index in plan for index in INDEX_NAMES)
+            if not uses_index:
+                missing.append(name)
+            self.stdout.write(f"== {name}: {'index' if uses_index else 'NO INDEX'}")
+            self.stdout.write(plan)
+
+        if options["check"] and missing:
+            raise CommandError(f"Queries not using an index: {', '.join(missing)}")
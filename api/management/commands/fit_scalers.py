@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.registry import available_sensors, model_path, scaler_path
+from api.scaling import AffineScaler, power_range, save_scaler
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit each sensor's power scaling once, over its stored history, and save "
+        "it next to the model as saved_model/<sensor>_scaler.json. Predictions "
+        "then apply it instead of fitting every day, and can be rolled forward "
+        "as rows arrive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor", action="append", help="Sensor name (repeatable)."
+        )
+        parser.add_argument(
+            "--start", type=parse_date, help="First day to fit on (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            "--end", type=parse_date, help="Last day to fit on (YYYY-MM-DD)."
+        )
+
+    def handle(self, *args, **options):
+        if bool(options["start"]) != bool(options["end"]):
+            raise CommandError("Give both --start and --end, or neither.")
+        sensor_names = options["sensor"] or available_sensors()
+        if not sensor_names:
+            raise CommandError(f"No models found in {settings.MODEL_STORAGE_PATH}.")
+
+        for sensor_name in sensor_names:
+            data_min, data_max = power_range(
+                sensor_name, options["start"], options["end"]
+            )
+            if data_min is None:
+                self.stdout.write(f"{sensor_name}: no data, skipped")
+                continue
+            save_scaler(
+                scaler_path(sensor_name),
+                AffineScaler(data_min, data_max),
+                model_path(sensor_name),
+                start_date=str(options["start"] or ""),
+                end_date=str(options["end"] or ""),
+            )
+            self.stdout.write(
+                f"{sensor_name}: power {data_min:g} to {data_max:g} W "
+                f"-> {scaler_path(sensor_name)}"
+            )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from api.benchmarks import synthetic_telemetry, write_telemetry
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert synthetic multi-sensor telemetry, e.g. to try the API without devices."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor",
+            action="append",
+            help="Sensor name (repeatable). Defaults to 'Synthetic 1..N'.",
+        )
+        parser.add_argument("--sensors", type=int, default=3)
+        parser.add_argument(
+            "--start-date", type=parse_date, required=True, help="YYYY-MM-DD"
+        )
+        parser.add_argument("--days", type=int, default=1)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds between readings of one sensor.",
+        )
+        parser.add_argument(
+            "--outages",
+            type=float,
+            default=0,
+            help="Missing stretches of up to an hour per sensor-day.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        sensor_names = options["sensor"] or [
+            f"Synthetic {i + 1}" for i in range(options["sensors"])
+        ]
+        written = write_telemetry(
+            synthetic_telemetry(
+                sensor_names,
+                options["start_date"],
+                days=options["days"],
+                interval_seconds=options["interval"],
+                outages=options["outages"],
+                seed=options["seed"],
+            )
+        )
+        self.stdout.write(f"Inserted {written} readings for {', '.join(sensor_names)}.")
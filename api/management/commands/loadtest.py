@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(
+        url, data=data, headers={"Content-Type": "application/json"}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            code = response.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except OSError:
+        code = 0
+    return code, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure list and status latency against a running server while "
+        "predictions are being submitted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8080/api")
+        parser.add_argument("--sensor", required=True)
+        parser.add_argument(
+            "--start-date",
+            type=parse_date,
+            required=True,
+            help="First day to predict (YYYY-MM-DD); days without a stored "
+            "prediction keep the model busy.",
+        )
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--duration", type=float, default=30)
+        parser.add_argument(
+            "--pollers", type=int, default=8, help="Concurrent read clients."
+        )
+        parser.add_argument(
+            "--predictors",
+            type=int,
+            default=2,
+            help="Concurrent clients submitting predictions (0 for a baseline).",
+        )
+
+    def handle(self, *args, **options):
+        base = options["url"].rstrip("/")
+        reads = {
+            "sensors": f"{base}/sensors/?limit=100",
+            "prediction_status": f"{base}/energy/prediction/status/",
+            "calculation_status": f"{base}/energy/calculation/status/",
+        }
+        dates = [
+            str(options["start_date"] + timedelta(days=i))
+            for i in range(options["days"])
+        ]
+        deadline = time.monotonic() + options["duration"]
+        samples = {name: [] for name in [*reads, "prediction_submit"]}
+        errors = {name: 0 for name in samples}
+        lock = threading.Lock()
+
+        def record(name, code, seconds):
+            with lock:
+                samples[name].append(seconds)
+                if not 200 <= code < 300:
+                    errors[name] += 1
+
+        def poll(offset):
+            names = list(reads)
+            i = offset
+            while time.monotonic() < deadline:
+                name = names[i % len(names)]
+                record(name, *request(reads[name]))
+                i += 1
+
+        def predict(offset):
+            i = offset
+            while time.monotonic() < deadline:
+                body = {"sensor": options["sensor"], "date": dates[i % len(dates)]}
+                record(
+                    "prediction_submit",
+                    *request(f"{base}/energy/prediction/", body),
+                )
+                i += 1
+
+        threads = [
+            threading.Thread(target=poll, args=(i,)) for i in range(options["pollers"])
+        ] + [
+            threading.Thread(target=predict, args=(i,))
+            for i in range(options["predictors"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(
+            f"{'endpoint':<20} {'requests':>9} {'errors':>7} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+        )
+        for name, seconds in samples.items():
+            if not seconds:
+                continue
+            p50, p95, p99, worst = np.percentile(seconds, [50, 95, 99, 100]) * 1000
+            self.stdout.write(
+                f"{name:<20} {len(seconds):>9} {errors[name]:>7} "
+                f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {worst:>9.1f}"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Energy, PowerPrediction, PredictionSeries, Sensor
+from api.series import pack_legacy_predictions
+
+
+class Command(BaseCommand):
+    help = "Pack per-point PowerPrediction rows into one PredictionSeries per day."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-rows",
+            action="store_true",
+            help="Delete PowerPrediction rows once they are packed, including "
+            "rows of days that were packed by the migration.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            packed = pack_legacy_predictions(
+                Energy, PowerPrediction, PredictionSeries, Sensor
+            )
+            deleted = 0
+            if options["delete_rows"]:
+                deleted, _ = PowerPrediction.objects.filter(
+                    energy__prediction_series__isnull=False
+                ).delete()
+        self.stdout.write(f"{packed} days packed, {deleted} rows deleted")
@@ -0,0 +1,105 @@
+import signal
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api.precompute import (
+    PRECOMPUTE_KINDS,
+    Precompute,
+    closed_days,
+    plan_tasks,
+    precompute_sensors,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute calculations and predictions of closed days for every sensor "
+        "with a model, so API requests for them are plain lookups. Progress is "
+        "recorded per sensor-day; running it again resumes an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor", action="append", help="Sensor name (repeatable)."
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            choices=list(PRECOMPUTE_KINDS),
+            help="What to precompute (repeatable). Defaults to both.",
+        )
+        parser.add_argument(
+            "--date",
+            type=parse_date,
+            help="Last day to precompute (YYYY-MM-DD). Defaults to yesterday.",
+        )
+        parser.add_argument(
+            "--backfill-days",
+            type=int,
+            default=1,
+            help="Also fill in missing results for this many days up to --date.",
+        )
+        parser.add_argument("--workers", type=int)
+        parser.add_argument(
+            "--throttle", type=float, help="Seconds each worker pauses between tasks."
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, once after every local midnight.",
+        )
+        parser.add_argument(
+            "--delay-minutes",
+            type=float,
+            default=15,
+            help="With --loop, how long after midnight to start (late rows).",
+        )
+
+    def handle(self, *args, **options):
+        precompute = Precompute(options["workers"], options["throttle"])
+        # Ctrl-C / SIGTERM: let running tasks finish, keep the rest pending.
+        signal.signal(signal.SIGTERM, lambda *_: precompute.stop())
+
+        while True:
+            try:
+                self.run_once(precompute, options)
+            except KeyboardInterrupt:
+                precompute.stop()
+            except CommandError as e:
+                # A loop outlives a run with nothing to do yet, e.g. before
+                # the first sensor reports; it tries again the next night.
+                if not options["loop"]:
+                    raise
+                self.stderr.write(f"Skipping this run: {e}")
+            if not options["loop"] or precompute.stopped:
+                return
+
+            now = timezone.localtime()
+            next_run = timezone.make_aware(
+                datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            ) + timedelta(minutes=options["delay_minutes"])
+            self.stdout.write(f"Next run at {next_run}")
+            precompute.sleep((next_run - now).total_seconds())
+
+    def run_once(self, precompute, options):
+        sensor_names = options["sensor"] or precompute_sensors()
+        if not sensor_names:
+            raise CommandError("No sensors with both data and a model.")
+        kinds = options["kind"] or list(PRECOMPUTE_KINDS)
+        dates = closed_days(options["date"], options["backfill_days"])
+
+        tasks = plan_tasks(sensor_names, dates, kinds)
+        self.stdout.write(
+            f"{len(tasks)} task(s) for {len(sensor_names)} sensor(s), "
+            f"{dates[-1]} to {dates[0]}"
+        )
+        started = time.monotonic()
+        counts = precompute.run(tasks)
+        summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+        self.stdout.write(
+            f"Finished in {time.monotonic() - started:.1f}s: {summary or 'nothing to do'}"
+        )
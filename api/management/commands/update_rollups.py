@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.models import Sensor
+from api.rollups import rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold newly arrived sensor rows into the hourly energy rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sensor", action="append", help="Sensor name (repeatable)."
+        )
+        parser.add_argument(
+            "--since",
+            type=parse_date,
+            help="Rebuild rollups from this date (YYYY-MM-DD) instead of updating.",
+        )
+
+    def handle(self, *args, **options):
+        sensor_names = options["sensor"] or list(
+            Sensor.objects.order_by().values_list("name", flat=True).distinct()
+        )
+        for sensor_name in sensor_names:
+            if options["since"]:
+                try:
+                    processed = rebuild_rollups(sensor_name, options["since"])
+                except ValueError as e:
+                    raise CommandError(str(e))
+            else:
+                processed = refresh_rollups(sensor_name)
+            self.stdout.write(f"{sensor_name}: {processed} rows folded")
@@ -0,0 +1,194 @@
+# metrics.py
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .registry import model_path
+
+# Upper bounds in seconds; covers cached lookups up to multi-day batch inference.
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Stage timings of the current request or job, in the order they finished.
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+# Label of stages timed for a sensor without a model (see sensor_label).
+UNKNOWN_SENSOR = "unknown"
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide latency histograms and counters in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, help_text: str = "", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for (key, labels), value in sorted(self._counters.items()):
+                        if key == name:
+                            lines.append(f"{name}{format_labels(labels)} {value:g}")
+                    continue
+                for (key, labels), histogram in sorted(self._histograms.items()):
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(
+                        [*histogram.buckets, "+Inf"], histogram.counts
+                    ):
+                        cumulative += count
+                        bucket_labels = (*labels, ("le", str(bound)))
+                        lines.append(
+                            f"{name}_bucket{format_labels(bucket_labels)} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}"
+                    )
+                    lines.append(
+                        f"{name}_count{format_labels(labels)} {histogram.count}"
+                    )
+            return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def collect_timings():
+    # Gives the block its own timing list; stages timed inside append to it.
+    timings = []
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+def sensor_label(sensor: str):
+    # Stages run before the sensor name is validated (the cache check, say), so
+    # only sensors with a model get their own series: POSTed names cannot grow
+    # the label set without bound.
+    if not sensor:
+        return sensor
+    if os.path.basename(sensor) == sensor and os.path.isfile(model_path(sensor)):
+        return sensor
+    return UNKNOWN_SENSOR
+
+
+@contextmanager
+def stage(name: str, sensor: str = ""):
+    """Time a pipeline stage into the histograms, the log and the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe(
+            "energy_stage_seconds",
+            elapsed,
+            "Time spent in each prediction/calculation pipeline stage.",
+            stage=name,
+            sensor=sensor_label(sensor),
+        )
+        timings = current_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                json.dumps(
+                    {
+                        "event": "stage",
+                        "stage": name,
+                        "sensor": sensor,
+                        "ms": round(elapsed * 1000, 3),
+                    }
+                )
+            )
+
+
+def stage_totals(timings):
+    # Repeated stages (e.g. one per predicted batch) are summed into one entry.
+    durations = {}
+    for name, elapsed in timings:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    return durations
+
+
+def server_timing(timings, total: float = None):
+    durations = stage_totals(timings)
+    if total is not None:
+        durations["total"] = total
+    return ", ".join(
+        f"{name};dur={elapsed * 1000:.3f}" for name, elapsed in durations.items()
+    )
@@ -0,0 +1,115 @@
+# middleware.py
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from .metrics import collect_timings, metrics, server_timing
+
+CPROFILE = "cprofile"
+TRACEMALLOC = "tracemalloc"
+PROFILERS = (CPROFILE, TRACEMALLOC)
+
+
+def requested_profiler(request):
+    if not settings.PROFILING_ENABLED:
+        return None
+    profiler = request.GET.get("profile") or request.headers.get("X-Profile")
+    return profiler if profiler in PROFILERS else None
+
+
+def profile_report(profiler, started):
+    # cProfile: the top functions by cumulative time. tracemalloc: peak and
+    # the top allocation sites. Returned in place of the normal response.
+    if profiler == CPROFILE:
+        started.disable()
+        output = io.StringIO()
+        pstats.Stats(started, stream=output).sort_stats("cumulative").print_stats(
+            settings.PROFILING_TOP
+        )
+        return output.getvalue()
+
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    lines = [f"peak: {peak / 2**20:.2f} MiB"]
+    lines.extend(
+        str(statistic)
+        for statistic in snapshot.statistics("lineno")[: settings.PROFILING_TOP]
+    )
+    return "\n".join(lines) + "\n"
+
+
+def start_profiler(profiler):
+    if profiler == CPROFILE:
+        started = cProfile.Profile()
+        started.enable()
+        return started
+    tracemalloc.start()
+    return None
+
+
+class TimingMiddleware:
+    """Adds a Server-Timing header with the stages timed while handling the request.
+
+    Also feeds the request latency histogram, and with PROFILING_ENABLED runs the
+    request under cProfile or tracemalloc when asked via ?profile= or X-Profile.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        profiler = requested_profiler(request)
+        with collect_timings() as timings:
+            started = time.perf_counter()
+            profile = start_profiler(profiler) if profiler else None
+            response = self.get_response(request)
+            report = profile_report(profiler, profile) if profiler else None
+            return self.finish(request, response, timings, started, report)
+
+    async def __acall__(self, request):
+        # cProfile only sees the calling thread, and under ASGI that is the event
+        # loop shared by every request, so only tracemalloc is offered here.
+        profiler = requested_profiler(request)
+        if profiler == CPROFILE:
+            return HttpResponse(
+                "cprofile needs the WSGI server; use tracemalloc under ASGI.\n",
+                content_type="text/plain",
+                status=400,
+            )
+        with collect_timings() as timings:
+            started = time.perf_counter()
+            profile = start_profiler(profiler) if profiler else None
+            response = await self.get_response(request)
+            report = profile_report(profiler, profile) if profiler else None
+            return self.finish(request, response, timings, started, report)
+
+    def finish(self, request, response, timings, started, report):
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        metrics.observe(
+            "http_request_seconds",
+            elapsed,
+            "Request latency by route, method and status.",
+            route=match.route if match else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+        if report is not None:
+            response = HttpResponse(report, content_type="text/plain")
+        response["Server-Timing"] = server_timing(timings, total=elapsed)
+        return response
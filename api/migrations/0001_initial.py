@@ -0,0 +1,67 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:09
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Energy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('name', models.TextField()),
+                ('date', models.TextField()),
+                ('calculated_energy', models.FloatField(blank=True, null=True)),
+                ('predicted_energy', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'energies',
+            },
+        ),
+        migrations.CreateModel(
+            name='Sensor',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('name', models.TextField()),
+                ('voltage', models.FloatField()),
+                ('current', models.FloatField()),
+                ('power', models.FloatField()),
+                ('power_factor', models.FloatField()),
+                ('frequency', models.FloatField()),
+                ('energy', models.FloatField()),
+                ('apparent_power', models.FloatField()),
+                ('reactive_power', models.FloatField()),
+            ],
+            options={
+                'db_table': 'sensor_electrics',
+            },
+        ),
+        migrations.CreateModel(
+            name='PowerPrediction',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid1, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('power', models.FloatField()),
+                ('energy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='power_predictions', to='api.energy')),
+            ],
+            options={
+                'db_table': 'power_predictions',
+            },
+        ),
+    ]
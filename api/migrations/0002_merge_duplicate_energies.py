@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_energies(apps, schema_editor):
+    # Collapse duplicate (name, date) rows so the unique constraint can be added.
+    # The most recently updated row is kept and missing values are taken from the others.
+    Energy = apps.get_model("api", "Energy")
+    duplicates = (
+        Energy.objects.values("name", "date")
+        .annotate(total=models.Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = list(
+            Energy.objects.filter(
+                name=duplicate["name"], date=duplicate["date"]
+            ).order_by("-updated_at")
+        )
+        keep = rows[0]
+        for row in rows[1:]:
+            if keep.calculated_energy is None:
+                keep.calculated_energy = row.calculated_energy
+            if keep.predicted_energy is None:
+                keep.predicted_energy = row.predicted_energy
+                row.power_predictions.update(energy=keep)
+        keep.save()
+        Energy.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+    # Kept apart from the constraint so the data changes commit before ALTER TABLE on PostgreSQL.
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_energies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_merge_duplicate_energies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['name', 'created_at'], name='sensor_name_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['created_at'], name='sensor_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='energy',
+            constraint=models.UniqueConstraint(fields=('name', 'date'), name='energy_name_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:12
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_sensor_indexes_energy_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupCursor",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("name", models.TextField(unique=True)),
+                ("started_at", models.DateTimeField()),
+                ("last_at", models.DateTimeField(blank=True, null=True)),
+                ("last_power", models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "rollup_cursors",
+            },
+        ),
+        migrations.CreateModel(
+            name="EnergyRollup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("name", models.TextField()),
+                ("bucket_start", models.DateTimeField()),
+                ("sample_count", models.IntegerField(default=0)),
+                ("power_sum", models.FloatField(default=0)),
+                ("power_min", models.FloatField()),
+                ("power_max", models.FloatField()),
+                ("energy", models.FloatField(default=0)),
+                ("lead_energy", models.FloatField(default=0)),
+                ("first_at", models.DateTimeField()),
+                ("last_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "energy_rollups",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "bucket_start"),
+                        name="energy_rollup_bucket_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
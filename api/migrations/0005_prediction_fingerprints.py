@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_energy_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PredictionFingerprint",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("row_count", models.IntegerField()),
+                ("last_at", models.DateTimeField()),
+                ("content_hash", models.TextField()),
+                ("model_version", models.TextField()),
+                ("method", models.TextField()),
+                ("data_min", models.FloatField()),
+                ("data_max", models.FloatField()),
+                ("points", models.IntegerField()),
+                ("predicted_sum", models.FloatField()),
+                ("predicted_trapezoid", models.FloatField()),
+                ("last_predicted", models.FloatField(blank=True, null=True)),
+                (
+                    "energy",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fingerprint",
+                        to="api.energy",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "prediction_fingerprints",
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:22
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_prediction_fingerprints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PredictionSeries",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("start_at", models.DateTimeField()),
+                ("step_seconds", models.FloatField()),
+                ("points", models.IntegerField()),
+                ("values", models.BinaryField()),
+                (
+                    "energy",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prediction_series",
+                        to="api.energy",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "prediction_series",
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+# Frozen copies of what the packing needs from the app at the time of this
+# migration, so later changes to api.series cannot alter it.
+TIME_STEPS = 24
+SERIES_DTYPE = np.dtype("<f4")
+
+
+def day_bounds(selected_date):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(selected_date, time.min), tz)
+    end = timezone.make_aware(
+        datetime.combine(selected_date + timedelta(days=1), time.min), tz
+    )
+    return start, end
+
+
+def series_metadata(timestamps, points):
+    # Prediction i belongs to the sample right after window i.
+    predicted_at = timestamps[len(timestamps) - points :] if points else timestamps[-1:]
+    step_seconds = (
+        float(predicted_at[-1] - predicted_at[0]) / (len(predicted_at) - 1)
+        if len(predicted_at) > 1
+        else 0.0
+    )
+    return {
+        "start_at": datetime.fromtimestamp(predicted_at[0], tz=dt_timezone.utc),
+        "step_seconds": step_seconds,
+    }
+
+
+def pack_power_predictions(apps, schema_editor):
+    # Existing rows are kept so the migration can be reversed; drop them
+    # afterwards with `manage.py pack_predictions --delete-rows`.
+    Energy = apps.get_model("api", "Energy")
+    PowerPrediction = apps.get_model("api", "PowerPrediction")
+    PredictionSeries = apps.get_model("api", "PredictionSeries")
+    Sensor = apps.get_model("api", "Sensor")
+
+    energies = Energy.objects.filter(
+        power_predictions__isnull=False, prediction_series__isnull=True
+    ).distinct()
+    for energy in energies.iterator():
+        values = np.fromiter(
+            PowerPrediction.objects.filter(energy=energy)
+            .order_by("created_at", "id")
+            .values_list("power", flat=True),
+            dtype=np.float64,
+        )
+        selected_date = parse_date(str(energy.date))
+        start, end = day_bounds(selected_date)
+        timestamps = np.fromiter(
+            (
+                created_at.timestamp()
+                for created_at in Sensor.objects.filter(
+                    name=energy.name, created_at__gte=start, created_at__lt=end
+                )
+                .order_by("created_at")
+                .values_list("created_at", flat=True)
+            ),
+            dtype=np.float64,
+        )
+        if len(timestamps) != len(values) + TIME_STEPS:
+            # Spread the points evenly over the day.
+            timestamps = start.timestamp() + np.linspace(
+                0, (end - start).total_seconds(), len(values), endpoint=False
+            )
+
+        PredictionSeries.objects.create(
+            energy=energy,
+            values=np.ascontiguousarray(values, dtype=SERIES_DTYPE).tobytes(),
+            points=len(values),
+            **series_metadata(timestamps, len(values)),
+        )
+
+
+def unpack_power_predictions(apps, schema_editor):
+    apps.get_model("api", "PredictionSeries").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_prediction_series"),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_power_predictions, unpack_power_predictions),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_pack_power_predictions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="predictionfingerprint",
+            name="resample",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
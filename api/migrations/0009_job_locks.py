@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:27
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_prediction_fingerprint_resample"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobLock",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("key", models.TextField(unique=True)),
+                ("owner", models.TextField()),
+                ("holder", models.TextField()),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "job_locks",
+            },
+        ),
+    ]
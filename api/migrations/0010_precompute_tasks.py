@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:48
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_job_locks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrecomputeTask",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("kind", models.TextField()),
+                ("name", models.TextField()),
+                ("date", models.TextField()),
+                ("status", models.TextField(default="pending")),
+                ("attempts", models.IntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+            ],
+            options={
+                "db_table": "precompute_tasks",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "name", "date"), name="precompute_task_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
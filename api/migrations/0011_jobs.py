@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:13
+
+import rest_framework.utils.encoders
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_precompute_tasks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                ("kind", models.TextField()),
+                ("name", models.TextField()),
+                ("date", models.TextField()),
+                ("status", models.TextField(default="queued")),
+                ("holder", models.TextField()),
+                (
+                    "result",
+                    models.JSONField(
+                        blank=True,
+                        encoder=rest_framework.utils.encoders.JSONEncoder,
+                        null=True,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="")),
+                ("timings", models.JSONField(default=dict)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "jobs",
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(
+                            ("status__in", ["queued", "waiting", "running"])
+                        ),
+                        fields=("kind", "name", "date"),
+                        name="job_active_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="energy",
+            name="calculated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="energy",
+            name="predicted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
 import uuid
 
 
@@ -21,6 +22,10 @@ class Sensor(models.Model):
 
     class Meta:
         db_table = "sensor_electrics"
+        indexes = [
+            models.Index(fields=["name", "created_at"], name="sensor_name_created_idx"),
+            models.Index(fields=["created_at"], name="sensor_created_idx"),
+        ]
 
     def __str__(self):
         return f"Sensor {self.name} ({self.id})"
@@ -36,9 +41,18 @@ class Energy(models.Model):
     date = models.TextField()
     calculated_energy = models.FloatField(null=True, blank=True)
     predicted_energy = models.FloatField(null=True, blank=True)
+    # When each value was computed: one computed before its day ended only
+    # covers part of the day (see api.results.complete_results).
+    calculated_at = models.DateTimeField(null=True, blank=True)
+    predicted_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = "energies"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "date"], name="energy_name_date_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"Calculation for {self.name} on {self.date}"
@@ -63,3 +77,195 @@ class PowerPrediction(models.Model):
         return (
             f"Power prediction for {self.energy.name} on {self.energy.prediction_date}"
         )
+
+
+class EnergyRollup(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    name = models.TextField()
+    bucket_start = models.DateTimeField()
+    sample_count = models.IntegerField(default=0)
+    power_sum = models.FloatField(default=0)
+    power_min = models.FloatField()
+    power_max = models.FloatField()
+    # Trapezoid energy (kWh) between samples inside the bucket, and of the
+    # segment joining the previous bucket's last sample to this bucket's first.
+    energy = models.FloatField(default=0)
+    lead_energy = models.FloatField(default=0)
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "energy_rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "bucket_start"], name="energy_rollup_bucket_uniq"
+            ),
+        ]
+
+    @property
+    def power_mean(self):
+        return self.power_sum / self.sample_count if self.sample_count else None
+
+    def __str__(self):
+        return f"Energy rollup for {self.name} at {self.bucket_start}"
+
+
+class RollupCursor(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    name = models.TextField(unique=True)
+    started_at = models.DateTimeField()
+    last_at = models.DateTimeField(null=True, blank=True)
+    last_power = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = "rollup_cursors"
+
+    def __str__(self):
+        return f"Rollup cursor for {self.name} at {self.last_at}"
+
+
+class PredictionFingerprint(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    energy = models.OneToOneField(
+        Energy,
+        related_name="fingerprint",
+        on_delete=models.CASCADE,
+    )
+
+    # Identity of the telemetry and model the stored prediction was made from.
+    row_count = models.IntegerField()
+    last_at = models.DateTimeField()
+    content_hash = models.TextField()
+    model_version = models.TextField()
+    method = models.TextField()
+    resample = models.TextField(default="", blank=True)
+
+    # Enough state to extend the prediction when only new rows arrived.
+    data_min = models.FloatField()
+    data_max = models.FloatField()
+    points = models.IntegerField()
+    predicted_sum = models.FloatField()
+    predicted_trapezoid = models.FloatField()
+    last_predicted = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = "prediction_fingerprints"
+
+    def __str__(self):
+        return f"Prediction fingerprint for {self.energy.name} on {self.energy.date}"
+
+
+class PredictionSeries(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    energy = models.OneToOneField(
+        Energy,
+        related_name="prediction_series",
+        on_delete=models.CASCADE,
+    )
+
+    # The whole predicted power series as packed little-endian float32
+    # (api.series), point i at start_at + i * step_seconds.
+    start_at = models.DateTimeField()
+    step_seconds = models.FloatField()
+    points = models.IntegerField()
+    values = models.BinaryField()
+
+    class Meta:
+        db_table = "prediction_series"
+
+    def __str__(self):
+        return f"Prediction series for {self.energy.name} on {self.energy.date}"
+
+
+class JobLock(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # The unique key makes acquiring a plain INSERT that at most one worker wins.
+    key = models.TextField(unique=True)
+    owner = models.TextField()
+    holder = models.TextField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "job_locks"
+
+    def __str__(self):
+        return f"Lock {self.key} held by {self.holder} until {self.expires_at}"
+
+
+class Job(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # A background job (api.jobs), kept here so every worker process can report
+    # it. The process running it renews updated_at while it is queued or running.
+    kind = models.TextField()
+    name = models.TextField()
+    date = models.TextField()
+    status = models.TextField(default="queued")
+    holder = models.TextField()
+    result = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    error = models.TextField(blank=True, default="")
+    timings = models.JSONField(default=dict)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "jobs"
+        constraints = [
+            # At most one queued or running job per key, across all processes.
+            models.UniqueConstraint(
+                fields=["kind", "name", "date"],
+                condition=models.Q(status__in=["queued", "waiting", "running"]),
+                name="job_active_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.kind} for {self.name} on {self.date}: {self.status}"
+
+
+class PrecomputeTask(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # One calculation or prediction of a closed sensor-day (api.precompute);
+    # finished tasks are skipped when an interrupted run is started again.
+    kind = models.TextField()
+    name = models.TextField()
+    date = models.TextField()
+    status = models.TextField(default="pending")
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = "precompute_tasks"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "name", "date"], name="precompute_task_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Precompute {self.kind} for {self.name} on {self.date}: {self.status}"
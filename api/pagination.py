@@ -0,0 +1,36 @@
+# pagination.py
+import base64
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        created_at = parse_datetime(created_at)
+        pk = uuid.UUID(pk)
+    except Exception:
+        raise InvalidCursor("Invalid cursor.")
+    if created_at is None:
+        raise InvalidCursor("Invalid cursor.")
+    return created_at, pk
+
+
+def keyset_filter(queryset, cursor: str):
+    # Rows strictly after the cursor in ("-created_at", "-id") order.
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+    )
@@ -0,0 +1,198 @@
+# precompute.py
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .locks import (
+    LockLost,
+    LockTimeout,
+    held_locks_queryset,
+    hold_lock,
+    lock_key,
+)
+from .models import PrecomputeTask, Sensor
+from .prediction_cache import store_energy_prediction
+from .registry import available_sensors
+from .results import complete_results
+from .utils import NoSensorDataError, store_energy_calculation
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+BUSY = "busy"
+NO_DATA = "no_data"
+# Busy and failed tasks are picked up again by the next run.
+RUNNABLE_STATES = (PENDING, BUSY, FAILED)
+
+CALCULATION = "calculation"
+PREDICTION = "prediction"
+PRECOMPUTE_KINDS = {
+    CALCULATION: (store_energy_calculation, "calculated_energy"),
+    PREDICTION: (store_energy_prediction, "predicted_energy"),
+}
+
+
+def precompute_sensors():
+    # Sensors that report data and have a model to predict with.
+    with_models = set(available_sensors())
+    return sorted(
+        name
+        for name in Sensor.objects.order_by().values_list("name", flat=True).distinct()
+        if name in with_models
+    )
+
+
+def closed_days(end_date=None, backfill_days: int = 1):
+    # Newest first, so yesterday is ready before the backfill starts.
+    end_date = end_date or timezone.localdate() - timedelta(days=1)
+    return [end_date - timedelta(days=i) for i in range(max(backfill_days, 1))]
+
+
+def plan_tasks(sensor_names, dates, kinds):
+    """Record a task for every sensor-day and kind without a whole-day result.
+
+    A result stored while its day was still open (by a live request) covers
+    only part of the day, so it is planned again. Tasks already recorded by
+    an earlier, interrupted run are kept as they are, so finished ones are
+    not repeated. Returns the tasks left to run.
+    """
+    dates = [str(d) for d in dates]
+    stored = {
+        (kind, name, selected_date)
+        for kind in kinds
+        for name, selected_date in complete_results(
+            sensor_names, dates, PRECOMPUTE_KINDS[kind][1]
+        )
+    }
+    PrecomputeTask.objects.bulk_create(
+        [
+            PrecomputeTask(kind=kind, name=name, date=selected_date)
+            for selected_date in dates
+            for name in sensor_names
+            for kind in kinds
+            if (kind, name, selected_date) not in stored
+        ],
+        batch_size=settings.BULK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    runnable = PrecomputeTask.objects.filter(
+        kind__in=kinds,
+        name__in=sensor_names,
+        date__in=dates,
+        status__in=RUNNABLE_STATES,
+        attempts__lt=settings.PRECOMPUTE_MAX_ATTEMPTS,
+    ).order_by("-date", "name", "kind")
+    # Days stored since a task was recorded (e.g. by a live request) are skipped.
+    return [
+        task for task in runnable if (task.kind, task.name, task.date) not in stored
+    ]
+
+
+def live_jobs():
+    # Jobs other processes (the API workers) are running right now.
+    own = f"{socket.gethostname()}:{os.getpid()}:"
+    return held_locks_queryset().exclude(holder__startswith=own).count()
+
+
+class Precompute:
+    """Runs precompute tasks on a small thread pool, yielding to live traffic.
+
+    Each worker pauses ``throttle_seconds`` between tasks, and waits while
+    PRECOMPUTE_MAX_LIVE_JOBS or more jobs hold locks in other processes.
+    """
+
+    def __init__(self, workers: int = None, throttle_seconds: float = None):
+        self.workers = workers or settings.PRECOMPUTE_WORKERS
+        self.throttle_seconds = (
+            settings.PRECOMPUTE_THROTTLE_SECONDS
+            if throttle_seconds is None
+            else throttle_seconds
+        )
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def stop(self):
+        # Tasks in progress finish; the rest stay pending for the next run.
+        self._stopped.set()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def sleep(self, seconds: float):
+        # Returns early when stopped.
+        self._stopped.wait(seconds)
+
+    def wait_for_quiet(self):
+        while (
+            not self._stopped.is_set()
+            and live_jobs() >= settings.PRECOMPUTE_MAX_LIVE_JOBS
+        ):
+            self._stopped.wait(settings.JOB_LOCK_POLL_SECONDS)
+
+    def run_task(self, task: PrecomputeTask):
+        if self._stopped.is_set():
+            return
+        self.wait_for_quiet()
+        if self._stopped.is_set():
+            return
+
+        func, _ = PRECOMPUTE_KINDS[task.kind]
+        task.attempts += 1
+        task.error = ""
+        try:
+            # Same lock as the API jobs: a day a live request is busy with is
+            # left to it and retried by the next run.
+            with hold_lock(lock_key(task.kind, task.name, task.date), wait=0):
+                func(
+                    sensor_name=task.name,
+                    selected_date=parse_date(task.date),
+                )
+            task.status = DONE
+        except (LockTimeout, LockLost):
+            task.status = BUSY
+            task.attempts -= 1
+        except NoSensorDataError as e:
+            task.status = NO_DATA
+            task.error = str(e)
+        except Exception as e:
+            task.status = FAILED
+            task.error = f"{type(e).__name__}: {e}"
+        finally:
+            task.save(update_fields=["status", "attempts", "error", "updated_at"])
+            close_old_connections()
+
+        with self._lock:
+            self.counts[task.status] = self.counts.get(task.status, 0) + 1
+        logger.info(
+            "Precompute %s for %s on %s: %s",
+            task.kind,
+            task.name,
+            task.date,
+            task.status,
+        )
+        self._stopped.wait(self.throttle_seconds)
+
+    def run(self, tasks):
+        self.counts = {}
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="precompute"
+        ) as pool:
+            try:
+                list(pool.map(self.run_task, tasks))
+            except KeyboardInterrupt:
+                # Stop before the pool waits for the queued tasks on exit.
+                self.stop()
+                raise
+        return dict(self.counts)
@@ -0,0 +1,30 @@
+# queries.py
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Sensor
+
+
+def day_bounds(start_date, end_date=None, tz=None):
+    # Half-open [start, end) timestamps covering whole local days, so filters
+    # compare the raw created_at column and can use sensor_name_created_idx.
+    # created_at__date wraps the column in a cast and forces a sequential scan.
+    tz = tz or timezone.get_current_timezone()
+    end_date = end_date or start_date
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(
+        datetime.combine(end_date + timedelta(days=1), time.min), tz
+    )
+    return start, end
+
+
+def day_range_filter(start_date, end_date=None, tz=None):
+    start, end = day_bounds(start_date, end_date, tz)
+    return {"created_at__gte": start, "created_at__lt": end}
+
+
+def sensor_day_queryset(sensor_name, start_date, end_date=None):
+    return Sensor.objects.filter(
+        name=sensor_name, **day_range_filter(start_date, end_date)
+    ).order_by("created_at")
@@ -0,0 +1,215 @@
+# registry.py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .inference import KERAS, MODEL_SUFFIXES, TFLITE, load_backend_model
+from .scaling import load_scaler
+
+MODEL_SUFFIX = MODEL_SUFFIXES[KERAS]
+SCALER_SUFFIX = "_scaler.json"
+
+logger = logging.getLogger(__name__)
+
+
+def model_path(sensor_name: str, backend: str = KERAS):
+    return os.path.join(
+        settings.MODEL_STORAGE_PATH, f"{sensor_name}{MODEL_SUFFIXES[backend]}"
+    )
+
+
+def scaler_path(sensor_name: str):
+    # Scaling parameters live next to the Keras file they were fitted for.
+    return os.path.join(settings.MODEL_STORAGE_PATH, f"{sensor_name}{SCALER_SUFFIX}")
+
+
+def resolve_backend(sensor_name: str):
+    backend = settings.INFERENCE_BACKEND
+    if backend != TFLITE:
+        return backend
+    try:
+        converted_at = os.stat(model_path(sensor_name, TFLITE)).st_mtime_ns
+    except OSError:
+        # Not converted yet (see the convert_models command); use the Keras file.
+        return KERAS
+    try:
+        saved_at = os.stat(model_path(sensor_name, KERAS)).st_mtime_ns
+    except OSError:
+        return TFLITE
+    # A .h5 replaced after the conversion is served as Keras until
+    # convert_models runs again, never as the stale flatbuffer.
+    return KERAS if saved_at > converted_at else TFLITE
+
+
+def file_stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0, 0
+    return stat.st_mtime_ns, stat.st_size
+
+
+def model_version(sensor_name: str):
+    # Cheap on-disk identity of the served model, the Keras file it comes from
+    # and the scaler; changes whenever any of them is replaced.
+    backend = resolve_backend(sensor_name)
+    try:
+        stat = os.stat(model_path(sensor_name, backend))
+    except OSError:
+        raise FileNotFoundError(f"Model for sensor '{sensor_name}' not found.")
+    return (
+        backend,
+        stat.st_mtime_ns,
+        stat.st_size,
+        *file_stamp(model_path(sensor_name, KERAS)),
+        file_stamp(scaler_path(sensor_name))[0],
+    )
+
+
+def available_sensors():
+    if not os.path.isdir(settings.MODEL_STORAGE_PATH):
+        return []
+    return sorted(
+        filename[: -len(MODEL_SUFFIX)]
+        for filename in os.listdir(settings.MODEL_STORAGE_PATH)
+        if filename.endswith(MODEL_SUFFIX)
+    )
+
+
+class ModelRegistry:
+    """Process-wide LRU of loaded models, with their persisted scalers, keyed by
+    sensor name and file version."""
+
+    def __init__(self, max_size: int = 8):
+        self.max_size = max_size
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        # One lock per sensor, held while its model loads, so a slow load only
+        # makes requests for that sensor wait.
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def _load(self, sensor_name: str, backend: str):
+        started = time.perf_counter()
+        try:
+            model = load_backend_model(
+                model_path(sensor_name, backend),
+                backend,
+                num_threads=settings.INFERENCE_THREADS,
+                inter_op_threads=settings.INFERENCE_INTER_OP_THREADS,
+                batch_size=settings.KERAS_BATCH_SIZE,
+            )
+        except Exception:
+            raise FileNotFoundError(f"Model for sensor '{sensor_name}' not found.")
+        scaler = load_scaler(scaler_path(sensor_name), model_path(sensor_name, KERAS))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += elapsed
+        logger.info(
+            "Loaded %s model for %s in %.3fs%s",
+            backend,
+            sensor_name,
+            elapsed,
+            " with its scaler" if scaler else "",
+        )
+        return model, scaler
+
+    def get(self, sensor_name: str):
+        return self.get_with_scaler(sensor_name)[0]
+
+    def scaler(self, sensor_name: str):
+        # The sensor's persisted AffineScaler, or None to fit each day.
+        return self.get_with_scaler(sensor_name)[1]
+
+    def get_with_scaler(self, sensor_name: str):
+        version = model_version(sensor_name)
+
+        with self._lock:
+            cached = self._cached(sensor_name, version)
+            if cached is not None:
+                return cached
+            loading = self._loading.setdefault(sensor_name, threading.Lock())
+
+        with loading:
+            # Another request may have loaded it while this one waited.
+            with self._lock:
+                cached = self._cached(sensor_name, version)
+                if cached is not None:
+                    return cached
+                reload = sensor_name in self._models
+
+            model, scaler = self._load(sensor_name, version[0])
+
+            with self._lock:
+                self.misses += 1
+                if reload:
+                    self.reloads += 1
+                self._models[sensor_name] = (version, model, scaler)
+                self._models.move_to_end(sensor_name)
+
+                while len(self._models) > self.max_size:
+                    evicted, _ = self._models.popitem(last=False)
+                    self.evictions += 1
+                    logger.info("Evicted model for %s", evicted)
+
+            return model, scaler
+
+    def _cached(self, sensor_name: str, version):
+        # Call with self._lock held.
+        entry = self._models.get(sensor_name)
+        if entry is None or entry[0] != version:
+            return None
+        self.hits += 1
+        self._models.move_to_end(sensor_name)
+        return entry[1:]
+
+    def preload(self, sensor_names=None):
+        if sensor_names is None:
+            sensor_names = available_sensors()
+        loaded = []
+        for sensor_name in list(sensor_names)[: self.max_size]:
+            try:
+                self.get(sensor_name)
+                loaded.append(sensor_name)
+            except FileNotFoundError as e:
+                logger.warning("%s", e)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "sensors": {
+                    sensor_name: entry[0][0]
+                    for sensor_name, entry in self._models.items()
+                },
+                "scalers": sorted(
+                    sensor_name
+                    for sensor_name, entry in self._models.items()
+                    if entry[2] is not None
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "load_seconds": round(self.load_seconds, 6),
+            }
+
+
+model_registry = ModelRegistry(max_size=settings.MODEL_REGISTRY_SIZE)
@@ -0,0 +1,141 @@
+# resampling.py
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+MEAN = "mean"
+LAST = "last"
+RESAMPLE_AGGREGATIONS = (MEAN, LAST)
+
+INTERPOLATE = "interpolate"
+FFILL = "ffill"
+DROP = "drop"
+RESAMPLE_FILLS = (INTERPOLATE, FFILL, DROP)
+
+
+def parse_interval(value):
+    # Accepts pandas offsets ("15min", "30s", "1h") or plain seconds.
+    if value in (None, ""):
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            seconds = pd.Timedelta(value).total_seconds()
+        except ValueError:
+            raise ValueError(f"Invalid resample interval '{value}'.")
+    if seconds <= 0:
+        raise ValueError(f"Resample interval must be positive, got '{value}'.")
+    return seconds
+
+
+def resample_interval(sensor_name, requested=None):
+    """Seconds between resampled points for a sensor, or None to use raw samples.
+
+    A per-request value wins over SENSOR_RESAMPLE_INTERVALS, which wins over
+    PREDICTION_RESAMPLE_INTERVAL. "raw" turns resampling off.
+    """
+    value = requested
+    if value is None:
+        value = settings.SENSOR_RESAMPLE_INTERVALS.get(
+            sensor_name, settings.PREDICTION_RESAMPLE_INTERVAL
+        )
+    if value == "raw":
+        return None
+    return parse_interval(value)
+
+
+def gap_ranges(empty):
+    # [start, end) slot index pairs of consecutive empty slots.
+    edges = np.diff(np.r_[0, empty.astype(np.int8), 0])
+    return np.column_stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)])
+
+
+def resample_series(
+    timestamps, power, interval_seconds, aggregation=None, fill=None, origin=None
+):
+    """Aggregate an irregular series onto fixed slots of ``interval_seconds``.
+
+    Slots are aligned to ``origin`` (the start of the day, so slot i is a real
+    time of day) and span the first to the last sample. Returns the slot start
+    timestamps, the slot values and a report of the empty slots.
+    """
+    aggregation = aggregation or settings.RESAMPLE_AGGREGATION
+    fill = fill or settings.RESAMPLE_FILL
+    if aggregation not in RESAMPLE_AGGREGATIONS:
+        raise ValueError(
+            f"Unknown resample aggregation '{aggregation}'. "
+            f"Use one of: {', '.join(RESAMPLE_AGGREGATIONS)}."
+        )
+    if fill not in RESAMPLE_FILLS:
+        raise ValueError(
+            f"Unknown resample fill '{fill}'. Use one of: {', '.join(RESAMPLE_FILLS)}."
+        )
+
+    report = {
+        "interval_seconds": interval_seconds,
+        "samples": len(timestamps),
+        "slots": 0,
+        "filled": 0,
+        "gaps": [],
+    }
+    if not len(timestamps):
+        return timestamps, power, report
+
+    origin = timestamps[0] if origin is None else origin
+    slots = np.floor((timestamps - origin) / interval_seconds).astype(np.int64)
+    first = slots[0]
+    slots -= first
+    count = int(slots[-1]) + 1
+    slot_timestamps = origin + (first + np.arange(count)) * interval_seconds
+
+    counts = np.bincount(slots, minlength=count)
+    if aggregation == MEAN:
+        values = np.bincount(slots, weights=power, minlength=count)
+        np.divide(values, counts, out=values, where=counts > 0)
+    else:
+        # Timestamps are sorted, so a slot's last sample is the one where the
+        # slot number changes next (or the final sample).
+        last = np.flatnonzero(np.diff(slots, append=-1))
+        values = np.zeros(count, dtype=np.float64)
+        values[slots[last]] = power[last]
+
+    empty = counts == 0
+    report["slots"] = count
+    report["filled"] = int(empty.sum())
+    report["gaps"] = [
+        [
+            datetime.fromtimestamp(slot_timestamps[start], tz=dt_timezone.utc),
+            datetime.fromtimestamp(
+                slot_timestamps[0] + end * interval_seconds, tz=dt_timezone.utc
+            ),
+        ]
+        for start, end in gap_ranges(empty)
+    ]
+
+    if report["filled"]:
+        present = ~empty
+        if fill == INTERPOLATE:
+            values[empty] = np.interp(
+                slot_timestamps[empty], slot_timestamps[present], values[present]
+            )
+        elif fill == FFILL:
+            last_present = np.maximum.accumulate(np.where(present, np.arange(count), 0))
+            values = values[last_present]
+        else:
+            slot_timestamps, values = slot_timestamps[present], values[present]
+            report["filled"] = 0
+
+    return slot_timestamps, values, report
+
+
+def resample_key(interval_seconds):
+    # Identifies the resampling a stored prediction was made with ("" for raw).
+    if interval_seconds is None:
+        return ""
+    return (
+        f"{interval_seconds:g}s:{settings.RESAMPLE_AGGREGATION}:"
+        f"{settings.RESAMPLE_FILL}"
+    )
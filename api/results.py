@@ -0,0 +1,162 @@
+# results.py
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .locks import check_locks
+from .models import Energy, PredictionFingerprint
+from .queries import day_bounds
+from .series import bulk_write_prediction_series, write_prediction_series
+
+FINGERPRINT_FIELDS = (
+    "row_count",
+    "last_at",
+    "content_hash",
+    "model_version",
+    "method",
+    "resample",
+    "data_min",
+    "data_max",
+    "points",
+    "predicted_sum",
+    "predicted_trapezoid",
+    "last_predicted",
+)
+
+# The column recording when each result field was computed.
+RESULT_STAMPS = {
+    "calculated_energy": "calculated_at",
+    "predicted_energy": "predicted_at",
+}
+
+
+def result_key(sensor_name, selected_date):
+    return sensor_name, str(selected_date)
+
+
+def covers_whole_day(selected_date, computed_at):
+    # A result computed before its local day ended (or before results were
+    # stamped) only saw part of the day's readings.
+    if computed_at is None:
+        return False
+    if isinstance(selected_date, str):
+        selected_date = parse_date(selected_date)
+    return computed_at >= day_bounds(selected_date)[1]
+
+
+def complete_results(sensor_names, dates, field: str):
+    """Keys of the stored ``field`` results that covered their whole day.
+
+    Other stored results, like a calculation made while the day was still
+    filling up, are due to be computed again once the day has closed.
+    """
+    rows = Energy.objects.filter(
+        name__in=sensor_names,
+        date__in=[str(d) for d in dates],
+        **{f"{field}__isnull": False},
+    ).values_list("name", "date", RESULT_STAMPS[field])
+    return {
+        result_key(sensor_name, selected_date)
+        for sensor_name, selected_date, computed_at in rows
+        if covers_whole_day(selected_date, computed_at)
+    }
+
+
+def upsert_energies(results, field: str, batch_size: int = None):
+    """Insert or update the Energy row of each ``(sensor_name, date, value)``.
+
+    One INSERT ... ON CONFLICT (name, date) DO UPDATE per ``batch_size``
+    results, touching only ``field`` and its stamp, so a calculation never
+    overwrites the prediction of the same day or the other way round. The
+    stamp is the time of the write; see complete_results. Returns the rows,
+    with their database ids, keyed by ``(sensor_name, date string)``.
+    """
+    # Every stored result goes through here; none is written under a lock
+    # that was lost, as another worker may own the day by now.
+    check_locks()
+    batch_size = batch_size or settings.RESULT_BATCH_SIZE
+    # Later results for the same sensor-day win, as they would row by row.
+    values = {
+        result_key(sensor_name, selected_date): value
+        for sensor_name, selected_date, value in results
+    }
+    if not values:
+        return {}
+
+    stamp = RESULT_STAMPS[field]
+    computed_at = timezone.now()
+    with transaction.atomic():
+        Energy.objects.bulk_create(
+            [
+                Energy(
+                    name=sensor_name,
+                    date=selected_date,
+                    **{field: value, stamp: computed_at},
+                )
+                for (sensor_name, selected_date), value in values.items()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["name", "date"],
+            update_fields=[field, stamp, "updated_at"],
+        )
+        # Rows that already existed keep their id, not the one generated here.
+        energies = Energy.objects.filter(
+            name__in={sensor_name for sensor_name, _ in values},
+            date__in={selected_date for _, selected_date in values},
+        )
+        return {
+            key: energy
+            for energy in energies
+            if (key := result_key(energy.name, energy.date)) in values
+        }
+
+
+def write_prediction_results(
+    results, append: bool = False, storage: str = None, batch_size: int = None
+):
+    """Store many ``(sensor_name, date, predicted_energy, timestamps, values, fingerprint)``.
+
+    Every stored prediction goes through here, so each day's
+    PredictionFingerprint is written with it and later requests for the day
+    are cache hits, whichever path predicted it. With ``append`` the values
+    extend each day's stored series instead of replacing it. The Energy
+    upserts, series and fingerprints commit together, so a failed run
+    leaves no half-written day behind.
+    """
+    results = list(results)
+    with transaction.atomic():
+        energies = upsert_energies(
+            (
+                (sensor_name, selected_date, predicted_energy)
+                for sensor_name, selected_date, predicted_energy, *_ in results
+            ),
+            "predicted_energy",
+            batch_size=batch_size,
+        )
+        series = [
+            (energies[result_key(sensor_name, selected_date)], timestamps, values)
+            for sensor_name, selected_date, _, timestamps, values, _ in results
+        ]
+        if append:
+            for energy, timestamps, values in series:
+                write_prediction_series(
+                    energy, timestamps, values, append=True, storage=storage
+                )
+        else:
+            bulk_write_prediction_series(series, storage=storage, batch_size=batch_size)
+        PredictionFingerprint.objects.bulk_create(
+            [
+                PredictionFingerprint(
+                    energy=energies[result_key(sensor_name, selected_date)],
+                    **fingerprint,
+                )
+                for sensor_name, selected_date, *_, fingerprint in results
+            ],
+            batch_size=batch_size or settings.RESULT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["energy"],
+            update_fields=[*FINGERPRINT_FIELDS, "updated_at"],
+        )
+    return energies
@@ -0,0 +1,374 @@
+# rollups.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core import checks
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .energy import MEAN_INTERVAL, TRAPEZOID, fetch_power_series
+from .models import EnergyRollup, RollupCursor, Sensor
+from .queries import day_bounds
+
+BUCKET_SECONDS = 3600
+
+
+def to_datetime(timestamp: float):
+    return datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc)
+
+
+def bucket_origin():
+    # Seconds past the UTC hour at which local hours start: 0 for whole-hour
+    # offsets, 1800 in Asia/Kolkata (UTC+5:30). Buckets are local hours, so
+    # they always add up to local days.
+    offset = timezone.localtime().utcoffset().total_seconds()
+    return -offset % BUCKET_SECONDS
+
+
+def bucket_starts(timestamps, origin=None):
+    origin = bucket_origin() if origin is None else origin
+    return np.floor((timestamps - origin) / BUCKET_SECONDS) * BUCKET_SECONDS + origin
+
+
+def check_bucket_origin(app_configs, **kwargs):
+    # Local hours only stay on one grid when every offset of the time zone
+    # (e.g. with and without daylight saving) has the same minutes past the
+    # hour; in zones such as Australia/Lord_Howe they do not.
+    if not settings.ENERGY_ROLLUPS:
+        return []
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    origins = {
+        -(now + timedelta(days=day)).astimezone(tz).utcoffset().total_seconds()
+        % BUCKET_SECONDS
+        for day in range(-730, 731, 7)
+    }
+    if len(origins) == 1:
+        return []
+    return [
+        checks.Error(
+            f"TIME_ZONE {settings.TIME_ZONE!r} moves local hours by part of an "
+            "hour during the year, so hourly energy rollups cannot add up to "
+            "local days.",
+            hint="Set ENERGY_ROLLUPS=False, or use another TIME_ZONE.",
+            id="api.E001",
+        )
+    ]
+
+
+def fold_samples(timestamps, power, last_at=None, last_power=None):
+    # Aggregate sorted samples into local-hour buckets in one vectorized pass.
+    origin = bucket_origin()
+    buckets = bucket_starts(timestamps, origin)
+
+    previous_ts = np.empty_like(timestamps)
+    previous_power = np.empty_like(power)
+    previous_ts[1:] = timestamps[:-1]
+    previous_power[1:] = power[:-1]
+    has_previous = np.ones(len(timestamps), dtype=bool)
+    if last_at is None:
+        has_previous[0] = False
+        previous_ts[0] = timestamps[0]
+        previous_power[0] = power[0]
+    else:
+        previous_ts[0] = last_at
+        previous_power[0] = last_power
+
+    segment_energy = (
+        (power + previous_power) / 2 * (timestamps - previous_ts) / 3600 / 1000
+    )  # kWh
+    segment_energy[~has_previous] = 0.0
+
+    previous_buckets = bucket_starts(previous_ts, origin)
+    is_lead = has_previous & (previous_buckets != buckets)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)] - 1
+    return {
+        "bucket_start": buckets[starts],
+        "sample_count": np.diff(np.r_[starts, len(timestamps)]),
+        "power_sum": np.add.reduceat(power, starts),
+        "power_min": np.minimum.reduceat(power, starts),
+        "power_max": np.maximum.reduceat(power, starts),
+        "energy": np.add.reduceat(np.where(is_lead, 0.0, segment_energy), starts),
+        "lead_energy": np.add.reduceat(np.where(is_lead, segment_energy, 0.0), starts),
+        "first_at": timestamps[starts],
+        "last_at": timestamps[ends],
+    }
+
+
+def apply_buckets(sensor_name, folded):
+    bucket_starts = [to_datetime(ts) for ts in folded["bucket_start"]]
+    existing = {
+        rollup.bucket_start: rollup
+        for rollup in EnergyRollup.objects.filter(
+            name=sensor_name, bucket_start__in=bucket_starts
+        )
+    }
+
+    now = timezone.now()
+    created, updated = [], []
+    for i, bucket_start in enumerate(bucket_starts):
+        rollup = existing.get(bucket_start)
+        if rollup is None:
+            created.append(
+                EnergyRollup(
+                    name=sensor_name,
+                    bucket_start=bucket_start,
+                    sample_count=int(folded["sample_count"][i]),
+                    power_sum=float(folded["power_sum"][i]),
+                    power_min=float(folded["power_min"][i]),
+                    power_max=float(folded["power_max"][i]),
+                    energy=float(folded["energy"][i]),
+                    lead_energy=float(folded["lead_energy"][i]),
+                    first_at=to_datetime(folded["first_at"][i]),
+                    last_at=to_datetime(folded["last_at"][i]),
+                )
+            )
+            continue
+
+        # Only the open bucket can already exist; new samples extend it.
+        rollup.sample_count += int(folded["sample_count"][i])
+        rollup.power_sum += float(folded["power_sum"][i])
+        rollup.power_min = min(rollup.power_min, float(folded["power_min"][i]))
+        rollup.power_max = max(rollup.power_max, float(folded["power_max"][i]))
+        rollup.energy += float(folded["energy"][i])
+        rollup.last_at = to_datetime(folded["last_at"][i])
+        rollup.updated_at = now
+        updated.append(rollup)
+
+    EnergyRollup.objects.bulk_create(created)
+    EnergyRollup.objects.bulk_update(
+        updated,
+        [
+            "sample_count",
+            "power_sum",
+            "power_min",
+            "power_max",
+            "energy",
+            "last_at",
+            "updated_at",
+        ],
+    )
+    return len(created), len(updated)
+
+
+def bucket_floor(moment):
+    return to_datetime(bucket_starts(moment.timestamp()))
+
+
+def start_rollups(sensor_name, started_at=None):
+    # Track a sensor from the start of today (or ``started_at``); earlier rows
+    # are only folded by a rebuild (update_rollups --since).
+    cursor, _ = RollupCursor.objects.get_or_create(
+        name=sensor_name,
+        defaults={"started_at": started_at or day_bounds(timezone.localdate())[0]},
+    )
+    return cursor
+
+
+def late_rows_since(cursor):
+    """Start of the recent window if rows landed behind the cursor, else None.
+
+    Rows are folded in created_at order, so one that arrives with a
+    created_at at or before ``cursor.last_at`` is never picked up by the
+    forward pass. Over the last ROLLUP_LATE_WINDOW_SECONDS the raw row count
+    is compared with the rollups' sample count; any difference means rows
+    arrived late there.
+    """
+    if cursor.last_at is None:
+        return None
+    window_start = bucket_floor(
+        cursor.last_at - timedelta(seconds=settings.ROLLUP_LATE_WINDOW_SECONDS)
+    )
+    raw = Sensor.objects.filter(
+        name=cursor.name,
+        created_at__gte=max(window_start, cursor.started_at),
+        created_at__lte=cursor.last_at,
+    ).count()
+    folded = (
+        EnergyRollup.objects.filter(
+            name=cursor.name, bucket_start__gte=window_start
+        ).aggregate(samples=Sum("sample_count"))["samples"]
+        or 0
+    )
+    return window_start if raw != folded else None
+
+
+def refold_rollups(cursor, since):
+    """Fold the rows from the bucket holding ``since`` up to the cursor again.
+
+    For rows that arrived after later ones were already folded: that bucket
+    and every one after it are rebuilt from sensor_electrics. Call with the
+    cursor locked. Returns the number of rows folded.
+    """
+    bucket_start = bucket_floor(max(since, cursor.started_at))
+    first_at = max(bucket_start, cursor.started_at)
+    sensor_data = Sensor.objects.filter(name=cursor.name)
+    previous = (
+        sensor_data.filter(created_at__gte=cursor.started_at, created_at__lt=first_at)
+        .order_by("-created_at")
+        .values_list("created_at", "power")
+        .first()
+    )
+    timestamps, power = fetch_power_series(
+        sensor_data.filter(
+            created_at__gte=first_at, created_at__lte=cursor.last_at
+        ).order_by("created_at")
+    )
+
+    EnergyRollup.objects.filter(
+        name=cursor.name, bucket_start__gte=bucket_start
+    ).delete()
+    if len(timestamps):
+        apply_buckets(
+            cursor.name,
+            fold_samples(
+                timestamps,
+                power,
+                last_at=previous[0].timestamp() if previous else None,
+                last_power=previous[1] if previous else None,
+            ),
+        )
+        cursor.last_power = float(power[-1])
+    return len(timestamps)
+
+
+def refresh_rollups(sensor_name, started_at=None, since=None):
+    # Fold rows that arrived since the cursor into the hourly rollups. Only new
+    # rows are read, so the cost is O(new rows) however long the day has run.
+    # Rows that landed behind the cursor (from ``since``, the earliest
+    # created_at of rows just written, or found by late_rows_since) have
+    # their buckets folded again first.
+    processed = 0
+    with transaction.atomic():
+        cursor, _ = RollupCursor.objects.select_for_update().get_or_create(
+            name=sensor_name,
+            defaults={"started_at": started_at or day_bounds(timezone.localdate())[0]},
+        )
+
+        if cursor.last_at is not None:
+            late_since = (
+                since if since is not None and since <= cursor.last_at else None
+            )
+            late_since = late_since or late_rows_since(cursor)
+            if late_since is not None:
+                processed += refold_rollups(cursor, late_since)
+
+        while True:
+            sensor_data = Sensor.objects.filter(name=sensor_name)
+            if cursor.last_at is None:
+                sensor_data = sensor_data.filter(created_at__gte=cursor.started_at)
+            else:
+                sensor_data = sensor_data.filter(created_at__gt=cursor.last_at)
+            sensor_data = sensor_data.order_by("created_at")[
+                : settings.ROLLUP_BATCH_ROWS
+            ]
+
+            timestamps, power = fetch_power_series(sensor_data)
+            if not len(timestamps):
+                break
+
+            full_batch = len(timestamps) == settings.ROLLUP_BATCH_ROWS
+            if full_batch and timestamps[0] != timestamps[-1]:
+                # The cursor resumes after last_at, so never stop part-way
+                # through rows that share the final timestamp (bulk inserts do).
+                keep = np.searchsorted(timestamps, timestamps[-1], side="left")
+                timestamps, power = timestamps[:keep], power[:keep]
+
+            folded = fold_samples(
+                timestamps,
+                power,
+                last_at=cursor.last_at.timestamp() if cursor.last_at else None,
+                last_power=cursor.last_power,
+            )
+            apply_buckets(sensor_name, folded)
+
+            cursor.last_at = to_datetime(timestamps[-1])
+            cursor.last_power = float(power[-1])
+            processed += len(timestamps)
+            if not full_batch:
+                break
+
+        cursor.save()
+    return processed
+
+
+def rebuild_rollups(sensor_name, since):
+    # Rollups are folded from sensor_electrics only, so days pruned into the
+    # archive would come back empty; such ranges are refused.
+    from .archive import pruned_dates  # api.archive imports this module.
+
+    pruned = pruned_dates(sensor_name, since, timezone.localdate())
+    if pruned:
+        raise ValueError(
+            f"Cannot rebuild rollups of {sensor_name} from {since}: days up to "
+            f"{pruned[-1]} were pruned into the archive. Rebuild from "
+            f"{pruned[-1] + timedelta(days=1)} or later."
+        )
+    with transaction.atomic():
+        EnergyRollup.objects.filter(name=sensor_name).delete()
+        RollupCursor.objects.filter(name=sensor_name).delete()
+    return refresh_rollups(sensor_name, started_at=day_bounds(since)[0])
+
+
+def covers_day(sensor_name, selected_date):
+    cursor = RollupCursor.objects.filter(name=sensor_name).first()
+    return cursor is not None and cursor.started_at <= day_bounds(selected_date)[0]
+
+
+def day_summary(sensor_name, selected_date):
+    start, end = day_bounds(selected_date)
+    buckets = list(
+        EnergyRollup.objects.filter(
+            name=sensor_name, bucket_start__gte=start, bucket_start__lt=end
+        )
+        .order_by("bucket_start")
+        .values_list(
+            "sample_count",
+            "power_sum",
+            "power_min",
+            "power_max",
+            "energy",
+            "lead_energy",
+            "first_at",
+            "last_at",
+        )
+    )
+    if not buckets:
+        return None
+
+    counts, sums, mins, maxs, energies, leads, firsts, lasts = zip(*buckets)
+    sample_count = sum(counts)
+    # The first bucket's lead segment starts on the previous day, so it is left out.
+    return {
+        "sample_count": sample_count,
+        "power_min": min(mins),
+        "power_max": max(maxs),
+        "power_mean": sum(sums) / sample_count,
+        "power_sum": sum(sums),
+        "energy": sum(energies) + sum(leads[1:]),
+        "first_at": firsts[0],
+        "last_at": lasts[-1],
+    }
+
+
+def rollup_day_energy(sensor_name, selected_date, method=None):
+    method = method or settings.ENERGY_INTEGRATION_METHOD
+    summary = day_summary(sensor_name, selected_date)
+    if summary is None:
+        return None
+    if method == TRAPEZOID:
+        return summary["energy"]
+    if method == MEAN_INTERVAL:
+        if summary["sample_count"] < 2:
+            return 0.0
+        interval_hours = (
+            (summary["last_at"] - summary["first_at"]).total_seconds()
+            / (summary["sample_count"] - 1)
+            / 3600
+        )
+        return summary["power_sum"] * interval_hours / 1000  # kWh
+    raise ValueError(f"Unknown integration method '{method}'.")
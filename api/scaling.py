@@ -0,0 +1,134 @@
+# scaling.py
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import archived_manifests, load_archived_day
+from .models import Sensor
+from .queries import day_range_filter
+
+# Bumped when the file layout changes; files in another format are not used.
+SCALER_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+class AffineScaler:
+    """Min-max scaling to ``feature_range`` as one multiply-add per value.
+
+    The arithmetic of sklearn's MinMaxScaler (a constant series maps to the
+    bottom of the range), without its fitting state and input checks.
+    Values outside [data_min, data_max] scale outside the range; they are
+    not clipped.
+    """
+
+    def __init__(self, data_min, data_max, feature_range=(0.0, 1.0)):
+        self.data_min = float(data_min)
+        self.data_max = float(data_max)
+        self.feature_range = (float(feature_range[0]), float(feature_range[1]))
+        low, high = self.feature_range
+        self.scale = (high - low) / ((self.data_max - self.data_min) or 1.0)
+        self.offset = low - self.data_min * self.scale
+
+    @classmethod
+    def fit(cls, values, feature_range=(0.0, 1.0)):
+        return cls(np.min(values), np.max(values), feature_range)
+
+    def transform(self, values):
+        return np.asarray(values) * self.scale + self.offset
+
+    def inverse_transform(self, values):
+        # In place on a copy, like MinMaxScaler: model outputs keep their
+        # float32 dtype, each step computed in float64.
+        values = np.array(values)
+        values -= np.float64(self.offset)
+        values /= np.float64(self.scale)
+        return values
+
+    def as_dict(self):
+        return {
+            "data_min": self.data_min,
+            "data_max": self.data_max,
+            "feature_range": list(self.feature_range),
+        }
+
+
+def file_digest(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_scaler(path: str, scaler: AffineScaler, model_file: str, **details):
+    # The model's digest ties the parameters to the weights they were fitted
+    # for; a retrained model needs its scaler fitted again.
+    data = {
+        "format": SCALER_FORMAT,
+        **scaler.as_dict(),
+        "model_sha256": file_digest(model_file),
+        "fitted_at": timezone.now().isoformat(),
+        **details,
+    }
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, path)
+    return data
+
+
+def load_scaler(path: str, model_file: str):
+    """The persisted scaler of a model, or None when there is none to use.
+
+    Parameters saved for another version of the model are ignored, so
+    predictions fall back to fitting each day.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get("format") != SCALER_FORMAT:
+        logger.warning("Ignoring %s: unknown format %s", path, data.get("format"))
+        return None
+    if data.get("model_sha256") != file_digest(model_file):
+        logger.warning(
+            "Ignoring %s: fitted for another version of %s", path, model_file
+        )
+        return None
+    return AffineScaler(data["data_min"], data["data_max"], data["feature_range"])
+
+
+def power_range(sensor_name, start_date=None, end_date=None):
+    """Lowest and highest power of a sensor over its stored history.
+
+    Both sensor_electrics and the archive are read, so pruned days still
+    count. Returns ``(data_min, data_max)``, both None without data.
+    """
+    queryset = Sensor.objects.filter(name=sensor_name)
+    if start_date and end_date:
+        queryset = queryset.filter(**day_range_filter(start_date, end_date))
+    bounds = queryset.aggregate(low=Min("power"), high=Max("power"))
+    lows = [bounds["low"]] if bounds["low"] is not None else []
+    highs = [bounds["high"]] if bounds["high"] is not None else []
+    for manifest in archived_manifests(sensor_name):
+        selected_date = manifest["date"]
+        if (
+            start_date
+            and end_date
+            and not (str(start_date) <= selected_date <= str(end_date))
+        ):
+            continue
+        _, values = load_archived_day(sensor_name, parse_date(selected_date))
+        lows.append(float(values["power"].min()))
+        highs.append(float(values["power"].max()))
+    if not lows:
+        return None, None
+    return min(lows), max(highs)
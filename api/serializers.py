@@ -1,5 +1,10 @@
 from rest_framework import serializers
 from .models import Sensor, Energy, PowerPrediction
+from django.conf import settings
+from .energy import INTEGRATION_METHODS
+from .resampling import parse_interval
+from .series import AGGREGATIONS
+from .sql_energy import DAY, PERIODS
 import pandas as pd
 
 
@@ -9,21 +14,122 @@ class SensorSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class SensorListQuerySerializer(serializers.Serializer):
+    name = serializers.CharField(required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    fields = serializers.CharField(required=False)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.SENSOR_LIST_MAX_PAGE_SIZE
+    )
+    stream = serializers.BooleanField(required=False, default=False)
+
+    def validate_name(self, value):
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    def validate_fields(self, value):
+        allowed = [field.name for field in Sensor._meta.concrete_fields]
+        fields = [field.strip() for field in value.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in allowed]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(allowed)}."
+            )
+        return fields
+
+
 class EnergySerializer(serializers.ModelSerializer):
     class Meta:
         model = Energy
         fields = "__all__"
 
 
+class EnergyResultSerializer(EnergySerializer):
+    prediction_points = serializers.IntegerField(read_only=True, allow_null=True)
+
+
 class PowerPredictionSerializer(serializers.ModelSerializer):
     class Meta:
         model = PowerPrediction
         fields = "__all__"
 
 
+class EnergyListQuerySerializer(serializers.Serializer):
+    sensor = serializers.CharField(required=True)
+    start_date = serializers.DateField(required=True, input_formats=["%Y-%m-%d"])
+    end_date = serializers.DateField(required=False, input_formats=["%Y-%m-%d"])
+
+    def validate(self, attrs):
+        attrs["end_date"] = attrs.get("end_date") or attrs["start_date"]
+        if attrs["end_date"] < attrs["start_date"]:
+            raise serializers.ValidationError(
+                "'end_date' must not be before 'start_date'."
+            )
+        return attrs
+
+
+class EnergyRangeQuerySerializer(serializers.Serializer):
+    sensors = serializers.CharField(required=False, default="")
+    start_date = serializers.DateField(required=True, input_formats=["%Y-%m-%d"])
+    end_date = serializers.DateField(required=False, input_formats=["%Y-%m-%d"])
+    period = serializers.ChoiceField(choices=PERIODS, required=False, default=DAY)
+    method = serializers.ChoiceField(choices=INTEGRATION_METHODS, required=False)
+
+    def validate_sensors(self, value):
+        return list(
+            dict.fromkeys(name.strip() for name in value.split(",") if name.strip())
+        )
+
+    def validate(self, attrs):
+        attrs["end_date"] = attrs.get("end_date") or attrs["start_date"]
+        days = (attrs["end_date"] - attrs["start_date"]).days + 1
+        if days < 1:
+            raise serializers.ValidationError(
+                "'end_date' must not be before 'start_date'."
+            )
+        if days > settings.ENERGY_RANGE_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Date range is limited to {settings.ENERGY_RANGE_MAX_DAYS} days."
+            )
+        return attrs
+
+
+class PredictionSeriesQuerySerializer(serializers.Serializer):
+    sensor = serializers.CharField(required=True)
+    date = serializers.DateField(required=True, input_formats=["%Y-%m-%d"])
+    buckets = serializers.IntegerField(required=False, min_value=1)
+    agg = serializers.CharField(required=False, default="mean")
+    encoding = serializers.ChoiceField(
+        choices=["json", "binary"], required=False, default="json"
+    )
+
+    def validate_agg(self, value):
+        aggregations = [agg.strip() for agg in value.split(",") if agg.strip()]
+        unknown = [agg for agg in aggregations if agg not in AGGREGATIONS]
+        if unknown or not aggregations:
+            raise serializers.ValidationError(
+                f"Unknown aggregations: {', '.join(unknown)}. "
+                f"Choose from: {', '.join(AGGREGATIONS)}."
+            )
+        return list(dict.fromkeys(aggregations))
+
+
+def validate_resample(value):
+    if value == "raw":
+        return value
+    try:
+        parse_interval(value)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+    return value
+
+
 class SensorEnergySerializer(serializers.Serializer):
     sensor = serializers.CharField(required=True)
     date = serializers.DateField(required=False, input_formats=["%Y-%m-%d"])
+    method = serializers.ChoiceField(choices=INTEGRATION_METHODS, required=False)
+    resample = serializers.CharField(required=False, validators=[validate_resample])
 
     def validate_predicted_date(self, value):
         if value:
@@ -34,3 +140,27 @@ class SensorEnergySerializer(serializers.Serializer):
                     "Invalid 'date' format. Use YYYY-MM-DD."
                 )
         return value
+
+
+class SensorEnergyBatchSerializer(serializers.Serializer):
+    sensors = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, required=True
+    )
+    start_date = serializers.DateField(required=True, input_formats=["%Y-%m-%d"])
+    end_date = serializers.DateField(required=True, input_formats=["%Y-%m-%d"])
+    method = serializers.ChoiceField(choices=INTEGRATION_METHODS, required=False)
+    resample = serializers.CharField(required=False, validators=[validate_resample])
+    overwrite = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        days = (attrs["end_date"] - attrs["start_date"]).days + 1
+        if days < 1:
+            raise serializers.ValidationError(
+                "'end_date' must not be before 'start_date'."
+            )
+        if days > settings.BATCH_PREDICTION_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Date range is limited to {settings.BATCH_PREDICTION_MAX_DAYS} days."
+            )
+        attrs["sensors"] = list(dict.fromkeys(attrs["sensors"]))
+        return attrs
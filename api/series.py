@@ -0,0 +1,237 @@
+# series.py
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils.dateparse import parse_date
+
+from .energy import average_interval_hours
+from .models import PowerPrediction, PredictionSeries
+from .queries import day_bounds
+from .windowing import TIME_STEPS
+
+SERIES = "series"
+ROWS = "rows"
+PREDICTION_STORAGES = (SERIES, ROWS)
+
+# Little-endian float32 so blobs read the same on every host.
+SERIES_DTYPE = np.dtype("<f4")
+
+
+def pack_values(values):
+    return np.ascontiguousarray(values, dtype=SERIES_DTYPE).tobytes()
+
+
+def unpack_values(blob):
+    # bytes (SQLite) and memoryview (psycopg2) both decode without a copy;
+    # the result is read-only and shares the buffer fetched from the database.
+    return np.frombuffer(blob, dtype=SERIES_DTYPE)
+
+
+def series_metadata(timestamps, points):
+    # Prediction i belongs to the sample right after window i, so the series
+    # starts at the first timestamp the model could predict.
+    predicted_at = timestamps[len(timestamps) - points :] if points else timestamps[-1:]
+    return {
+        "start_at": datetime.fromtimestamp(predicted_at[0], tz=dt_timezone.utc),
+        "step_seconds": average_interval_hours(predicted_at) * 3600,
+    }
+
+
+def spread_over_day(selected_date, points):
+    start, end = day_bounds(selected_date)
+    return start.timestamp() + np.linspace(
+        0, (end - start).total_seconds(), points, endpoint=False
+    )
+
+
+def series_timestamps(series):
+    start = series.start_at.timestamp()
+    return start + series.step_seconds * np.arange(series.points, dtype=np.float64)
+
+
+def write_prediction_series(energy, timestamps, values, append=False, storage=None):
+    """Store a day's predicted power on its Energy record.
+
+    With ``append`` the values extend the existing series; otherwise they
+    replace it, together with any legacy PowerPrediction rows.
+    """
+    storage = storage or settings.PREDICTION_STORAGE
+    values = np.asarray(values, dtype=SERIES_DTYPE)
+
+    if storage == ROWS:
+        if not append:
+            PredictionSeries.objects.filter(energy=energy).delete()
+            PowerPrediction.objects.filter(energy=energy).delete()
+        PowerPrediction.objects.bulk_create(
+            [
+                PowerPrediction(energy=energy, power=predicted_power)
+                for predicted_power in values.tolist()
+            ],
+            batch_size=settings.BULK_BATCH_SIZE,
+        )
+        return
+
+    blob = pack_values(values)
+    existing = None
+    if append:
+        existing = PredictionSeries.objects.filter(energy=energy).first()
+        if existing is not None:
+            blob = bytes(existing.values) + blob
+    else:
+        PowerPrediction.objects.filter(energy=energy).delete()
+
+    points = len(blob) // SERIES_DTYPE.itemsize
+    if existing is not None:
+        # The appended points continue the stored series, and ``timestamps``
+        # may hold only the new rows: keep the start, stretch the step to
+        # the last timestamp.
+        start = existing.start_at.timestamp()
+        metadata = {
+            "start_at": existing.start_at,
+            "step_seconds": (timestamps[-1] - start) / (points - 1),
+        }
+    else:
+        metadata = series_metadata(timestamps, points)
+    PredictionSeries.objects.update_or_create(
+        energy=energy,
+        defaults={"values": blob, "points": points, **metadata},
+    )
+
+
+def bulk_write_prediction_series(results, storage=None, batch_size: int = None):
+    """Replace the stored series of many (energy, timestamps, values) at once."""
+    storage = storage or settings.PREDICTION_STORAGE
+    batch_size = batch_size or settings.RESULT_BATCH_SIZE
+    energies = [energy for energy, _, _ in results]
+    PowerPrediction.objects.filter(energy__in=energies).delete()
+
+    if storage == ROWS:
+        PredictionSeries.objects.filter(energy__in=energies).delete()
+        PowerPrediction.objects.bulk_create(
+            (
+                PowerPrediction(energy=energy, power=predicted_power)
+                for energy, _, values in results
+                for predicted_power in np.asarray(values, dtype=SERIES_DTYPE).tolist()
+            ),
+            batch_size=settings.BULK_BATCH_SIZE,
+        )
+        return
+
+    # Upserted on the one-to-one energy_id, so a re-run overwrites in place.
+    PredictionSeries.objects.bulk_create(
+        (
+            PredictionSeries(
+                energy=energy,
+                values=pack_values(values),
+                points=len(values),
+                **series_metadata(timestamps, len(values)),
+            )
+            for energy, timestamps, values in results
+        ),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["energy"],
+        update_fields=["start_at", "step_seconds", "points", "values", "updated_at"],
+    )
+
+
+AGGREGATIONS = ("mean", "min", "max")
+
+
+def downsample(timestamps, values, buckets, aggregations=("mean",)):
+    """Reduce a series to at most ``buckets`` points.
+
+    Returns bucket start timestamps and one array per aggregation.
+    """
+    if buckets >= len(values):
+        return timestamps, {aggregation: values for aggregation in aggregations}
+
+    edges = np.linspace(0, len(values), buckets + 1).astype(np.intp)[:-1]
+    columns = {}
+    for aggregation in aggregations:
+        if aggregation == "mean":
+            counts = np.diff(np.r_[edges, len(values)])
+            columns[aggregation] = (
+                np.add.reduceat(values, edges, dtype=np.float64) / counts
+            )
+        elif aggregation == "min":
+            columns[aggregation] = np.minimum.reduceat(values, edges)
+        elif aggregation == "max":
+            columns[aggregation] = np.maximum.reduceat(values, edges)
+        else:
+            raise ValueError(
+                f"Unknown aggregation '{aggregation}'. "
+                f"Use one of: {', '.join(AGGREGATIONS)}."
+            )
+    return timestamps[edges], columns
+
+
+def read_series(series):
+    return series_timestamps(series), unpack_values(series.values)
+
+
+def read_prediction_rows(energy):
+    # Predictions not packed yet (see the pack_predictions command), or stored
+    # with PREDICTION_STORAGE=rows. None when the day has no rows.
+    values = np.fromiter(
+        PowerPrediction.objects.filter(energy=energy)
+        .order_by("created_at", "id")
+        .values_list("power", flat=True),
+        dtype=np.float64,
+    )
+    if not len(values):
+        return None
+    return spread_over_day(parse_date(str(energy.date)), len(values)), values
+
+
+def read_prediction_series(energy):
+    """(timestamps, values) of a stored prediction, or None if there is none."""
+    series = PredictionSeries.objects.filter(energy=energy).first()
+    if series is not None:
+        return read_series(series)
+    return read_prediction_rows(energy)
+
+
+def pack_legacy_predictions(Energy, PowerPrediction, PredictionSeries, Sensor):
+    """Fold per-point PowerPrediction rows into one PredictionSeries per Energy.
+
+    Takes the model classes so the data migration can pass historical models.
+    Start and step come from the day's telemetry when its length matches the
+    prediction, otherwise the points are spread evenly over the day.
+    """
+    packed = 0
+    energies = Energy.objects.filter(
+        power_predictions__isnull=False, prediction_series__isnull=True
+    ).distinct()
+    for energy in energies.iterator():
+        values = np.fromiter(
+            PowerPrediction.objects.filter(energy=energy)
+            .order_by("created_at", "id")
+            .values_list("power", flat=True),
+            dtype=np.float64,
+        )
+        selected_date = parse_date(str(energy.date))
+        start, end = day_bounds(selected_date)
+        timestamps = np.fromiter(
+            (
+                created_at.timestamp()
+                for created_at in Sensor.objects.filter(
+                    name=energy.name, created_at__gte=start, created_at__lt=end
+                )
+                .order_by("created_at")
+                .values_list("created_at", flat=True)
+            ),
+            dtype=np.float64,
+        )
+        if len(timestamps) != len(values) + TIME_STEPS:
+            timestamps = spread_over_day(selected_date, len(values))
+
+        PredictionSeries.objects.create(
+            energy=energy,
+            values=pack_values(values),
+            points=len(values),
+            **series_metadata(timestamps, len(values)),
+        )
+        packed += 1
+    return packed
@@ -0,0 +1,213 @@
+# sql_energy.py
+from datetime import date, datetime
+
+import numpy as np
+from django.conf import settings
+from django.db import NotSupportedError, connection
+from django.db.models import F, FloatField, Func, Window
+from django.db.models.functions import Lag, TruncDate, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .archive import archived_range, load_archived_day
+from .energy import INTEGRATION_METHODS, TRAPEZOID, integrate_energy
+from .models import Sensor
+from .queries import day_range_filter
+from .rollups import bucket_starts
+
+DAY = "day"
+HOUR = "hour"
+PERIODS = (DAY, HOUR)
+
+PYTHON = "python"
+SQL = "sql"
+CALCULATION_BACKENDS = (PYTHON, SQL)
+
+
+class Epoch(Func):
+    """Seconds since the Unix epoch of a datetime expression, as a float."""
+
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f"Epoch() is not implemented for {connection.vendor} databases."
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="EXTRACT(EPOCH FROM %(expressions)s)::double precision",
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Datetimes are stored as UTC text, "YYYY-MM-DD HH:MM:SS[.ffffff]".
+        # julianday() keeps whole milliseconds only, so the seconds come from
+        # the text up to the dot and the fraction is read as a number.
+        sql, params = compiler.compile(self.source_expressions[0])
+        return (
+            f"(CAST(strftime('%%s', substr({sql}, 1, 19)) AS REAL)"
+            f" + CAST(substr({sql}, 20) AS REAL))",
+            (*params, *params),
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="UNIX_TIMESTAMP(%(expressions)s)",
+            **extra_context,
+        )
+
+
+def sample_segments(sensor_names, start_date, end_date, period=DAY):
+    """Each sample with the previous sample of the same sensor and local day.
+
+    Partitioning by day keeps every segment inside its day, like the Python
+    calculation; an hour's first segment starts in the previous hour, so
+    hourly totals add up to the day.
+    """
+    day = TruncDate("created_at")
+    window = {"partition_by": [F("name"), day], "order_by": F("created_at").asc()}
+    queryset = Sensor.objects.filter(**day_range_filter(start_date, end_date))
+    if sensor_names:
+        queryset = queryset.filter(name__in=sensor_names)
+    return queryset.annotate(
+        period=day if period == DAY else TruncHour("created_at"),
+        at=Epoch("created_at"),
+        prev_at=Window(Lag(Epoch("created_at")), **window),
+        prev_power=Window(Lag("power"), **window),
+    ).values("name", "period", "at", "power", "prev_at", "prev_power")
+
+
+def period_date(value):
+    # The local day of a day or hour period.
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date()
+    return value
+
+
+def period_value(value, period):
+    # Raw cursors skip the ORM converters, and SQLite returns dates as text.
+    if period == DAY:
+        return value if isinstance(value, date) else parse_date(str(value))
+    if not isinstance(value, datetime):
+        value = parse_datetime(str(value))
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def archived_energy(sensor_name, selected_date, period, method):
+    # range_energy's rows for a day read from the archive (api.archive), with
+    # the same segments: an hour's first one starts at the day's previous sample.
+    timestamps, values = load_archived_day(sensor_name, selected_date)
+    power = values["power"]
+    if period == DAY:
+        spans = [(selected_date, 0, len(timestamps))]
+    else:
+        starts = bucket_starts(timestamps)
+        edges = [0, *(np.flatnonzero(np.diff(starts)) + 1), len(timestamps)]
+        tz = timezone.get_current_timezone()
+        spans = [
+            (datetime.fromtimestamp(starts[first], tz=tz), first, end)
+            for first, end in zip(edges[:-1], edges[1:])
+        ]
+    rows = []
+    for period_start, first, end in spans:
+        # Trapezoids take in the segment from the previous sample of the day.
+        lead = max(first - 1, 0) if method == TRAPEZOID else first
+        rows.append(
+            {
+                "sensor": sensor_name,
+                "period": period_start,
+                "samples": end - first,
+                "energy": integrate_energy(
+                    timestamps[lead:end], power[lead:end], method=method
+                ),
+            }
+        )
+    return rows
+
+
+def range_energy(sensor_names, start_date, end_date, period=DAY, method=None):
+    """kWh per sensor and local day (or hour) over a date range, in one query.
+
+    The window function pairs each sample with the previous one in the
+    database, and only one aggregate row per sensor and period comes back.
+    Archived days are read from their files instead, like calculate_energy
+    does, as they may have been pruned from the table. ``sensor_names`` may
+    be empty for every sensor. Returns a list of
+    ``{"sensor", "period", "samples", "energy"}`` ordered by sensor and period.
+    """
+    method = method or settings.ENERGY_INTEGRATION_METHOD
+    if method not in INTEGRATION_METHODS:
+        raise ValueError(
+            f"Unknown integration method '{method}'. "
+            f"Use one of: {', '.join(INTEGRATION_METHODS)}."
+        )
+    if period not in PERIODS:
+        raise ValueError(
+            f"Unknown period '{period}'. Use one of: {', '.join(PERIODS)}."
+        )
+
+    segments, params = sample_segments(
+        sensor_names, start_date, end_date, period
+    ).query.sql_with_params()
+    # Django cannot group by an aggregate over window functions, so the
+    # grouping wraps the windowed query as a subquery.
+    quote = connection.ops.quote_name
+    name, span, power, at, prev_at, prev_power = map(
+        quote, ("name", "period", "power", "at", "prev_at", "prev_power")
+    )
+    sql = (
+        f"SELECT {name}, {span}, COUNT(*), SUM({power}), MIN({at}), MAX({at}), "
+        f"SUM(({power} + {prev_power}) * ({at} - {prev_at})) "
+        f"FROM ({segments}) segments "
+        f"GROUP BY {name}, {span} ORDER BY {name}, {span}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    results = []
+    for sensor_name, period_start, samples, power_sum, first, last, doubled in rows:
+        if method == TRAPEZOID:
+            energy = (doubled or 0.0) / 2 / 3600 / 1000  # kWh
+        elif samples < 2:
+            energy = 0.0
+        else:
+            # The mean-interval method: sum of power times the mean spacing.
+            energy = power_sum * (last - first) / (samples - 1) / 3600 / 1000
+        results.append(
+            {
+                "sensor": sensor_name,
+                "period": period_value(period_start, period),
+                "samples": samples,
+                "energy": energy,
+            }
+        )
+
+    archived = (
+        archived_range(sensor_names, start_date, end_date)
+        if settings.ARCHIVE_READS
+        else {}
+    )
+    if not archived:
+        return results
+    results = [
+        row
+        for row in results
+        if (row["sensor"], period_date(row["period"])) not in archived
+    ]
+    for sensor_name, selected_date in archived:
+        results.extend(archived_energy(sensor_name, selected_date, period, method))
+    return sorted(results, key=lambda row: (row["sensor"], row["period"]))
+
+
+def day_energy(sensor_name, selected_date, method=None):
+    # Single sensor-day through the SQL backend; None when there are no rows.
+    results = range_energy([sensor_name], selected_date, selected_date, method=method)
+    return results[0]["energy"] if results else None
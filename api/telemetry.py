@@ -0,0 +1,104 @@
+# telemetry.py
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+TELEMETRY_COLUMNS = (
+    "voltage",
+    "current",
+    "power",
+    "power_factor",
+    "frequency",
+    "energy",
+    "apparent_power",
+    "reactive_power",
+)
+
+
+def check_columns(columns):
+    unknown = [column for column in columns if column not in TELEMETRY_COLUMNS]
+    if unknown:
+        raise ValueError(
+            f"Unknown telemetry column(s) {', '.join(unknown)}. "
+            f"Use any of: {', '.join(TELEMETRY_COLUMNS)}."
+        )
+
+
+def chunk_arrays(rows, columns):
+    # (created_at, *columns) tuples of one chunk into a timestamp array and one
+    # float64 array per column.
+    count = len(rows)
+    timestamps = np.fromiter(
+        (row[0].timestamp() for row in rows), dtype=np.float64, count=count
+    )
+    values = {
+        column: np.fromiter((row[i] for row in rows), dtype=np.float64, count=count)
+        for i, column in enumerate(columns, start=1)
+    }
+    return timestamps, values
+
+
+def iter_telemetry_chunks(queryset, columns=("power",), chunk_size: int = None):
+    """Yield ``(timestamps, {column: values})`` for up to ``chunk_size`` rows at a time.
+
+    Rows are streamed with ``iterator()`` (a server-side cursor on PostgreSQL),
+    so only one chunk of Python tuples exists at once. Use it to process
+    ranges that should not be held in memory whole.
+    """
+    check_columns(columns)
+    chunk_size = chunk_size or settings.TELEMETRY_CHUNK_SIZE
+    rows = queryset.values_list("created_at", *columns).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk_arrays(chunk, columns)
+
+
+class TelemetryBuffer:
+    """Timestamp and column arrays that double in capacity as chunks are appended."""
+
+    def __init__(self, columns, capacity: int = 0):
+        self.size = 0
+        self.arrays = {
+            name: np.empty(capacity, dtype=np.float64)
+            for name in ("created_at", *columns)
+        }
+
+    def append(self, timestamps, values):
+        end = self.size + len(timestamps)
+        capacity = len(self.arrays["created_at"])
+        if end > capacity:
+            capacity = max(end, 2 * capacity)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, dtype=np.float64)
+                grown[: self.size] = array[: self.size]
+                self.arrays[name] = grown
+        self.arrays["created_at"][self.size : end] = timestamps
+        for column, array in values.items():
+            self.arrays[column][self.size : end] = array
+        self.size = end
+
+    def result(self):
+        # Trimmed copies, so the spare capacity is released with the buffer.
+        arrays = {
+            name: array[: self.size].copy() for name, array in self.arrays.items()
+        }
+        timestamps = arrays.pop("created_at")
+        return timestamps, arrays
+
+
+def read_telemetry(
+    queryset, columns=("power",), chunk_size: int = None, expected_rows: int = 0
+):
+    """Read ``queryset`` into ``(timestamps, {column: values})`` float64 arrays.
+
+    Peak memory is the arrays plus one chunk of rows, instead of a Python
+    object per row for the whole range. ``expected_rows`` preallocates when
+    the row count is known (e.g. a day at a fixed sampling rate).
+    """
+    buffer = TelemetryBuffer(columns, capacity=expected_rows)
+    for timestamps, values in iter_telemetry_chunks(queryset, columns, chunk_size):
+        buffer.append(timestamps, values)
+    return buffer.result()
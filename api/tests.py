@@ -1,3 +1,1135 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import shutil
+import signal
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .archive import (
+    archived_sensors,
+    export_day,
+    fetch_day_power,
+    load_archived_day,
+    sensor_directory,
+)
+from .batch import store_batch_prediction
+from .benchmarks import (
+    SYNTHETIC_START_DATE,
+    build_standin_model,
+    legacy_create_sequences,
+    synthetic_telemetry,
+    write_telemetry,
+)
+from .energy import MEAN_INTERVAL, TRAPEZOID, fetch_power_series, integrate_energy
+from .inference import CompiledKerasModel, load_keras_model
+from .ingest import NUMERIC_FIELDS, ingest_rows, refresh_ingested_rollups
+from .jobs import DONE, FAILED, RUNNING, JobQueue, job_dict, job_queue
+from .metrics import UNKNOWN_SENSOR, metrics, sensor_label, stage
+from .locks import (
+    LockLost,
+    acquire_lock,
+    hold_lock,
+    release_locks,
+    renew_locks,
+)
+from .models import (
+    Energy,
+    EnergyRollup,
+    Job,
+    JobLock,
+    PredictionFingerprint,
+    RollupCursor,
+    Sensor,
+)
+from .pagination import InvalidCursor, encode_cursor, keyset_filter
+from .precompute import CALCULATION, PREDICTION, Precompute, plan_tasks
+from .prediction_cache import (
+    HIT,
+    INCREMENTAL,
+    MISS,
+    ROLLING,
+    cached_prediction,
+    model_version_key,
+    store_energy_prediction,
+)
+from .queries import day_bounds, sensor_day_queryset
+from .resampling import INTERPOLATE, LAST, resample_series
+from .registry import model_path, model_version, resolve_backend, scaler_path
+from .results import complete_results, upsert_energies
+from .rollups import (
+    check_bucket_origin,
+    rebuild_rollups,
+    covers_day,
+    day_summary,
+    refresh_rollups,
+    rollup_day_energy,
+    to_datetime,
+)
+from .scaling import AffineScaler, save_scaler
+from .sql_energy import DAY as DAY_PERIOD, HOUR, range_energy
+from .series import (
+    PREDICTION_STORAGES,
+    ROWS,
+    SERIES,
+    downsample,
+    pack_values,
+    read_prediction_series,
+    unpack_values,
+    write_prediction_series,
+)
+from .utils import NoSensorDataError
+from .windowing import TIME_STEPS, sliding_windows
+
+DAY = SYNTHETIC_START_DATE
+
+
+def day_telemetry(sensor_name, seed=0):
+    # One day of 1-minute readings, with outages, as a single telemetry tuple.
+    return next(synthetic_telemetry([sensor_name], DAY, outages=2, seed=seed))
+
+
+def split_telemetry(telemetry, rows):
+    # The first ``rows`` readings, and the rest.
+    sensor_name, timestamps, columns = telemetry
+    return (
+        (sensor_name, timestamps[:rows], {k: v[:rows] for k, v in columns.items()}),
+        (sensor_name, timestamps[rows:], {k: v[rows:] for k, v in columns.items()}),
+    )
+
+
+class SensorDayQueryTests(TestCase):
+    def test_day_query_uses_name_created_index(self):
+        write_telemetry([day_telemetry("Sensor 1")])
+        queryset = sensor_day_queryset("Sensor 1", DAY)
+        if connection.vendor == "postgresql":
+            # A small test table is cheaper to scan; ask for the plan with an index.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn("sensor_name_created_idx", queryset.explain())
+
+
+class RollupTests(TestCase):
+    def raw_energy(self, method):
+        timestamps, power = fetch_power_series(sensor_day_queryset("Sensor 1", DAY))
+        return integrate_energy(timestamps, power, method=method)
+
+    def test_rollups_match_raw_integration(self):
+        head, tail = split_telemetry(day_telemetry("Sensor 1"), 700)
+        write_telemetry([head])
+        refresh_rollups("Sensor 1", started_at=day_bounds(DAY)[0])
+        write_telemetry([tail])
+        self.assertEqual(refresh_rollups("Sensor 1"), len(tail[1]))
+
+        for method in (TRAPEZOID, MEAN_INTERVAL):
+            with self.subTest(method=method):
+                self.assertAlmostEqual(
+                    rollup_day_energy("Sensor 1", DAY, method=method),
+                    self.raw_energy(method),
+                    places=9,
+                )
+
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_buckets_follow_local_hours(self):
+        # Local days start at 18:30 UTC; UTC-hour buckets would straddle them.
+        yesterday = DAY - timedelta(days=1)
+        write_telemetry(synthetic_telemetry(["Sensor 1"], yesterday, days=2))
+        refresh_rollups("Sensor 1", started_at=day_bounds(yesterday)[0])
+        self.assertEqual(
+            {
+                (bucket_start.minute, bucket_start.second)
+                for bucket_start in EnergyRollup.objects.values_list(
+                    "bucket_start", flat=True
+                )
+            },
+            {(30, 0)},
+        )
+        for method in (TRAPEZOID, MEAN_INTERVAL):
+            with self.subTest(method=method):
+                self.assertAlmostEqual(
+                    rollup_day_energy("Sensor 1", DAY, method=method),
+                    self.raw_energy(method),
+                    places=9,
+                )
+
+    def test_time_zone_with_half_hour_daylight_saving_is_refused(self):
+        self.assertEqual(check_bucket_origin(None), [])
+        with override_settings(TIME_ZONE="Australia/Lord_Howe"):
+            self.assertEqual(
+                [error.id for error in check_bucket_origin(None)], ["api.E001"]
+            )
+
+    def test_late_rows_are_folded_again(self):
+        sensor_name, timestamps, columns = day_telemetry("Sensor 1")
+        late = np.zeros(len(timestamps), dtype=bool)
+        late[[5, 600, 1300]] = True
+        write_telemetry(
+            [
+                (
+                    sensor_name,
+                    timestamps[~late],
+                    {k: v[~late] for k, v in columns.items()},
+                )
+            ]
+        )
+        refresh_rollups("Sensor 1", started_at=day_bounds(DAY)[0])
+        write_telemetry(
+            [(sensor_name, timestamps[late], {k: v[late] for k, v in columns.items()})]
+        )
+
+        # Only the last one is recent enough to be found by the row count.
+        refresh_rollups("Sensor 1")
+        self.assertEqual(day_summary("Sensor 1", DAY)["sample_count"], late.size - 2)
+        refresh_rollups("Sensor 1", since=to_datetime(timestamps[5]))
+        self.assertEqual(day_summary("Sensor 1", DAY)["sample_count"], late.size)
+        self.assertAlmostEqual(
+            rollup_day_energy("Sensor 1", DAY, method=TRAPEZOID),
+            self.raw_energy(TRAPEZOID),
+            places=9,
+        )
+
+    def test_first_ingest_starts_rollups(self):
+        self.assertFalse(RollupCursor.objects.exists())
+        ingest_rows(
+            [
+                {"name": "Sensor 1", **{field: 1.0 for field in NUMERIC_FIELDS}},
+            ]
+        )
+        self.assertEqual(refresh_ingested_rollups(["Sensor 1"]), {"Sensor 1": 1})
+        self.assertTrue(covers_day("Sensor 1", timezone.localdate()))
+
+
+class RangeEnergyTests(TestCase):
+    def python_energy(self, sensor_names, dates, period, method):
+        # The same totals from integrate_energy over each sensor-day's arrays;
+        # an hour's first segment starts at the previous sample of the day.
+        expected = {}
+        for sensor_name in sensor_names:
+            for selected_date in dates:
+                timestamps, power = fetch_power_series(
+                    sensor_day_queryset(sensor_name, selected_date)
+                )
+                if period == DAY_PERIOD:
+                    expected[sensor_name, selected_date] = integrate_energy(
+                        timestamps, power, method=method
+                    )
+                    continue
+                hours = (timestamps // 3600).astype(np.int64)
+                for hour in np.unique(hours):
+                    start, end = np.searchsorted(hours, [hour, hour + 1])
+                    if method == TRAPEZOID:
+                        start = max(start - 1, 0)
+                    period_start = datetime.fromtimestamp(
+                        hour * 3600, tz=timezone.get_current_timezone()
+                    )
+                    expected[sensor_name, period_start] = integrate_energy(
+                        timestamps[start:end], power[start:end], method=method
+                    )
+        return expected
+
+    def test_matches_integrate_energy(self):
+        sensor_names = ["Sensor 1", "Sensor 2"]
+        dates = [DAY, DAY + timedelta(days=1)]
+        write_telemetry(synthetic_telemetry(sensor_names, DAY, days=2, outages=2))
+
+        for method in (TRAPEZOID, MEAN_INTERVAL):
+            for period in (DAY_PERIOD, HOUR):
+                with self.subTest(method=method, period=period):
+                    expected = self.python_energy(sensor_names, dates, period, method)
+                    results = range_energy(
+                        sensor_names, dates[0], dates[-1], period=period, method=method
+                    )
+                    self.assertEqual(
+                        [(row["sensor"], row["period"]) for row in results],
+                        list(expected),
+                    )
+                    for row in results:
+                        self.assertAlmostEqual(
+                            row["energy"],
+                            expected[row["sensor"], row["period"]],
+                            delta=1e-8,
+                        )
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(ARCHIVE_PATH=directory, ARCHIVE_READS=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+
+    def archive(self, before, prune=True):
+        call_command(
+            "archive_telemetry",
+            before=before,
+            prune=prune,
+            stdout=io.StringIO(),
+        )
+
+    def test_dot_names_stay_inside_the_archive(self):
+        names = [".", "..", "...", "a/../b", "%2E", "Sensor 1"]
+        directories = [sensor_directory(name) for name in names]
+        self.assertEqual(len(set(directories)), len(names))
+        for directory in directories:
+            self.assertEqual(os.path.dirname(directory), self.directory)
+        with self.assertRaises(ValueError):
+            sensor_directory("")
+
+        write_telemetry([day_telemetry("..")])
+        stored = fetch_day_power("..", DAY)
+        self.assertIsNotNone(export_day("..", DAY))
+        self.assertEqual(os.listdir(self.directory), ["%2E%2E"])
+        self.assertEqual(archived_sensors(), [".."])
+        timestamps, values = load_archived_day("..", DAY)
+        np.testing.assert_array_equal(timestamps, stored[0])
+        np.testing.assert_array_equal(values["power"], stored[1])
+
+    def test_range_energy_reads_pruned_days_from_the_archive(self):
+        write_telemetry(synthetic_telemetry(["Sensor 1"], DAY, days=2, outages=2))
+        dates = (DAY, DAY + timedelta(days=1))
+        cases = [
+            (method, period)
+            for method in (TRAPEZOID, MEAN_INTERVAL)
+            for period in (DAY_PERIOD, HOUR)
+        ]
+        expected = {
+            case: range_energy(["Sensor 1"], *dates, period=case[1], method=case[0])
+            for case in cases
+        }
+        day_power = fetch_day_power("Sensor 1", DAY)
+
+        self.archive(before=dates[1])
+        self.assertFalse(sensor_day_queryset("Sensor 1", DAY).exists())
+        self.assertTrue(sensor_day_queryset("Sensor 1", dates[1]).exists())
+        for stored, archived in zip(day_power, fetch_day_power("Sensor 1", DAY)):
+            np.testing.assert_array_equal(stored, archived)
+
+        for (method, period), rows in expected.items():
+            with self.subTest(method=method, period=period):
+                for sensors in (["Sensor 1"], []):
+                    results = range_energy(
+                        sensors, *dates, period=period, method=method
+                    )
+                    self.assertEqual(
+                        [(r["sensor"], r["period"], r["samples"]) for r in results],
+                        [(r["sensor"], r["period"], r["samples"]) for r in rows],
+                    )
+                    for result, row in zip(results, rows):
+                        self.assertAlmostEqual(
+                            result["energy"], row["energy"], delta=1e-8
+                        )
+
+    def test_rollups_are_not_rebuilt_over_pruned_days(self):
+        write_telemetry(synthetic_telemetry(["Sensor 1"], DAY, days=2))
+        self.archive(before=DAY + timedelta(days=1))
+
+        with self.assertRaisesMessage(
+            ValueError, f"Rebuild from {DAY + timedelta(days=1)}"
+        ):
+            rebuild_rollups("Sensor 1", DAY)
+        with self.assertRaises(CommandError):
+            call_command(
+                "update_rollups", sensor=["Sensor 1"], since=DAY, stdout=io.StringIO()
+            )
+        self.assertGreater(rebuild_rollups("Sensor 1", DAY + timedelta(days=1)), 0)
+
+        # Archived days still in the table can be rebuilt.
+        self.archive(before=DAY + timedelta(days=2), prune=False)
+        self.assertGreater(rebuild_rollups("Sensor 1", DAY + timedelta(days=1)), 0)
+
+
+class IngestTests(TestCase):
+    def reading(self, **fields):
+        return {
+            "name": "Sensor 1",
+            **{field: 1.0 for field in NUMERIC_FIELDS},
+            **fields,
+        }
+
+    def test_readings_keep_their_own_time(self):
+        report = ingest_rows(
+            [
+                self.reading(created_at="2024-01-01T10:00:00+00:00"),
+                self.reading(created_at="2024-01-01 12:30:00"),
+                self.reading(),
+                self.reading(created_at="yesterday"),
+            ]
+        )
+        self.assertEqual(report["accepted"], 3)
+        self.assertEqual(report["errors"][0]["index"], 3)
+        created_at = sorted(Sensor.objects.values_list("created_at", flat=True))
+        self.assertEqual(
+            created_at[:2],
+            [
+                timezone.make_aware(datetime(2024, 1, 1, 10)),
+                timezone.make_aware(datetime(2024, 1, 1, 12, 30)),
+            ],
+        )
+        self.assertGreater(created_at[2], timezone.now() - timedelta(minutes=1))
+        self.assertEqual(report["first_at"], {"Sensor 1": created_at[0]})
+
+    def test_late_reading_is_folded(self):
+        now = timezone.now()
+        report = ingest_rows([self.reading(created_at=now.isoformat())])
+        refresh_ingested_rollups(report["sensors"], report["first_at"])
+        late = now - timedelta(seconds=1)
+        report = ingest_rows([self.reading(created_at=late.isoformat())])
+        self.assertEqual(
+            refresh_ingested_rollups(report["sensors"], report["first_at"]),
+            {"Sensor 1": 2},
+        )
+        self.assertEqual(
+            day_summary("Sensor 1", timezone.localdate(now))["sample_count"], 2
+        )
+
+    def test_body_that_is_not_utf8_is_rejected(self):
+        response = self.client.post(
+            reverse("1.0:sensor-ingest"),
+            "name,power\nSensor \xe9,1.0\n".encode("latin-1"),
+            content_type="text/csv",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Body must be UTF-8."})
+        self.assertFalse(Sensor.objects.exists())
+
+
+class ResamplingTests(TestCase):
+    def test_last_takes_each_slots_final_sample(self):
+        timestamps = np.array([0.0, 10.0, 59.0, 60.0, 130.0, 179.0])
+        power = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        slot_timestamps, values, report = resample_series(
+            timestamps, power, 60, origin=0.0, aggregation=LAST, fill=INTERPOLATE
+        )
+        np.testing.assert_array_equal(slot_timestamps, [0.0, 60.0, 120.0])
+        np.testing.assert_array_equal(values, [3.0, 4.0, 6.0])
+        self.assertEqual(report["filled"], 0)
+
+
+class WindowingTests(TestCase):
+    def test_sliding_windows_match_create_sequences(self):
+        for samples in (TIME_STEPS + 1, TIME_STEPS + 10, 200):
+            with self.subTest(samples=samples):
+                data = np.random.default_rng(samples).random((samples, 1))
+                legacy = legacy_create_sequences(data)
+                windows = sliding_windows(data)
+                self.assertEqual(windows.shape, legacy.shape)
+                self.assertEqual(windows.shape, (samples - TIME_STEPS, TIME_STEPS, 1))
+                np.testing.assert_array_equal(windows, legacy)
+
+    def test_short_series_has_no_windows(self):
+        for samples in (0, TIME_STEPS - 1, TIME_STEPS):
+            with self.subTest(samples=samples):
+                windows = sliding_windows(np.ones((samples, 1)))
+                self.assertEqual(windows.shape, (0, TIME_STEPS, 1))
+                self.assertEqual(len(legacy_create_sequences(np.ones((samples, 1)))), 0)
+
+
+class KeysetPaginationTests(TestCase):
+    def test_pages_cover_every_row_once(self):
+        created_at = day_bounds(DAY)[0]
+        Sensor.objects.bulk_create(
+            [
+                Sensor(
+                    name="Sensor 1",
+                    voltage=220,
+                    current=1,
+                    power=i,
+                    power_factor=1,
+                    frequency=50,
+                    energy=0,
+                    apparent_power=i,
+                    reactive_power=0,
+                )
+                for i in range(7)
+            ]
+        )
+        # Ties on created_at are broken by id.
+        Sensor.objects.update(created_at=created_at)
+        queryset = Sensor.objects.order_by("-created_at", "-id")
+
+        seen = []
+        page = list(queryset[:3])
+        while page:
+            seen.extend(row.id for row in page)
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+            page = list(keyset_filter(queryset, cursor)[:3])
+        self.assertEqual(seen, list(queryset.values_list("id", flat=True)))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            keyset_filter(Sensor.objects.all(), "not-a-cursor")
+
+
+class LockTests(TestCase):
+    def test_lock_is_exclusive_until_it_expires(self):
+        token = acquire_lock("calculation:Sensor 1:2024-01-01", ttl=60)
+        self.assertIsNotNone(token)
+        self.assertIsNone(acquire_lock("calculation:Sensor 1:2024-01-01", ttl=60))
+
+        JobLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        taken_over = acquire_lock("calculation:Sensor 1:2024-01-01", ttl=60)
+        self.assertIsNotNone(taken_over)
+        self.assertNotEqual(taken_over, token)
+
+        # The first owner can no longer renew or release it.
+        self.assertEqual(renew_locks(["calculation:Sensor 1:2024-01-01"], token), 0)
+        self.assertEqual(release_locks(["calculation:Sensor 1:2024-01-01"], token), 0)
+        self.assertEqual(
+            release_locks(["calculation:Sensor 1:2024-01-01"], taken_over), 1
+        )
+
+    def test_results_are_not_written_under_a_lost_lock(self):
+        with hold_lock("calculation:Sensor 1:2024-01-01", ttl=60):
+            upsert_energies([("Sensor 1", DAY, 1.0)], "calculated_energy")
+            JobLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            with self.assertRaises(LockLost):
+                upsert_energies([("Sensor 1", DAY, 2.0)], "calculated_energy")
+        self.assertEqual(Energy.objects.get().calculated_energy, 1.0)
+
+
+class EnergyUpsertTests(TestCase):
+    def test_upsert_touches_only_its_field(self):
+        first = upsert_energies([("Sensor 1", DAY, 1.5)], "calculated_energy")
+        second = upsert_energies(
+            [("Sensor 1", DAY, 2.0), ("Sensor 1", DAY, 2.5), ("Sensor 2", DAY, 3.0)],
+            "predicted_energy",
+        )
+        self.assertEqual(Energy.objects.count(), 2)
+        energy = Energy.objects.get(name="Sensor 1", date=str(DAY))
+        self.assertEqual(energy.calculated_energy, 1.5)
+        self.assertEqual(energy.predicted_energy, 2.5)
+        key = ("Sensor 1", str(DAY))
+        self.assertEqual(first[key].id, energy.id)
+        self.assertEqual(second[key].id, energy.id)
+
+
+class StandinModelTestCase(TestCase):
+    # A small random model for Sensor 1 in a temporary model directory.
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.settings = override_settings(
+            MODEL_STORAGE_PATH=cls.directory,
+            INFERENCE_BACKEND="keras",
+            ARCHIVE_READS=False,
+        )
+        cls.settings.enable()
+        build_standin_model(model_path("Sensor 1"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+
+class ResultCompletenessTests(TestCase):
+    def store(self, field, value, computed_at):
+        with mock.patch("api.results.timezone.now", return_value=computed_at):
+            upsert_energies([("Sensor 1", DAY, value)], field)
+
+    def calculate(self):
+        job, _ = Job.objects.get_or_create(
+            kind="calculation", name="Sensor 1", date=str(DAY), holder="test:1"
+        )
+        with mock.patch.object(job_queue, "submit", return_value=(job, True)):
+            return self.client.post(
+                reverse("1.0:sensor-energy-calculation"),
+                {"sensor": "Sensor 1", "date": str(DAY)},
+                content_type="application/json",
+            )
+
+    def test_results_from_an_open_day_are_planned_again(self):
+        start, end = day_bounds(DAY)
+        self.store("calculated_energy", 1.0, start + timedelta(hours=12))
+        self.store("predicted_energy", 2.0, end)
+        self.assertEqual(
+            complete_results(["Sensor 1"], [DAY], "calculated_energy"), set()
+        )
+
+        tasks = plan_tasks(["Sensor 1"], [DAY], [CALCULATION, PREDICTION])
+        self.assertEqual([task.kind for task in tasks], [CALCULATION])
+
+        self.store("calculated_energy", 3.0, end + timedelta(minutes=5))
+        self.assertEqual(plan_tasks(["Sensor 1"], [DAY], [CALCULATION]), [])
+
+    def test_calculation_endpoint_recomputes_a_partial_day(self):
+        start, end = day_bounds(DAY)
+        self.store("calculated_energy", 1.0, start + timedelta(hours=12))
+        self.assertEqual(self.calculate().status_code, 202)
+
+        self.store("calculated_energy", 3.0, end + timedelta(minutes=5))
+        response = self.calculate()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already exists", response.json()["error"])
+
+
+class PredictionTests(StandinModelTestCase):
+    def setUp(self):
+        telemetry = day_telemetry("Sensor 1")
+        head, tail = split_telemetry(telemetry, 1000)
+        # New readings inside the range so far keep the day's fitted scaling.
+        power = tail[2]["power"]
+        power[:] = np.clip(power, head[2]["power"].min(), head[2]["power"].max())
+        self.head, self.tail = head, tail
+
+    def predict_full(self, method):
+        PredictionFingerprint.objects.all().delete()
+        result = store_energy_prediction("Sensor 1", DAY, method=method)
+        self.assertEqual(result["cache"], MISS)
+        return result, self.stored_series()
+
+    def stored_series(self):
+        return read_prediction_series(Energy.objects.get(name="Sensor 1"))
+
+    def assert_same_prediction(self, result, series, method):
+        full, full_series = self.predict_full(method)
+        self.assertEqual(result["points"], full["points"])
+        self.assertAlmostEqual(
+            result["predicted_energy"], full["predicted_energy"], places=6
+        )
+        np.testing.assert_array_equal(series[0], full_series[0])
+        np.testing.assert_allclose(series[1], full_series[1], rtol=1e-5)
+
+    def test_incremental_matches_full_prediction(self):
+        write_telemetry([self.head])
+        self.assertEqual(store_energy_prediction("Sensor 1", DAY)["cache"], MISS)
+        write_telemetry([self.tail])
+        result = store_energy_prediction("Sensor 1", DAY)
+        self.assertEqual(result["cache"], INCREMENTAL)
+        self.assert_same_prediction(result, self.stored_series(), None)
+
+    def test_edit_in_place_is_seen_only_when_verifying(self):
+        write_telemetry([self.head])
+        store_energy_prediction("Sensor 1", DAY)
+        row = sensor_day_queryset("Sensor 1", DAY)[100]
+        Sensor.objects.filter(pk=row.pk).update(power=row.power + 50)
+
+        self.assertEqual(cached_prediction("Sensor 1", DAY)["cache"], HIT)
+        with override_settings(PREDICTION_CACHE_VERIFY_CONTENT=True):
+            self.assertIsNone(cached_prediction("Sensor 1", DAY))
+            self.assertEqual(store_energy_prediction("Sensor 1", DAY)["cache"], MISS)
+            self.assertEqual(cached_prediction("Sensor 1", DAY)["cache"], HIT)
+
+    def test_rolling_matches_full_prediction(self):
+        power = np.r_[self.head[2]["power"], self.tail[2]["power"]]
+        save_scaler(
+            scaler_path("Sensor 1"),
+            AffineScaler(power.min(), power.max()),
+            model_path("Sensor 1"),
+        )
+        self.addCleanup(os.remove, scaler_path("Sensor 1"))
+        write_telemetry([self.head])
+        for method in (TRAPEZOID, MEAN_INTERVAL):
+            with self.subTest(method=method):
+                Sensor.objects.filter(
+                    created_at__gt=to_datetime(self.head[1][-1])
+                ).delete()
+                Energy.objects.all().delete()
+                self.assertEqual(
+                    store_energy_prediction("Sensor 1", DAY, method=method)["cache"],
+                    MISS,
+                )
+                write_telemetry([self.tail])
+                result = store_energy_prediction("Sensor 1", DAY, method=method)
+                self.assertEqual(result["cache"], ROLLING)
+                self.assert_same_prediction(result, self.stored_series(), method)
+
+
+class BatchPredictionTests(StandinModelTestCase):
+    def setUp(self):
+        write_telemetry(synthetic_telemetry(["Sensor 1"], DAY, days=2))
+        # A third day with fewer readings than one window needs.
+        sensor_name, timestamps, columns = next(
+            synthetic_telemetry(["Sensor 1"], DAY + timedelta(days=2))
+        )
+        write_telemetry(
+            [(sensor_name, timestamps[:10], {k: v[:10] for k, v in columns.items()})]
+        )
+
+    def batch(self, sensor_names, days=3, **options):
+        report = store_batch_prediction(
+            sensor_names, DAY, DAY + timedelta(days=days - 1), **options
+        )
+        return {
+            (row["sensor"], row["date"]): row
+            for row in report["results"] + report["failures"]
+        }
+
+    def test_predicts_each_day_and_reports_short_days(self):
+        rows = self.batch(["Sensor 1"])
+        self.assertEqual(rows[("Sensor 1", str(DAY))]["status"], "created")
+        self.assertEqual(
+            rows[("Sensor 1", str(DAY + timedelta(days=1)))]["status"], "created"
+        )
+        short = rows[("Sensor 1", str(DAY + timedelta(days=2)))]
+        self.assertEqual(short["status"], "failed")
+        self.assertIn("Not enough sensor data", short["error"])
+        self.assertEqual(
+            Energy.objects.filter(predicted_energy__isnull=False).count(), 2
+        )
+
+    def test_existing_days_are_skipped_unless_overwritten(self):
+        first = self.batch(["Sensor 1"], days=1)[("Sensor 1", str(DAY))]
+        Energy.objects.filter(name="Sensor 1", date=str(DAY)).update(
+            predicted_energy=-1
+        )
+        self.assertEqual(
+            self.batch(["Sensor 1"], days=1)[("Sensor 1", str(DAY))]["status"],
+            "exists",
+        )
+        self.assertEqual(Energy.objects.get(date=str(DAY)).predicted_energy, -1)
+
+        row = self.batch(["Sensor 1"], days=1, overwrite=True)[("Sensor 1", str(DAY))]
+        self.assertEqual(row["status"], "created")
+        self.assertAlmostEqual(row["predicted_energy"], first["predicted_energy"])
+        self.assertAlmostEqual(
+            Energy.objects.get(date=str(DAY)).predicted_energy,
+            first["predicted_energy"],
+        )
+
+    def test_batch_predictions_are_cache_hits(self):
+        row = self.batch(["Sensor 1"], days=1)[("Sensor 1", str(DAY))]
+        cached = cached_prediction("Sensor 1", DAY)
+        self.assertEqual(cached["cache"], HIT)
+        self.assertEqual(cached["predicted_energy"], row["predicted_energy"])
+        self.assertEqual(cached["points"], row["points"])
+        self.assertEqual(store_energy_prediction("Sensor 1", DAY)["cache"], HIT)
+
+        # The fingerprint is the one a single prediction of the day writes.
+        batch_fingerprint = PredictionFingerprint.objects.values().get()
+        PredictionFingerprint.objects.all().delete()
+        single = store_energy_prediction("Sensor 1", DAY)
+        self.assertEqual(single["cache"], MISS)
+        self.assertAlmostEqual(single["predicted_energy"], row["predicted_energy"])
+        single_fingerprint = PredictionFingerprint.objects.values().get()
+        for field in ("id", "created_at", "updated_at"):
+            del batch_fingerprint[field], single_fingerprint[field]
+        for field in ("predicted_sum", "predicted_trapezoid", "last_predicted"):
+            self.assertAlmostEqual(
+                batch_fingerprint.pop(field), single_fingerprint.pop(field), places=4
+            )
+        self.assertEqual(batch_fingerprint, single_fingerprint)
+
+    def test_short_day_is_not_stored(self):
+        short_day = DAY + timedelta(days=2)
+        with self.assertRaisesMessage(NoSensorDataError, "Not enough sensor data"):
+            store_energy_prediction("Sensor 1", short_day)
+        self.assertFalse(Energy.objects.exists())
+        self.assertFalse(PredictionFingerprint.objects.exists())
+
+    def test_unknown_sensor_fails_per_day(self):
+        rows = self.batch(["Sensor 1", "Nope"], days=2)
+        for offset in range(2):
+            row = rows[("Nope", str(DAY + timedelta(days=offset)))]
+            self.assertEqual(row["status"], "failed")
+            self.assertIn("No sensor data available", row["error"])
+            self.assertEqual(
+                rows[("Sensor 1", str(DAY + timedelta(days=offset)))]["status"],
+                "created",
+            )
+        self.assertFalse(Energy.objects.filter(name="Nope").exists())
+
+    def test_endpoint_passes_overwrite_to_the_job(self):
+        job = Job.objects.create(
+            kind="batch_prediction", name="Sensor 1", date="-", holder="test:1"
+        )
+        with mock.patch.object(job_queue, "submit", return_value=(job, True)) as submit:
+            response = self.client.post(
+                reverse("1.0:sensor-energy-batch-prediction"),
+                {
+                    "sensors": ["Sensor 1"],
+                    "start_date": str(DAY),
+                    "end_date": str(DAY),
+                    "overwrite": True,
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(submit.call_args.kwargs["overwrite"])
+        self.assertEqual(submit.call_args.args[3], store_batch_prediction)
+
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        self.energy = Energy.objects.create(name="Sensor 1", date=str(DAY))
+        self.timestamps = day_bounds(DAY)[0].timestamp() + 60.0 * np.arange(30)
+        self.values = np.random.default_rng(0).random(6) * 500
+
+    def test_pack_round_trip_is_little_endian_float32(self):
+        blob = pack_values(self.values)
+        self.assertEqual(blob, self.values.astype("<f4").tobytes())
+        np.testing.assert_array_equal(
+            unpack_values(memoryview(blob)), self.values.astype(np.float32)
+        )
+
+    def test_write_then_read_in_each_storage(self):
+        for storage in PREDICTION_STORAGES:
+            with self.subTest(storage=storage):
+                write_prediction_series(
+                    self.energy, self.timestamps, self.values[:4], storage=storage
+                )
+                write_prediction_series(
+                    self.energy,
+                    self.timestamps[-2:],
+                    self.values[4:],
+                    append=True,
+                    storage=storage,
+                )
+                timestamps, values = read_prediction_series(self.energy)
+                np.testing.assert_allclose(values, self.values, rtol=1e-6)
+                self.assertEqual(len(timestamps), len(self.values))
+                if storage == SERIES:
+                    np.testing.assert_allclose(timestamps, self.timestamps[-6:])
+
+    def test_day_without_points_reads_as_none(self):
+        self.assertIsNone(read_prediction_series(self.energy))
+        with override_settings(PREDICTION_STORAGE=ROWS):
+            write_prediction_series(self.energy, self.timestamps, [])
+            self.assertIsNone(read_prediction_series(self.energy))
+
+
+class PredictionSeriesViewTests(TestCase):
+    def setUp(self):
+        self.energy = Energy.objects.create(
+            name="Sensor 1", date=str(DAY), predicted_energy=12.5
+        )
+        self.timestamps = day_bounds(DAY)[0].timestamp() + 60.0 * np.arange(
+            1440 + TIME_STEPS
+        )
+        self.values = (np.random.default_rng(0).random(1440) * 500).astype(np.float32)
+        write_prediction_series(self.energy, self.timestamps, self.values)
+
+    def get(self, **params):
+        headers = {
+            name: params.pop(name)
+            for name in ("HTTP_ACCEPT_ENCODING", "HTTP_IF_NONE_MATCH")
+            if name in params
+        }
+        return self.client.get(
+            reverse("1.0:prediction-series"),
+            {"sensor": "Sensor 1", "date": str(DAY), **params},
+            **headers,
+        )
+
+    def test_json_series(self):
+        # The series is read with its Energy row.
+        with self.assertNumQueries(1):
+            body = self.get().json()
+        self.assertEqual(body["points"], 1440)
+        self.assertEqual(body["predicted_energy"], 12.5)
+        np.testing.assert_allclose(body["power"], self.values)
+        np.testing.assert_allclose(body["timestamps"], self.timestamps[TIME_STEPS:])
+
+    def test_unchanged_series_is_not_modified(self):
+        response = self.get()
+        etag = response["ETag"]
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another representation of the same data has its own tag.
+        self.assertNotEqual(self.get(buckets=10)["ETag"], etag)
+
+        write_prediction_series(self.energy, self.timestamps, self.values + 1)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_large_body_is_gzipped_on_request(self):
+        plain = self.get()
+        self.assertNotIn("Content-Encoding", plain)
+        response = self.get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_binary_encoding(self):
+        response = self.get(encoding="binary", buckets=100, agg="min,max")
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(response["X-Series-Columns"], "offset,min,max")
+        shape = tuple(int(n) for n in response["X-Series-Shape"].split(","))
+        self.assertEqual(shape, (100, 3))
+        matrix = np.frombuffer(
+            response.content, dtype=response["X-Series-Dtype"]
+        ).reshape(shape)
+        timestamps, columns = downsample(
+            self.timestamps[TIME_STEPS:], self.values, 100, ["min", "max"]
+        )
+        start = datetime.fromisoformat(response["X-Series-Start"]).timestamp()
+        self.assertEqual(start, timestamps[0])
+        np.testing.assert_allclose(matrix[:, 0], timestamps - start)
+        np.testing.assert_array_equal(matrix[:, 1], columns["min"])
+        np.testing.assert_array_equal(matrix[:, 2], columns["max"])
+
+    def test_downsampling(self):
+        body = self.get(buckets=24).json()
+        self.assertEqual(len(body["timestamps"]), 24)
+        np.testing.assert_allclose(
+            body["mean"], self.values.reshape(24, 60).mean(axis=1), rtol=1e-6
+        )
+        body = self.get(buckets=24, agg="max,min").json()
+        np.testing.assert_array_equal(body["max"], self.values.reshape(24, 60).max(1))
+        np.testing.assert_array_equal(body["min"], self.values.reshape(24, 60).min(1))
+        self.assertEqual(self.get(buckets=24, agg="median").status_code, 400)
+
+    def test_day_without_points_is_not_found(self):
+        with override_settings(PREDICTION_STORAGE=ROWS):
+            write_prediction_series(self.energy, self.timestamps, [])
+        response = self.get()
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("No predicted points", response.json()["error"])
+
+
+class PackPredictionsMigrationTests(TransactionTestCase):
+    before = [("api", "0006_prediction_series")]
+    after = [("api", "0007_pack_power_predictions")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_rows_are_packed_into_one_series(self):
+        apps = self.migrate(self.before)
+        Energy = apps.get_model("api", "Energy")
+        PowerPrediction = apps.get_model("api", "PowerPrediction")
+        Sensor = apps.get_model("api", "Sensor")
+
+        start = day_bounds(DAY)[0]
+        sensor = Sensor.objects.create(
+            name="Sensor 1", **{field: 1.0 for field in NUMERIC_FIELDS}
+        )
+        for _ in range(TIME_STEPS + 2):
+            sensor.pk = None
+            sensor.save()
+        for minute, pk in enumerate(Sensor.objects.values_list("pk", flat=True)):
+            Sensor.objects.filter(pk=pk).update(
+                created_at=start + timedelta(minutes=minute)
+            )
+        matched = Energy.objects.create(name="Sensor 1", date=str(DAY))
+        spread = Energy.objects.create(name="Sensor 2", date=str(DAY))
+        Energy.objects.create(name="Sensor 3", date=str(DAY), predicted_energy=1.0)
+        for energy, values in ((matched, [1.5, 2.5, 3.5]), (spread, [4.0, 5.0])):
+            for value in values:
+                PowerPrediction.objects.create(energy=energy, power=value)
+
+        apps = self.migrate(self.after)
+        PredictionSeries = apps.get_model("api", "PredictionSeries")
+        self.assertEqual(PredictionSeries.objects.count(), 2)
+
+        series = PredictionSeries.objects.get(energy__name="Sensor 1")
+        self.assertEqual(series.points, 3)
+        np.testing.assert_array_equal(unpack_values(series.values), [1.5, 2.5, 3.5])
+        # The first point is predicted from the first TIME_STEPS readings.
+        self.assertEqual(series.start_at, start + timedelta(minutes=TIME_STEPS))
+        self.assertEqual(series.step_seconds, 60.0)
+
+        series = PredictionSeries.objects.get(energy__name="Sensor 2")
+        np.testing.assert_array_equal(unpack_values(series.values), [4.0, 5.0])
+        self.assertEqual(series.start_at, start)
+        self.assertEqual(series.step_seconds, 43200.0)
+
+        # Rows are kept, so the migration can be reversed.
+        self.assertEqual(apps.get_model("api", "PowerPrediction").objects.count(), 5)
+        apps = self.migrate(self.before)
+        self.assertFalse(apps.get_model("api", "PredictionSeries").objects.exists())
+
+
+class CompiledKerasModelTests(StandinModelTestCase):
+    def test_padded_and_sliced_batches_match_keras_predict(self):
+        model = load_keras_model(model_path("Sensor 1"))
+        compiled = CompiledKerasModel(model, batch_size=64, min_batch_size=16)
+        self.assertEqual(compiled.batch_sizes, [16, 64])
+
+        windows = (
+            np.random.default_rng(0).random((150, TIME_STEPS, 1)).astype(np.float32)
+        )
+        # Below, at and past each compiled size; 150 is two full slices and
+        # a last one of 22 padded to 64.
+        for count in (1, 15, 16, 17, 63, 64, 65, 150):
+            with self.subTest(count=count):
+                batch = windows[:count]
+                predicted = compiled.predict_on_batch(batch)
+                self.assertEqual(predicted.shape, (count, 1))
+                np.testing.assert_allclose(
+                    predicted, model.predict(batch, verbose=0), rtol=1e-5, atol=1e-6
+                )
+        self.assertEqual(compiled.predict_on_batch(windows[:0]).shape, (0, 1))
+
+
+class ModelVersionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(
+            MODEL_STORAGE_PATH=directory, INFERENCE_BACKEND="tflite"
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_unknown_sensor(self):
+        with self.assertRaisesMessage(
+            FileNotFoundError, "Model for sensor 'Sensor 9' not found."
+        ):
+            model_version_key("Sensor 9")
+
+    def write(self, backend, mtime):
+        with open(model_path("Sensor 1", backend), "wb") as f:
+            f.write(b"model")
+        os.utime(model_path("Sensor 1", backend), ns=(mtime, mtime))
+
+    def test_stale_flatbuffer_falls_back_to_keras(self):
+        self.write("keras", 1_000)
+        self.assertEqual(resolve_backend("Sensor 1"), "keras")
+        self.write("tflite", 2_000)
+        self.assertEqual(resolve_backend("Sensor 1"), "tflite")
+        converted = model_version("Sensor 1")
+
+        self.write("keras", 3_000)
+        self.assertEqual(resolve_backend("Sensor 1"), "keras")
+        self.assertNotEqual(model_version("Sensor 1"), converted)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.queue = JobQueue(history_size=2)
+
+    def test_submit_returns_job_of_another_process(self):
+        other = Job.objects.create(
+            kind="prediction", name="Sensor 1", date="2026-10-17", holder="other:1"
+        )
+        job, created = self.queue.submit(
+            "prediction", "Sensor 1", "2026-10-17", lambda: None
+        )
+        self.assertFalse(created)
+        self.assertEqual(job.pk, other.pk)
+        self.assertEqual(self.queue.get(other.pk).pk, other.pk)
+        self.assertEqual(
+            [job.pk for job in self.queue.active(kind="prediction")], [other.pk]
+        )
+
+    def test_stale_job_is_marked_failed(self):
+        job = Job.objects.create(
+            kind="calculation",
+            name="Sensor 1",
+            date="2026-10-17",
+            holder="other:1",
+            status=RUNNING,
+        )
+        Job.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        job = self.queue.get(job.pk)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job_dict(job)["error"], "The worker running this job stopped.")
+        self.assertEqual(self.queue.active(), [])
+
+    def test_trim_keeps_newest_finished_jobs(self):
+        for day in range(1, 5):
+            Job.objects.create(
+                kind="calculation",
+                name="Sensor 1",
+                date=f"2026-10-0{day}",
+                holder="other:1",
+                status=DONE,
+            )
+        Job.objects.create(
+            kind="calculation", name="Sensor 1", date="2026-10-05", holder="other:1"
+        )
+        self.queue._trim()
+        self.assertEqual(
+            sorted(Job.objects.values_list("date", flat=True)),
+            ["2026-10-03", "2026-10-04", "2026-10-05"],
+        )
+
+
+class PrecomputeCommandTests(TestCase):
+    def setUp(self):
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+
+    def test_without_sensors_fails_once_but_loop_keeps_running(self):
+        with self.assertRaises(CommandError):
+            call_command("precompute", stdout=io.StringIO())
+
+        stderr = io.StringIO()
+        with mock.patch.object(
+            Precompute,
+            "sleep",
+            autospec=True,
+            side_effect=lambda precompute, seconds: precompute.stop(),
+        ) as sleep:
+            call_command("precompute", loop=True, stdout=io.StringIO(), stderr=stderr)
+        sleep.assert_called_once()
+        self.assertIn("No sensors with both data and a model.", stderr.getvalue())
+
+
+class MetricsTests(StandinModelTestCase):
+    def setUp(self):
+        metrics.clear()
+        job = Job.objects.create(kind="prediction", name="-", date="-", holder="test:1")
+        submit = mock.patch.object(job_queue, "submit", return_value=(job, True))
+        submit.start()
+        self.addCleanup(submit.stop)
+
+    def predict(self, sensor_name):
+        return self.client.post(
+            reverse("1.0:sensor-energy-prediction"),
+            {"sensor": sensor_name, "date": str(DAY)},
+            content_type="application/json",
+        )
+
+    def test_sensor_label_is_bounded_to_sensors_with_a_model(self):
+        self.assertEqual(sensor_label("Sensor 1"), "Sensor 1")
+        self.assertEqual(sensor_label("Sensor 1\nbogus"), UNKNOWN_SENSOR)
+        self.assertEqual(sensor_label("../Sensor 1"), UNKNOWN_SENSOR)
+        self.assertEqual(sensor_label(""), "")
+
+    def test_unvalidated_names_share_the_unknown_label(self):
+        for i in range(3):
+            self.assertEqual(self.predict(f"Made up {i}").status_code, 202)
+        self.assertEqual(self.predict("Sensor 1").status_code, 202)
+
+        response = self.client.get(reverse("1.0:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertNotIn("Made up", body)
+        self.assertIn(
+            'energy_stage_seconds_count{sensor="unknown",stage="cache_check"} 3',
+            body,
+        )
+        self.assertIn(
+            'energy_stage_seconds_count{sensor="Sensor 1",stage="cache_check"} 1',
+            body,
+        )
+        self.assertIn("# TYPE http_request_seconds histogram", body)
+        self.assertIn('route="api/energy/prediction/"', body)
+
+    def test_server_timing_lists_the_stages_and_the_total(self):
+        response = self.predict("Sensor 1")
+        timings = dict(
+            entry.split(";dur=") for entry in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(list(timings), ["cache_check", "total"])
+        self.assertGreaterEqual(float(timings["total"]), float(timings["cache_check"]))
+
+        # Each stage also logs one JSON line at debug level.
+        with self.assertLogs("api.metrics", "DEBUG") as logs:
+            with stage("predict", "Sensor 1"), stage("predict", "Sensor 1"):
+                pass
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('"stage": "predict"', logs.records[0].getMessage())
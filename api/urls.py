@@ -3,24 +3,51 @@ from api.views import (
     CheckPredictionLock,
     CheckCalculateLock,
     SensorList,
+    SensorIngest,
     SensorEnergyPrediction,
     SensorEnergyCalculation,
+    ModelRegistryStatus,
+    JobStatus,
+    PredictionCacheStatus,
+    SensorEnergyBatchPrediction,
+    EnergyList,
+    EnergyRange,
+    PredictionSeriesDetail,
+    Metrics,
 )
 
 app_name = "api"
 
 urlpatterns = [
     path("sensors/", SensorList.as_view(), name="sensor-list"),
+    path("sensors/ingest/", SensorIngest.as_view(), name="sensor-ingest"),
+    path("energy/", EnergyList.as_view(), name="energy-list"),
+    path("energy/range/", EnergyRange.as_view(), name="energy-range"),
     path(
         "energy/prediction/",
         SensorEnergyPrediction.as_view(),
         name="sensor-energy-prediction",
     ),
+    path(
+        "energy/prediction/batch/",
+        SensorEnergyBatchPrediction.as_view(),
+        name="sensor-energy-batch-prediction",
+    ),
+    path(
+        "energy/prediction/series/",
+        PredictionSeriesDetail.as_view(),
+        name="prediction-series",
+    ),
     path(
         "energy/prediction/status/",
         CheckPredictionLock.as_view(),
         name="prediction-status",
     ),
+    path(
+        "energy/prediction/cache/",
+        PredictionCacheStatus.as_view(),
+        name="prediction-cache-status",
+    ),
     path(
         "energy/calculation/",
         SensorEnergyCalculation.as_view(),
@@ -31,4 +58,15 @@ urlpatterns = [
         CheckCalculateLock.as_view(),
         name="calculation-status",
     ),
+    path(
+        "energy/jobs/<uuid:job_id>/",
+        JobStatus.as_view(),
+        name="job-status",
+    ),
+    path("metrics/", Metrics.as_view(), name="metrics"),
+    path(
+        "models/status/",
+        ModelRegistryStatus.as_view(),
+        name="model-registry-status",
+    ),
 ]
@@ -1,104 +1,224 @@
 # utils.py
-import os
+import logging
+
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from sklearn.preprocessing import MinMaxScaler
 from django.conf import settings
+from django.utils import timezone
+from .archive import fetch_day_power, load_archived_day
+from .energy import (
+    MEAN_INTERVAL,
+    average_interval_hours,
+    fetch_power_series,
+    integrate_energy,
+    mean_interval_energy,
+)
+from .metrics import stage
 from .models import Sensor
+from .queries import day_bounds, sensor_day_queryset
+from .resampling import resample_interval, resample_series
+from .registry import model_registry
+from .results import upsert_energies
+from .rollups import covers_day, refresh_rollups, rollup_day_energy, start_rollups
+from .scaling import AffineScaler
+from .sql_energy import SQL, day_energy
+from .windowing import TIME_STEPS, iter_window_batches, sliding_windows
 from datetime import timedelta
-from rest_framework.response import Response
-from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+
+class NoSensorDataError(ValueError):
+    pass
+
+
+def check_enough_data(selected_date, samples: int):
+    # A day needs more samples than one window to predict anything.
+    if samples <= TIME_STEPS:
+        raise NoSensorDataError(
+            f"Not enough sensor data for {selected_date} "
+            f"({samples} rows, need more than {TIME_STEPS})."
+        )
 
 
 def load_model(sensor_name: str):
-    model_path = os.path.join(settings.MODEL_STORAGE_PATH, f"{sensor_name}_model.h5")
-    try:
-        model = tf.keras.models.load_model(model_path)
-        return model
-    except Exception:
-        raise FileNotFoundError(f"Model for sensor '{sensor_name}' not found.")
+    return model_registry.get(sensor_name)
 
 
-def create_sequences(data: np.array, time_steps: int = 24):
-    X = []
-    for i in range(len(data) - time_steps):
-        X.append(data[i : i + time_steps])
-    return np.array(X)
+def day_scaler(sensor_name: str, power: np.ndarray):
+    # The sensor's persisted scaler (see the fit_scalers command). Without
+    # one, fitted on the day's power as before, so a window's scaled values
+    # change whenever the day's range does.
+    return model_registry.scaler(sensor_name) or AffineScaler.fit(power)
 
 
-def predict_energy(sensor_name, selected_date):
-    predicted_dataset = selected_date - timedelta(days=0)
+def create_sequences(data: np.array, time_steps: int = TIME_STEPS):
+    return sliding_windows(data, time_steps)
 
-    sensor_data = Sensor.objects.filter(
-        created_at__date=predicted_dataset, name=sensor_name
-    ).order_by("created_at")
 
-    if not sensor_data:
-        return Response(
-            {"error": f"No sensor data available for {selected_date}."},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+def predict_batches(model, batches):
+    outputs = [np.asarray(model.predict_on_batch(batch)) for batch in batches]
+    if not outputs:
+        return np.empty((0, 1), dtype=np.float32)
+    return np.concatenate(outputs)
 
-    first_row = sensor_data.first().created_at
-    last_row = sensor_data.last().created_at
-    print(f"Predicting {sensor_name} from {first_row} to {last_row}...")
 
-    data_prediction = pd.DataFrame(list(sensor_data.values("created_at", "power")))
-    data_prediction.set_index("created_at", inplace=True)
+def predict_sequences(model, data: np.array, time_steps: int = TIME_STEPS):
+    # Feed the model fixed-size slices of the window view so peak memory
+    # does not grow with the length of the series.
+    return predict_batches(
+        model,
+        iter_window_batches(
+            data, time_steps, batch_size=settings.PREDICTION_BATCH_SIZE
+        ),
+    )
 
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    data_prediction_scaled = scaler.fit_transform(data_prediction[["power"]])
 
-    X_test = create_sequences(data_prediction_scaled)
-    X_test = X_test.reshape((X_test.shape[0], X_test.shape[1], 1))
+def predicted_energy(timestamps, predicted_power, method=None):
+    method = method or settings.ENERGY_INTEGRATION_METHOD
+    if method == MEAN_INTERVAL:
+        # Keep the historical behaviour: predicted samples spaced by the input's mean interval.
+        return mean_interval_energy(predicted_power, average_interval_hours(timestamps))
+    # Prediction i is the sample right after window i, i.e. timestamps[i + time_steps].
+    return integrate_energy(
+        timestamps[len(timestamps) - len(predicted_power) :],
+        predicted_power,
+        method=method,
+    )
 
-    model = load_model(sensor_name)
-    predicted_data = model.predict(X_test)
-    predicted_data_rescaled = scaler.inverse_transform(predicted_data.reshape(-1, 1))
 
-    total_energy_predicted = 0
-    predicted_average_interval = (
-        data_prediction.index.to_series().diff().dt.total_seconds().mean() / 3600
-    )  # hours
+def predict_energy(sensor_name, selected_date, method=None, resample=None):
+    predicted_dataset = selected_date - timedelta(days=0)
+
+    with stage("fetch", sensor_name):
+        timestamps, power = fetch_day_power(sensor_name, predicted_dataset)
 
-    for predicted_power in predicted_data_rescaled.flatten():
-        predicted_energy_value = (
-            predicted_power * predicted_average_interval
-        ) / 1000  # kWh
-        total_energy_predicted += predicted_energy_value
+    if not len(timestamps):
+        raise NoSensorDataError(f"No sensor data available for {selected_date}.")
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Predicting %s from %s to %s...",
+            sensor_name,
+            pd.to_datetime(timestamps[0], unit="s", utc=True),
+            pd.to_datetime(timestamps[-1], unit="s", utc=True),
+        )
+
+    interval = resample_interval(sensor_name, resample)
+    if interval:
+        with stage("resample", sensor_name):
+            timestamps, power, _ = resample_series(
+                timestamps,
+                power,
+                interval,
+                origin=day_bounds(predicted_dataset)[0].timestamp(),
+            )
+
+    with stage("load_model", sensor_name):
+        model = load_model(sensor_name)
+    with stage("scale", sensor_name):
+        scaler = day_scaler(sensor_name, power)
+        data_prediction_scaled = scaler.transform(power.reshape(-1, 1))
+    with stage("predict", sensor_name):
+        predicted_data = predict_sequences(model, data_prediction_scaled)
+
+    with stage("integrate", sensor_name):
+        predicted_data_rescaled = scaler.inverse_transform(
+            predicted_data.reshape(-1, 1)
+        )
+        total_energy_predicted = predicted_energy(
+            timestamps, predicted_data_rescaled.ravel(), method=method
+        )
 
     return total_energy_predicted, predicted_data_rescaled
 
 
-def calculate_energy(sensor_name, selected_date):
-    sensor_data = Sensor.objects.filter(
-        created_at__date=selected_date, name=sensor_name
-    ).order_by("created_at")
+def calculate_energy(sensor_name, selected_date, method=None):
+    covered = settings.ENERGY_ROLLUPS and covers_day(sensor_name, selected_date)
+    if (
+        settings.ENERGY_ROLLUPS
+        and not covered
+        and selected_date >= timezone.localdate()
+        and Sensor.objects.filter(name=sensor_name).exists()
+    ):
+        # The first calculation of today starts rolling the sensor up.
+        start_rollups(sensor_name)
+        covered = covers_day(sensor_name, selected_date)
+    if covered:
+        with stage("rollups", sensor_name):
+            processed = refresh_rollups(sensor_name)
+            total_energy_calculated = rollup_day_energy(
+                sensor_name, selected_date, method=method
+            )
+        if total_energy_calculated is not None:
+            logger.debug(
+                "Calculated energy for %s on %s from rollups (%s new rows)",
+                sensor_name,
+                selected_date,
+                processed,
+            )
+            return total_energy_calculated
+
+    # Archived days may be pruned from sensor_electrics; read them from disk.
+    with stage("fetch", sensor_name):
+        archived = (
+            load_archived_day(sensor_name, selected_date)
+            if settings.ARCHIVE_READS
+            else None
+        )
+    if archived is not None:
+        timestamps, values = archived
+        logger.debug(
+            "Calculating energy for %s on %s from the archive",
+            sensor_name,
+            selected_date,
+        )
+        with stage("integrate", sensor_name):
+            return integrate_energy(timestamps, values["power"], method=method)
+
+    if settings.ENERGY_CALCULATION_BACKEND == SQL:
+        with stage("integrate_sql", sensor_name):
+            total_energy_calculated = day_energy(
+                sensor_name, selected_date, method=method
+            )
+        if total_energy_calculated is None:
+            raise NoSensorDataError(f"No sensor data available for {selected_date}.")
+        logger.debug(
+            "Calculated energy for %s on %s in the database", sensor_name, selected_date
+        )
+        return total_energy_calculated
 
-    if not sensor_data:
-        return Response(
-            {"error": f"No sensor data available for {selected_date}."},
-            status=status.HTTP_400_BAD_REQUEST,
+    with stage("fetch", sensor_name):
+        timestamps, power = fetch_power_series(
+            sensor_day_queryset(sensor_name, selected_date)
         )
 
-    first_row = sensor_data.first().created_at
-    last_row = sensor_data.last().created_at
-    print(f"Calculating energy for {sensor_name} from {first_row} to {last_row}...")
+    if not len(timestamps):
+        raise NoSensorDataError(f"No sensor data available for {selected_date}.")
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Calculating energy for %s from %s to %s...",
+            sensor_name,
+            pd.to_datetime(timestamps[0], unit="s", utc=True),
+            pd.to_datetime(timestamps[-1], unit="s", utc=True),
+        )
+        logger.debug("Average interval: %s hours", average_interval_hours(timestamps))
 
-    data_calculation = pd.DataFrame(list(sensor_data.values("created_at", "power")))
-    data_calculation.set_index("created_at", inplace=True)
+    with stage("integrate", sensor_name):
+        return integrate_energy(timestamps, power, method=method)
 
-    total_energy_calculated = 0
-    calculated_average_interval = (
-        data_calculation.index.to_series().diff().dt.total_seconds().mean() / 3600
-    )  # hours
-    print(f"Average interval: {calculated_average_interval} hours")
 
-    for sensor in sensor_data:
-        calculated_energy_value = (
-            sensor.power * calculated_average_interval
-        ) / 1000  # kWh
-        total_energy_calculated += calculated_energy_value
+def store_energy_calculation(sensor_name, selected_date, method=None):
+    logger.debug("Calculating energy...")
+    total_energy_calculated = calculate_energy(
+        sensor_name=sensor_name, selected_date=selected_date, method=method
+    )
+
+    with stage("store", sensor_name):
+        upsert_energies(
+            [(sensor_name, selected_date, total_energy_calculated)],
+            "calculated_energy",
+        )
 
-    return total_energy_calculated
+    return {"calculated_energy": total_energy_calculated}
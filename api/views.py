@@ -1,38 +1,400 @@
 import os
+import json
+import logging
+import time
+import hashlib
+from itertools import islice
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, generics
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.text import compress_string
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from datetime import timedelta
-from .models import Sensor, Energy, PowerPrediction
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from .models import Sensor, Energy
+from .pagination import InvalidCursor, encode_cursor, keyset_filter
 from .serializers import (
-    SensorSerializer,
+    SensorListQuerySerializer,
     EnergySerializer,
+    EnergyResultSerializer,
+    EnergyListQuerySerializer,
+    EnergyRangeQuerySerializer,
+    PredictionSeriesQuerySerializer,
     SensorEnergySerializer,
+    SensorEnergyBatchSerializer,
 )
-from django.core.cache import cache
-from .utils import predict_energy, calculate_energy
+from django.urls import reverse
+from .utils import store_energy_calculation
+from .prediction_cache import cache_stats, cached_prediction, store_energy_prediction
+from .batch import store_batch_prediction
+from .ingest import IngestError, ingest_rows, parse_body, refresh_ingested_rollups
+from .jobs import JobQueueFull, job_dict, job_queue
+from .locks import aheld_locks
+from .metrics import metrics
+from .registry import model_registry
+from .results import complete_results
+from .series import SERIES_DTYPE, downsample, read_prediction_rows, read_series
+from .sql_energy import range_energy
+
+logger = logging.getLogger(__name__)
+
+
+async def aiter_chunked(queryset, chunk_size):
+    # QuerySet.aiterator() opens the cursor on the event loop for values_list()
+    # querysets and fails, so each chunk is fetched in the sync thread instead.
+    rows = queryset.iterator(chunk_size=chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await fetch():
+        for row in chunk:
+            yield row
+
+
+class SensorList(View):
+    # Async so list and status polls are not queued behind the sync thread on ASGI.
+    async def get(self, request, *args, **kwargs):
+        query = SensorListQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        since = params.get("since")
+        until = params.get("until")
+        if since is None and until is None:
+            since = timezone.now() - timedelta(minutes=5)
+
+        queryset = Sensor.objects.all()
+        if params.get("name"):
+            queryset = queryset.filter(name__in=params["name"])
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        if until is not None:
+            queryset = queryset.filter(created_at__lt=until)
+        queryset = queryset.order_by("-created_at", "-id")
+
+        if params.get("cursor"):
+            try:
+                queryset = keyset_filter(queryset, params["cursor"])
+            except InvalidCursor as e:
+                return JsonResponse(
+                    {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
+                )
 
+        fields = params.get("fields") or [
+            field.name for field in Sensor._meta.concrete_fields
+        ]
+        # id and created_at are always fetched because the cursor is built from them.
+        columns = list(dict.fromkeys(["created_at", "id", *fields]))
+        rows = queryset.values_list(*columns)
+
+        positions = [columns.index(field) for field in fields]
+
+        def project(row):
+            return {field: row[i] for field, i in zip(fields, positions)}
+
+        if params["stream"]:
+            if params.get("limit"):
+                rows = rows[: params["limit"]]
+            chunk_size = settings.SENSOR_LIST_STREAM_CHUNK_SIZE
+
+            async def lines():
+                async for row in aiter_chunked(rows, chunk_size):
+                    yield json.dumps(project(row), cls=JSONEncoder) + "\n"
+
+            return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+        limit = params.get("limit") or settings.SENSOR_LIST_PAGE_SIZE
+        page = [row async for row in rows[: limit + 1]]
+        headers = {}
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1][0], page[-1][1])
+            next_query = request.GET.copy()
+            next_query["cursor"] = next_cursor
+            if since is not None and "since" not in next_query:
+                # Pin the default five-minute window so later pages don't drift.
+                next_query["since"] = since.isoformat()
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{next_query.urlencode()}"
+            )
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return JsonResponse(
+            [project(row) for row in page],
+            encoder=JSONEncoder,
+            safe=False,
+            headers=headers,
+        )
 
-class SensorList(generics.ListAPIView):
-    queryset = Sensor.objects.all()
-    serializer_class = SensorSerializer
 
-    def get_queryset(self):
-        five_minutes_ago = timezone.now() - timedelta(minutes=5)
-        return Sensor.objects.filter(created_at__gte=five_minutes_ago).order_by(
-            "-created_at"
+@method_decorator(csrf_exempt, name="dispatch")
+class SensorIngest(View):
+    # Plain Django view: DRF parsing and serializers cost more than the insert itself.
+    def post(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            rows = parse_body(request.body, request.content_type)
+        except IngestError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(rows) > settings.INGEST_MAX_ROWS:
+            return JsonResponse(
+                {"error": f"Batch is limited to {settings.INGEST_MAX_ROWS} rows."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        report = ingest_rows(rows)
+        if settings.ENERGY_ROLLUPS and report["sensors"]:
+            report["rollups"] = refresh_ingested_rollups(
+                report["sensors"], report["first_at"]
+            )
+        report["seconds"] = round(time.perf_counter() - started, 6)
+
+        return JsonResponse(
+            report,
+            status=(
+                status.HTTP_201_CREATED
+                if report["accepted"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
         )
 
 
-class CheckPredictionLock(APIView):
-    def get(self, request, *args, **kwargs):
-        lock_key = "sensor_energy_prediction_lock"
-        lock_status = cache.get(lock_key)
+def representation_etag(request, *parts):
+    # Same data, different query string (buckets, encoding...) is a different representation.
+    digest = hashlib.blake2b(digest_size=12)
+    for part in (*parts, request.GET.urlencode()):
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return quote_etag(digest.hexdigest())
+
+
+def not_modified(request, etag, last_modified):
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+
+
+def cacheable(request, response, etag, last_modified):
+    # Large bodies are gzipped here rather than by middleware so list endpoints
+    # that stream are not buffered.
+    if (
+        "gzip" in request.headers.get("Accept-Encoding", "")
+        and len(response.content) >= 1024
+    ):
+        response.content = compress_string(response.content)
+        response["Content-Encoding"] = "gzip"
+        response["Content-Length"] = str(len(response.content))
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+class EnergyList(View):
+    async def get(self, request, *args, **kwargs):
+        query = EnergyListQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        queryset = Energy.objects.filter(
+            name=params["sensor"],
+            date__gte=str(params["start_date"]),
+            date__lte=str(params["end_date"]),
+        )
+        # Conditional GET is answered from one aggregate over the (name, date) index.
+        summary = await queryset.aaggregate(
+            total=Count("id"),
+            last_modified=Max("updated_at"),
+            series_modified=Max("prediction_series__updated_at"),
+        )
+        last_modified = max(
+            filter(None, [summary["last_modified"], summary["series_modified"]]),
+            default=None,
+        )
+        if last_modified is None:
+            return JsonResponse([], safe=False)
+        etag = representation_etag(request, summary["total"], last_modified)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        rows = [
+            row
+            async for row in queryset.order_by("date").values(
+                *[field.name for field in Energy._meta.concrete_fields],
+                prediction_points=F("prediction_series__points"),
+            )
+        ]
+        response = JsonResponse(
+            EnergyResultSerializer(rows, many=True).data,
+            encoder=JSONEncoder,
+            safe=False,
+        )
+        return cacheable(request, response, etag, last_modified)
+
+
+class EnergyRange(View):
+    async def get(self, request, *args, **kwargs):
+        query = EnergyRangeQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        method = params.get("method") or settings.ENERGY_INTEGRATION_METHOD
+        # One window-function query over the raw rows, however many sensors.
+        results = await sync_to_async(range_energy)(
+            params["sensors"],
+            params["start_date"],
+            params["end_date"],
+            period=params["period"],
+            method=method,
+        )
+        return JsonResponse(
+            {
+                "start_date": params["start_date"],
+                "end_date": params["end_date"],
+                "period": params["period"],
+                "method": method,
+                "results": results,
+            },
+            encoder=JSONEncoder,
+        )
 
-        is_prediction_running = lock_status is not None
 
-        return Response(
+class PredictionSeriesDetail(View):
+    async def get(self, request, *args, **kwargs):
+        query = PredictionSeriesQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        # The series comes with the Energy row: one query, values included,
+        # as a day's packed series is only a few kilobytes.
+        energy = await (
+            Energy.objects.select_related("prediction_series")
+            .filter(name=params["sensor"], date=str(params["date"]))
+            .afirst()
+        )
+        if energy is None or energy.predicted_energy is None:
+            return JsonResponse(
+                {"error": f"No prediction for {params['sensor']} on {params['date']}."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        series = getattr(energy, "prediction_series", None)
+        if series is not None:
+            stored = read_series(series)
+        else:
+            stored = await sync_to_async(read_prediction_rows)(energy)
+        if stored is None:
+            return JsonResponse(
+                {
+                    "error": f"No predicted points for {params['sensor']} "
+                    f"on {params['date']}."
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        last_modified = max(
+            energy.updated_at, series.updated_at if series else energy.updated_at
+        )
+        etag = representation_etag(
+            request, energy.id, series.id if series else None, last_modified
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        timestamps, values = stored
+        if params.get("buckets"):
+            timestamps, columns = downsample(
+                timestamps, values, params["buckets"], params["agg"]
+            )
+        else:
+            columns = {"power": values}
+
+        if params["encoding"] == "binary":
+            # Row-major little-endian float32: seconds since X-Series-Start, then one
+            # column per aggregation. Offsets keep float32 precise over a day.
+            matrix = np.empty((len(timestamps), 1 + len(columns)), dtype=SERIES_DTYPE)
+            matrix[:, 0] = timestamps - timestamps[0] if len(timestamps) else 0
+            for i, column in enumerate(columns.values(), start=1):
+                matrix[:, i] = column
+            response = HttpResponse(
+                matrix.tobytes(), content_type="application/octet-stream"
+            )
+            response["X-Series-Start"] = (
+                datetime.fromtimestamp(timestamps[0], tz=dt_timezone.utc).isoformat()
+                if len(timestamps)
+                else ""
+            )
+            response["X-Series-Columns"] = ",".join(["offset", *columns])
+            response["X-Series-Dtype"] = SERIES_DTYPE.str
+            response["X-Series-Shape"] = ",".join(str(n) for n in matrix.shape)
+            return cacheable(request, response, etag, last_modified)
+
+        response = JsonResponse(
+            {
+                "sensor": energy.name,
+                "date": energy.date,
+                "predicted_energy": energy.predicted_energy,
+                "points": len(values),
+                "timestamps": np.round(timestamps, 3).tolist(),
+                **{name: column.tolist() for name, column in columns.items()},
+            },
+        )
+        return cacheable(request, response, etag, last_modified)
+
+
+class Metrics(View):
+    async def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class ModelRegistryStatus(View):
+    async def get(self, request, *args, **kwargs):
+        return JsonResponse(model_registry.stats())
+
+
+class JobStatus(View):
+    async def get(self, request, job_id, *args, **kwargs):
+        job = await job_queue.aget(job_id)
+        if job is None:
+            return JsonResponse(
+                {"error": f"Job {job_id} not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return JsonResponse(job_dict(job), encoder=JSONEncoder)
+
+
+class PredictionCacheStatus(View):
+    async def get(self, request, *args, **kwargs):
+        return JsonResponse(cache_stats.as_dict())
+
+
+class CheckPredictionLock(View):
+    async def get(self, request, *args, **kwargs):
+        active_jobs = await job_queue.aactive(kind="prediction")
+        # Locks also cover work outside the job queue, such as precompute runs.
+        locks = await aheld_locks(prefix="prediction:")
+
+        is_prediction_running = bool(active_jobs or locks)
+
+        return JsonResponse(
             {
                 "message": (
                     "Prediction process is currently running."
@@ -40,19 +402,22 @@ class CheckPredictionLock(APIView):
                     else "Prediction process is not running."
                 ),
                 "is_prediction_running": is_prediction_running,
+                "jobs": [job_dict(job) for job in active_jobs],
+                "locks": locks,
             },
-            status=status.HTTP_200_OK,
+            encoder=JSONEncoder,
         )
 
 
-class CheckCalculateLock(APIView):
-    def get(self, request, *args, **kwargs):
-        lock_key = "sensor_energy_calculation_lock"
-        lock_status = cache.get(lock_key)
+class CheckCalculateLock(View):
+    async def get(self, request, *args, **kwargs):
+        active_jobs = await job_queue.aactive(kind="calculation")
+        # Locks also cover work outside the job queue, such as precompute runs.
+        locks = await aheld_locks(prefix="calculation:")
 
-        is_calculation_running = lock_status is not None
+        is_calculation_running = bool(active_jobs or locks)
 
-        return Response(
+        return JsonResponse(
             {
                 "message": (
                     "Calculation process is currently running."
@@ -60,143 +425,134 @@ class CheckCalculateLock(APIView):
                     else "Calculation process is not running."
                 ),
                 "is_calculation_running": is_calculation_running,
+                "jobs": [job_dict(job) for job in active_jobs],
+                "locks": locks,
             },
-            status=status.HTTP_200_OK,
+            encoder=JSONEncoder,
         )
 
 
-class SensorEnergyPrediction(APIView):
-    def post(self, request, *args, **kwargs):
-        lock_key = "sensor_energy_prediction_lock"
+def enqueue(request, kind, sensor_name, selected_date, func, /, **kwargs):
+    try:
+        job, created = job_queue.submit(
+            kind, sensor_name, selected_date, func, **kwargs
+        )
+    except JobQueueFull as e:
+        return Response(
+            {"error": f"Too many jobs in progress: {e} Retry later."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.JOB_RETRY_AFTER_SECONDS)},
+        )
+    return job_response(request, job, created)
 
-        if cache.get(lock_key):
-            return Response(
-                {
-                    "error": "Prediction process is already running. Please try again later."
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
 
-        cache.set(lock_key, True, timeout=600)
+def job_response(request, job, created):
+    return Response(
+        {
+            "message": "Job queued." if created else "Job already in progress.",
+            "status_url": request.build_absolute_uri(
+                reverse("1.0:job-status", kwargs={"job_id": job.id})
+            ),
+            **job_dict(job),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
 
-        try:
-            serializer = SensorEnergySerializer(data=request.data)
-            if not serializer.is_valid():
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            sensor_name = serializer.validated_data["sensor"]
-            selected_date = serializer.validated_data.get("date", None)
+class SensorEnergyPrediction(APIView):
+    def post(self, request, *args, **kwargs):
+        serializer = SensorEnergySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            if not selected_date:
-                selected_date = timezone.now().date()
+        sensor_name = serializer.validated_data["sensor"]
+        selected_date = serializer.validated_data.get("date", None)
 
-            print("Selected date        :", selected_date)
-            print("Sensor name          :", sensor_name)
+        if not selected_date:
+            selected_date = timezone.now().date()
 
-            if not Energy.objects.filter(
-                name=sensor_name, date=selected_date, predicted_energy__isnull=False
-            ).exists():
-                print("Predicting energy...")
-                total_energy_predicted, predicted_data_rescaled = predict_energy(
-                    sensor_name=sensor_name, selected_date=selected_date
-                )
+        logger.debug("Selected date %s for sensor %s", selected_date, sensor_name)
 
-                energy_prediction = Energy.objects.filter(
-                    name=sensor_name,
-                    date=selected_date,
-                ).first()
-
-                if not energy_prediction:
-                    energy_prediction = Energy(
-                        name=sensor_name,
-                        date=selected_date,
-                        predicted_energy=total_energy_predicted,
-                    )
-                    energy_prediction.save()
-                else:
-                    energy_prediction.predicted_energy = total_energy_predicted
-                    energy_prediction.save()
-
-                power_predictions = [
-                    PowerPrediction(energy=energy_prediction, power=predicted_power)
-                    for predicted_power in predicted_data_rescaled.flatten()
-                ]
-                PowerPrediction.objects.bulk_create(power_predictions)
-
-                return Response(status=status.HTTP_201_CREATED)
-
-            else:
-                return Response(
-                    {
-                        "error": f"Energy prediction for {sensor_name} on {selected_date} already exists."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        method = serializer.validated_data.get("method")
+        resample = serializer.validated_data.get("resample")
+        cached = cached_prediction(
+            sensor_name, selected_date, method=method, resample=resample
+        )
+        if cached is not None:
+            return Response(
+                {"sensor": sensor_name, "date": str(selected_date), **cached},
+                status=status.HTTP_200_OK,
+            )
 
-        finally:
-            cache.delete(lock_key)
+        return enqueue(
+            request,
+            "prediction",
+            sensor_name,
+            selected_date,
+            store_energy_prediction,
+            sensor_name=sensor_name,
+            selected_date=selected_date,
+            method=method,
+            resample=resample,
+        )
 
 
 class SensorEnergyCalculation(APIView):
     def post(self, request, *args, **kwargs):
-        lock_key = "sensor_energy_calculation_lock"
+        serializer = SensorEnergySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        sensor_name = serializer.validated_data["sensor"]
+        selected_date = serializer.validated_data.get("date", None)
+
+        if not selected_date:
+            selected_date = timezone.now().date()
 
-        if cache.get(lock_key):
+        logger.debug("Selected date %s for sensor %s", selected_date, sensor_name)
+
+        # A calculation made before its day ended may be refreshed; one that
+        # covered the whole day is final.
+        if complete_results([sensor_name], [selected_date], "calculated_energy"):
             return Response(
                 {
-                    "error": "Calculation process is already running. Please try again later."
+                    "error": f"Energy calculation for {sensor_name} on {selected_date} already exists."
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        cache.set(lock_key, True, timeout=600)
-
-        try:
-            serializer = SensorEnergySerializer(data=request.data)
-            if not serializer.is_valid():
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            sensor_name = serializer.validated_data["sensor"]
-            selected_date = serializer.validated_data.get("date", None)
-
-            if not selected_date:
-                selected_date = timezone.now().date()
-
-            print("Selected date        :", selected_date)
-            print("Sensor name          :", sensor_name)
-
-            if not Energy.objects.filter(
-                name=sensor_name, date=selected_date, calculated_energy__isnull=False
-            ).exists():
-                print("Calculating energy...")
-                total_energy_calculated = calculate_energy(
-                    sensor_name=sensor_name, selected_date=selected_date
-                )
+        return enqueue(
+            request,
+            "calculation",
+            sensor_name,
+            selected_date,
+            store_energy_calculation,
+            sensor_name=sensor_name,
+            selected_date=selected_date,
+            method=serializer.validated_data.get("method"),
+        )
 
-                energy_calculation = Energy.objects.filter(
-                    name=sensor_name,
-                    date=selected_date,
-                ).first()
-
-                if not energy_calculation:
-                    energy_calculation = Energy(
-                        name=sensor_name,
-                        date=selected_date,
-                        calculated_energy=total_energy_calculated,
-                    )
-                    energy_calculation.save()
-                else:
-                    energy_calculation.calculated_energy = total_energy_calculated
-                    energy_calculation.save()
-
-                return Response(status=status.HTTP_201_CREATED)
-            else:
-                return Response(
-                    {
-                        "error": f"Energy calculation for {sensor_name} on {selected_date} already exists."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
 
-        finally:
-            cache.delete(lock_key)
+class SensorEnergyBatchPrediction(APIView):
+    def post(self, request, *args, **kwargs):
+        serializer = SensorEnergyBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        sensor_names = serializer.validated_data["sensors"]
+        start_date = serializer.validated_data["start_date"]
+        end_date = serializer.validated_data["end_date"]
+
+        return enqueue(
+            request,
+            "batch_prediction",
+            ",".join(sorted(sensor_names)),
+            f"{start_date}..{end_date}",
+            store_batch_prediction,
+            sensor_names=sensor_names,
+            start_date=start_date,
+            end_date=end_date,
+            method=serializer.validated_data.get("method"),
+            resample=serializer.validated_data.get("resample"),
+            overwrite=serializer.validated_data["overwrite"],
+        )
@@ -0,0 +1,44 @@
+# windowing.py
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TIME_STEPS = 24
+
+
+def sliding_windows(data: np.ndarray, time_steps: int = TIME_STEPS):
+    # Read-only (n, time_steps, 1) view over the series, no data is copied.
+    # Like the original loop, the window ending on the last sample is left out.
+    series = np.ascontiguousarray(data).reshape(-1)
+    count = len(series) - time_steps
+    if count <= 0:
+        return np.empty((0, time_steps, 1), dtype=series.dtype)
+    windows = sliding_window_view(series, time_steps)[:count]
+    return windows[:, :, np.newaxis]
+
+
+def iter_window_batches(
+    data: np.ndarray, time_steps: int = TIME_STEPS, batch_size: int = 4096
+):
+    windows = sliding_windows(data, time_steps)
+    for start in range(0, len(windows), batch_size):
+        yield windows[start : start + batch_size]
+
+
+def iter_concatenated_batches(window_sets, batch_size: int = 4096):
+    # Pack windows from several series (e.g. one per day) into full batches,
+    # copying only batch_size windows at a time.
+    pending = []
+    pending_size = 0
+    for windows in window_sets:
+        start = 0
+        while start < len(windows):
+            take = min(batch_size - pending_size, len(windows) - start)
+            pending.append(windows[start : start + take])
+            pending_size += take
+            start += take
+            if pending_size == batch_size:
+                yield np.concatenate(pending)
+                pending = []
+                pending_size = 0
+    if pending:
+        yield np.concatenate(pending)
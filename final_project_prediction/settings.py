@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -83,6 +84,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "final_project_prediction.wsgi.application"
+ASGI_APPLICATION = "final_project_prediction.asgi.application"
 
 
 # Database
@@ -155,3 +157,137 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MODEL_STORAGE_PATH = os.path.join(
     BASE_DIR, "saved_model"
 )  # Adjust this path if necessary
+
+# Number of sensor models kept in memory by api.registry.model_registry
+MODEL_REGISTRY_SIZE = env.int("MODEL_REGISTRY_SIZE", default=8)
+
+# Load every model in MODEL_STORAGE_PATH when the worker starts
+MODEL_PRELOAD = env.bool("MODEL_PRELOAD", default=False)
+
+# Default energy integration for api.energy: "trapezoid" (per-sample deltas) or "mean_interval"
+ENERGY_INTEGRATION_METHOD = env("ENERGY_INTEGRATION_METHOD", default="trapezoid")
+
+# Number of 24-step windows sent to the model per inference call
+PREDICTION_BATCH_SIZE = env.int("PREDICTION_BATCH_SIZE", default=4096)
+
+# With a persisted scaler (saved_model/<sensor>_scaler.json, see `manage.py
+# fit_scalers`), a stored prediction of a day is rolled forward: only windows
+# ending in rows that arrived since are predicted and appended
+ROLLING_PREDICTIONS = env.bool("ROLLING_PREDICTIONS", default=True)
+
+# A stored prediction is reused while the day's row count and last created_at are
+# unchanged, so a row edited in place is not noticed. Set this to also compare a
+# hash of the day's telemetry: every hit then reads the day (inference is still
+# skipped), and rolling predictions are off, as they keep no hash
+PREDICTION_CACHE_VERIFY_CONTENT = env.bool(
+    "PREDICTION_CACHE_VERIFY_CONTENT", default=False
+)
+
+# Worker pool for prediction/calculation jobs (api.jobs); job state is kept in
+# the jobs table, trimmed to the newest JOB_HISTORY_SIZE finished jobs
+JOB_WORKERS = env.int("JOB_WORKERS", default=2)
+JOB_HISTORY_SIZE = env.int("JOB_HISTORY_SIZE", default=500)
+# Queued plus running jobs per process before new submissions get a 503
+JOB_MAX_PENDING = env.int("JOB_MAX_PENDING", default=32)
+JOB_RETRY_AFTER_SECONDS = env.int("JOB_RETRY_AFTER_SECONDS", default=5)
+# Cross-process job locks (api.locks): seconds a lock, or a pending job's row, lives
+# without renewal, how long a job waits for a lock held by another worker, and how
+# often it checks
+JOB_LOCK_TTL = env.int("JOB_LOCK_TTL", default=120)
+JOB_LOCK_WAIT = env.int("JOB_LOCK_WAIT", default=900)
+JOB_LOCK_POLL_SECONDS = env.float("JOB_LOCK_POLL_SECONDS", default=1.0)
+
+# Multi-sensor batch prediction limits and bulk insert size
+BATCH_PREDICTION_MAX_DAYS = env.int("BATCH_PREDICTION_MAX_DAYS", default=92)
+BULK_BATCH_SIZE = env.int("BULK_BATCH_SIZE", default=5000)
+# Energy rows and packed series per upsert statement (api.results); kept small
+# because each series can be several hundred KB
+RESULT_BATCH_SIZE = env.int("RESULT_BATCH_SIZE", default=100)
+
+# SensorList keyset pagination
+SENSOR_LIST_PAGE_SIZE = env.int("SENSOR_LIST_PAGE_SIZE", default=1000)
+SENSOR_LIST_MAX_PAGE_SIZE = env.int("SENSOR_LIST_MAX_PAGE_SIZE", default=10000)
+SENSOR_LIST_STREAM_CHUNK_SIZE = env.int("SENSOR_LIST_STREAM_CHUNK_SIZE", default=2000)
+
+# Where calculations without rollups integrate power: "python" (rows fetched
+# into NumPy) or "sql" (window-function query, api.sql_energy); range
+# calculations across sensors are limited to ENERGY_RANGE_MAX_DAYS
+ENERGY_CALCULATION_BACKEND = env("ENERGY_CALCULATION_BACKEND", default="python")
+ENERGY_RANGE_MAX_DAYS = env.int("ENERGY_RANGE_MAX_DAYS", default=366)
+
+# Day-close precompute (api.precompute, the precompute command): worker
+# threads, pause between tasks per worker, how many live API jobs make it
+# wait, and attempts before a failing sensor-day is given up on
+PRECOMPUTE_WORKERS = env.int("PRECOMPUTE_WORKERS", default=2)
+PRECOMPUTE_THROTTLE_SECONDS = env.float("PRECOMPUTE_THROTTLE_SECONDS", default=0.5)
+PRECOMPUTE_MAX_LIVE_JOBS = env.int("PRECOMPUTE_MAX_LIVE_JOBS", default=2)
+PRECOMPUTE_MAX_ATTEMPTS = env.int("PRECOMPUTE_MAX_ATTEMPTS", default=3)
+
+# Rows per chunk when streaming telemetry into arrays (api.telemetry)
+TELEMETRY_CHUNK_SIZE = env.int("TELEMETRY_CHUNK_SIZE", default=10000)
+
+# Read calculations from incremental hourly rollups (api.rollups) when they cover the day
+ENERGY_ROLLUPS = env.bool("ENERGY_ROLLUPS", default=True)
+ROLLUP_BATCH_ROWS = env.int("ROLLUP_BATCH_ROWS", default=50000)
+# Span behind the newest folded row that is checked for late rows on every refresh
+ROLLUP_LATE_WINDOW_SECONDS = env.int("ROLLUP_LATE_WINDOW_SECONDS", default=6 * 3600)
+
+# Bulk telemetry ingestion (api.ingest)
+INGEST_MAX_ROWS = env.int("INGEST_MAX_ROWS", default=50000)
+INGEST_USE_COPY = env.bool("INGEST_USE_COPY", default=True)
+
+# Inference runtime: "tflite" (lightweight interpreter, falls back to Keras when a
+# sensor has no .tflite file yet) or "keras" (imports TensorFlow on first use and
+# runs each model as a tf.function traced for KERAS_BATCH_SIZE windows).
+# INFERENCE_THREADS caps the threads one inference uses (TFLite threads, or
+# TensorFlow's intra-op pool); INFERENCE_INTER_OP_THREADS sizes TensorFlow's
+# inter-op pool. Set both when several workers share a host.
+INFERENCE_BACKEND = env("INFERENCE_BACKEND", default="tflite")
+INFERENCE_THREADS = env.int("INFERENCE_THREADS", default=None)
+INFERENCE_INTER_OP_THREADS = env.int("INFERENCE_INTER_OP_THREADS", default=None)
+TFLITE_BATCH_SIZE = env.int("TFLITE_BATCH_SIZE", default=256)
+KERAS_BATCH_SIZE = env.int("KERAS_BATCH_SIZE", default=512)
+
+# Resample telemetry onto fixed slots before prediction (api.resampling), e.g. "1min"
+# or "15min"; empty or "raw" predicts on every raw sample. SENSOR_RESAMPLE_INTERVALS
+# overrides it per sensor, e.g. "Sensor 1=15min,Sensor 2=raw".
+PREDICTION_RESAMPLE_INTERVAL = env("PREDICTION_RESAMPLE_INTERVAL", default="")
+SENSOR_RESAMPLE_INTERVALS = env.dict("SENSOR_RESAMPLE_INTERVALS", default={})
+# "mean" or "last" sample per slot; empty slots are "interpolate"d, "ffill"ed or "drop"ped
+RESAMPLE_AGGREGATION = env("RESAMPLE_AGGREGATION", default="mean")
+RESAMPLE_FILL = env("RESAMPLE_FILL", default="interpolate")
+
+# Instrumentation (api.metrics, whose logger writes one JSON line per timed
+# stage at LOG_LEVEL=DEBUG): per-request profiling with
+# ?profile=cprofile|tracemalloc (or X-Profile)
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", default=False)
+PROFILING_TOP = env.int("PROFILING_TOP", default=30)
+
+# Predicted power storage (api.series): "series" (one packed float32 blob per
+# Energy) or "rows" (one PowerPrediction row per point)
+PREDICTION_STORAGE = env("PREDICTION_STORAGE", default="series")
+
+# Cold storage (api.archive): closed sensor-days exported by `manage.py
+# archive_telemetry` to one .npy file per column, which predictions and
+# calculations memory-map instead of querying sensor_electrics. Only days at
+# least ARCHIVE_AFTER_DAYS old are exported.
+ARCHIVE_PATH = env("ARCHIVE_PATH", default=os.path.join(BASE_DIR, "archive"))
+ARCHIVE_READS = env.bool("ARCHIVE_READS", default=True)
+ARCHIVE_AFTER_DAYS = env.int("ARCHIVE_AFTER_DAYS", default=7)
+
+# Messages of the api.* module loggers go to the console from this level up;
+# DEBUG adds per-request progress from the prediction and calculation paths
+LOG_LEVEL = env("LOG_LEVEL", default="INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "console": {"format": "{asctime} {levelname} {name}: {message}", "style": "{"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "console"},
+    },
+    "loggers": {
+        "api": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
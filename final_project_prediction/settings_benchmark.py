@@ -0,0 +1,12 @@
+# Offline benchmarks, no database server needed:
+#   python manage.py benchmark --settings=final_project_prediction.settings_benchmark
+# The suites that seed data create and drop their own database next to this one.
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "benchmark.sqlite3",
+    }
+}